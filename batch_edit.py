@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import fnmatch
+
+# --- Configuration ---
+PREVIEW_LIMIT = 20 # Changed entries shown in the confirmation dialog; stdout shows all of them
+# --- End Configuration ---
+
+# Operations are a plain dict so they can come from command-line flags or dialogs:
+#   {'add_tags': [...], 'remove_tags': [...], 'rename_tags': {old: new},
+#    'quiet': True | False | None, 'params': True | False | None, 'replace': [(old, new), ...],
+#    'setup': "source .venv/bin/activate" | "" (clear; the step moves back into the command) | None}
+
+# --- Selection ---
+
+def select_entries(entries, tags=None, name_pattern=None):
+    """Returns the indices of entries matching any of `tags` (case-insensitive)
+    and the shell-style `name_pattern`; a missing criterion matches everything."""
+    wanted_tags = {tag.lower() for tag in tags} if tags else None
+    selected = []
+    for i, entry in enumerate(entries):
+        if wanted_tags and not wanted_tags & {tag.lower() for tag in entry.get('tags', [])}:
+            continue
+        if name_pattern and not fnmatch.fnmatchcase(entry.get('name', ''), name_pattern):
+            continue
+        selected.append(i)
+    return selected
+
+# --- Operations ---
+
+def has_operations(operations):
+    return bool(
+        operations.get('add_tags') or operations.get('remove_tags') or operations.get('rename_tags')
+        or operations.get('replace') or operations.get('quiet') is not None
+        or operations.get('params') is not None
+        or operations.get('setup') is not None
+    )
+
+def apply_operations(entry, operations):
+    """Returns an edited copy of `entry`; the original is left untouched."""
+    edited = dict(entry)
+    tags = [operations.get('rename_tags', {}).get(tag, tag) for tag in entry.get('tags', [])]
+    removed = set(operations.get('remove_tags', []))
+    tags = [tag for tag in tags if tag not in removed]
+    tags += operations.get('add_tags', [])
+    edited['tags'] = list(dict.fromkeys(tags)) # Drop duplicates, keep order
+
+    command = entry['command']
+    for old, new in operations.get('replace', []):
+        command = command.replace(old, new)
+    setup = operations.get('setup')
+    if setup and entry.get('setup') and entry['setup'] != setup:
+        # A replaced step still runs, now after the new one, so nothing is silently dropped
+        command = f"{entry['setup']} && {command}"
+    if setup:
+        # Commands that still start with the setup step drop it; it now runs from the snapshot
+        command = command[len(f"{setup} && "):] if command.startswith(f"{setup} && ") else command
+        edited['setup'] = setup
+    elif setup == "" and entry.get('setup'):
+        # The step goes back into the command, so clearing it does not skip it
+        command = f"{entry['setup']} && {command}"
+        edited.pop('setup')
+    edited['command'] = command
+
+    if operations.get('quiet') is not None:
+        edited['quiet'] = operations['quiet']
+    if operations.get('params'):
+        edited['params'] = True
+    elif operations.get('params') is False:
+        edited.pop('params', None)
+    return edited
+
+def plan_changes(entries, indices, operations):
+    """Returns (index, edited_entry) for every selected entry the operations actually change."""
+    changes = []
+    for i in indices:
+        edited = apply_operations(entries[i], operations)
+        if edited != entries[i]:
+            changes.append((i, edited))
+    return changes
+
+def describe_change(before, after):
+    """Returns one line per changed field, e.g. "tags: [npm] → [pnpm]"."""
+    lines = []
+    for field in ('command', 'setup', 'tags', 'quiet', 'params'):
+        if before.get(field) != after.get(field):
+            lines.append(f"{field}: {before.get(field)} → {after.get(field)}")
+    return lines
+
+def render_preview(entries, changes, limit=None):
+    """Renders the planned changes as text, optionally truncated to `limit` entries."""
+    lines = []
+    for i, edited in changes[:limit]:
+        lines.append(entries[i].get('name') or entries[i]['command'])
+        lines.extend(f"    {line}" for line in describe_change(entries[i], edited))
+    if limit is not None and len(changes) > limit:
+        lines.append(f"... and {len(changes) - limit} more")
+    return "\n".join(lines)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+"""Reproducible benchmarks for History Book's hot paths.
+
+Generates synthetic shell histories and command books from a fixed seed,
+times scraping, sequence mining, loading, saving, listing and lookups, writes the results as
+JSON and optionally compares them against a stored baseline.
+
+    python benchmarks/bench_history_book.py
+    python benchmarks/bench_history_book.py --save-baseline
+    python benchmarks/bench_history_book.py --full --threshold 0.15
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, PROJECT_ROOT)
+
+import history_book
+import scrape_history
+import sequence_mining
+
+# --- Configuration ---
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_HISTORY_LINES = [10_000, 100_000]
+DEFAULT_BOOK_SIZES = [10, 1_000, 10_000]
+FULL_HISTORY_LINES = [10_000, 100_000, 1_000_000, 10_000_000]
+FULL_BOOK_SIZES = [10, 1_000, 10_000, 100_000]
+DUPLICATE_RATIO = 0.8 # Real histories repeat most lines
+DEFAULT_THRESHOLD = 0.25 # Fractional slowdown of the median that counts as a regression
+SEED = 1337
+# --- End Configuration ---
+
+PROGRAMS = ["git", "make", "docker", "npm", "python", "pytest", "kubectl", "cargo", "ls", "grep"]
+VERBS = ["status", "build", "test", "run", "push", "pull", "log", "diff", "up", "exec"]
+TAGS = [f"tag{i}" for i in range(20)]
+
+# --- Synthetic Data ---
+
+def generate_command_pool(size, rng):
+    """Returns `size` distinct, realistic-looking commands."""
+    return [f"{rng.choice(PROGRAMS)} {rng.choice(VERBS)} --opt-{i} arg{rng.randrange(1000)}" for i in range(size)]
+
+def write_history(path, shell, lines, rng):
+    """Writes a history file in the given shell's format."""
+    pool = generate_command_pool(max(1, int(lines * (1 - DUPLICATE_RATIO))), rng)
+    timestamp = 1_700_000_000
+    with open(path, 'w') as f:
+        for _ in range(lines):
+            command = rng.choice(pool)
+            timestamp += rng.randrange(1, 30)
+            if shell == "zsh":
+                f.write(f": {timestamp}:0;{command}\n")
+            elif shell == "fish":
+                f.write(f"- cmd: {command}\n  when: {timestamp}\n")
+            else:
+                f.write(f"{command}\n")
+
+def generate_book(size, rng):
+    """Returns a synthetic book of `size` entries."""
+    return [
+        {
+            "id": f"id-{i}",
+            "name": f"cmd-{i}",
+            "command": command,
+            "description": f"Synthetic command {i}",
+            "tags": rng.sample(TAGS, 2),
+            "last_run": None,
+            "quiet": False,
+        }
+        for i, command in enumerate(generate_command_pool(size, rng))
+    ]
+
+# --- Timing ---
+
+def time_call(func, repeat):
+    """Runs `func` `repeat` times and returns timing statistics in seconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "max": max(samples),
+        "repeat": repeat,
+    }
+
+def _silently(func):
+    """Wraps a function so its console output does not skew the timings."""
+    def wrapper():
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+    return wrapper
+
+def repeat_for(size, small_repeat, large_size):
+    """Large inputs get fewer repetitions so the full suite stays practical."""
+    return small_repeat if size < large_size else max(1, small_repeat // 5)
+
+# --- Benchmarks ---
+
+def bench_parse_history(workdir, history_lines, repeat, rng):
+    results = {}
+    for shell in ("bash", "zsh", "fish"):
+        for lines in history_lines:
+            path = os.path.join(workdir, f"history.{shell}.{lines}")
+            write_history(path, shell, lines, rng)
+            results[f"parse_history[{shell},{lines}]"] = time_call(
+                lambda: scrape_history.parse_history(path, shell), repeat_for(lines, repeat, 1_000_000)
+            )
+            results[f"count_sequences[{shell},{lines}]"] = time_call(
+                lambda: sequence_mining.count_sequences(scrape_history.iter_history_commands(path, shell)),
+                repeat_for(lines, repeat, 1_000_000)
+            )
+            os.remove(path)
+    return results
+
+def bench_book(workdir, book_sizes, repeat, rng):
+    results = {}
+    for size in book_sizes:
+        book_dir = os.path.join(workdir, f"book-{size}")
+        os.makedirs(book_dir)
+        history_book.COMMANDS_FILE = os.path.join(book_dir, "project_commands.json")
+        data = generate_book(size, rng)
+        _silently(lambda: history_book.save_commands_data(data))() # Also builds the derived files
+        runs = repeat_for(size, repeat, 100_000)
+        last_name = data[-1]['name']
+        list_args = argparse.Namespace(tags="tag1,tag2")
+
+        results[f"load_commands_data[{size}]"] = time_call(history_book.load_commands_data, runs)
+        results[f"save_commands_data[{size}]"] = time_call(_silently(lambda: history_book.save_commands_data(data)), runs)
+        results[f"list_commands[tags,{size}]"] = time_call(_silently(lambda: history_book.list_commands(list_args)), runs)
+        results[f"run_lookup[hit,{size}]"] = time_call(lambda: history_book.find_command_entry(last_name), runs)
+        results[f"run_lookup[miss,{size}]"] = time_call(_silently(lambda: history_book.resolve_command_entry("cmd-x")), runs)
+    return results
+
+# --- Baseline Comparison ---
+
+def compare(results, baseline, threshold):
+    """Returns (name, baseline_median, median, ratio) for every regression."""
+    regressions = []
+    for name, stats in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        ratio = stats["median"] / reference["median"] if reference["median"] else 1.0
+        if ratio > 1 + threshold:
+            regressions.append((name, reference["median"], stats["median"], ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="History Book benchmark suite")
+    parser.add_argument('--full', action='store_true', help="Use the large sizes (up to 10M history lines and 100k entries).")
+    parser.add_argument('--history-lines', type=str, help="Comma-separated history sizes, e.g. 10000,100000.")
+    parser.add_argument('--book-sizes', type=str, help="Comma-separated book sizes, e.g. 10,1000.")
+    parser.add_argument('--repeat', type=int, default=5, help="Repetitions per measurement (default: 5).")
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT, help="Where to write the results JSON.")
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help="Baseline JSON to compare against.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Allowed fractional slowdown (default: 0.25).")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline.")
+    args = parser.parse_args()
+
+    history_lines = FULL_HISTORY_LINES if args.full else DEFAULT_HISTORY_LINES
+    book_sizes = FULL_BOOK_SIZES if args.full else DEFAULT_BOOK_SIZES
+    if args.history_lines:
+        history_lines = [int(size) for size in args.history_lines.split(',')]
+    if args.book_sizes:
+        book_sizes = [int(size) for size in args.book_sizes.split(',')]
+
+    rng = random.Random(SEED)
+    original_commands_file = history_book.COMMANDS_FILE
+    os.environ['XDG_RUNTIME_DIR'] = tempfile.gettempdir() # Never talk to a real daemon
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix="history_book_bench_") as workdir:
+            results.update(bench_parse_history(workdir, history_lines, args.repeat, rng))
+            results.update(bench_book(workdir, book_sizes, args.repeat, rng))
+    finally:
+        history_book.COMMANDS_FILE = original_commands_file
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": SEED,
+        },
+        "results": results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'benchmark':<40} {'median':>12} {'min':>12}")
+    for name, stats in results.items():
+        print(f"{name:<40} {stats['median'] * 1000:>10.3f}ms {stats['min'] * 1000:>10.3f}ms")
+    print(f"\n✅ Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.isfile(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for name, before, after, ratio in regressions:
+            print(f"  {name}: {before * 1000:.3f}ms → {after * 1000:.3f}ms ({ratio:.2f}x)")
+        sys.exit(1)
+    print(f"✅ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
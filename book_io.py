@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import uuid
+
+# --- Configuration ---
+FORMATS = ("ndjson", "json", "csv")
+FIELDS = ["id", "name", "command", "description", "tags", "last_run", "quiet", "resource", "setup", "params"] # Column order for CSV
+EXTENSION_FORMATS = {
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".json": "json",
+    ".csv": "csv",
+}
+TRUE_STRINGS = {"1", "true", "yes", "y", "on"}
+FALSE_STRINGS = {"", "0", "false", "no", "n", "off"}
+# --- End Configuration ---
+
+# --- Helper Functions ---
+
+def detect_format(path, default="ndjson"):
+    """Guesses the format from a file extension; stdin ('-') uses `default`."""
+    if path == '-':
+        return default
+    return EXTENSION_FORMATS.get(os.path.splitext(path)[1].lower(), default)
+
+def read_records(stream, fmt):
+    """Yields (position, record) pairs from a stream without loading NDJSON or CSV fully.
+    `position` is a human-readable location used in validation errors."""
+    if fmt == "json":
+        records = json.load(stream)
+        if not isinstance(records, list):
+            raise ValueError("expected a JSON array of command objects")
+        for i, record in enumerate(records):
+            yield f"item {i}", record
+    elif fmt == "ndjson":
+        for line_number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    yield f"line {line_number}", json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield f"line {line_number}", ValueError(f"invalid JSON: {e}")
+    elif fmt == "csv":
+        import csv
+        for row_number, row in enumerate(csv.DictReader(stream), 2): # Row 1 is the header
+            yield f"row {row_number}", row
+    else:
+        raise ValueError(f"unsupported format '{fmt}'")
+
+def _parse_bool(value, field):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in TRUE_STRINGS | FALSE_STRINGS:
+        return value.strip().lower() in TRUE_STRINGS
+    raise ValueError(f"'{field}' must be a boolean")
+
+def _parse_tags(value):
+    if value is None:
+        return []
+    if isinstance(value, str): # CSV and hand-written input: comma-separated
+        return [tag.strip() for tag in value.split(',') if tag.strip()]
+    if isinstance(value, list) and all(isinstance(tag, str) for tag in value):
+        return [tag.strip() for tag in value if tag.strip()]
+    raise ValueError("'tags' must be a list of strings or a comma-separated string")
+
+def _parse_text(record, field):
+    value = record.get(field)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"'{field}' must be a string")
+    return value
+
+def normalize_entry(record):
+    """Validates an imported record and returns a complete book entry.
+    Raises ValueError describing the first problem found."""
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("expected an object with at least a 'command' field")
+    command = _parse_text(record, 'command')
+    if not command.strip():
+        raise ValueError("'command' is required")
+    entry = {
+        "id": _parse_text(record, 'id').strip() or str(uuid.uuid4()),
+        "name": _parse_text(record, 'name').strip(),
+        "command": command,
+        "description": _parse_text(record, 'description'),
+        "tags": _parse_tags(record.get('tags')),
+        "last_run": _parse_text(record, 'last_run').strip() or None,
+        "quiet": _parse_bool(record.get('quiet', False), 'quiet'),
+    }
+    resource = _parse_text(record, 'resource').strip()
+    if resource:
+        import token_pool
+        token_pool.parse_resource(resource) # Raises ValueError for malformed declarations
+        entry['resource'] = resource
+    setup = _parse_text(record, 'setup').strip()
+    if setup:
+        entry['setup'] = setup
+    if _parse_bool(record.get('params', False), 'params'):
+        entry['params'] = True
+    return entry
+
+def import_entries(existing, records):
+    """Validates and de-duplicates records against the book in a single pass.
+    Records whose id or command text is already in the book (or earlier in the
+    input) are skipped. Returns (new_entries, skipped_count, errors)."""
+    seen_ids = {cmd.get('id') for cmd in existing}
+    seen_commands = {cmd.get('command') for cmd in existing}
+    new_entries = []
+    skipped = 0
+    errors = []
+    for position, record in records:
+        try:
+            entry = normalize_entry(record)
+        except ValueError as e:
+            errors.append(f"{position}: {e}")
+            continue
+        if entry['id'] in seen_ids or entry['command'] in seen_commands:
+            skipped += 1
+            continue
+        seen_ids.add(entry['id'])
+        seen_commands.add(entry['command'])
+        new_entries.append(entry)
+    return new_entries, skipped, errors
+
+def write_entries(entries, stream, fmt):
+    """Writes entries to a stream in the given format."""
+    if fmt == "json":
+        json.dump(entries, stream, indent=2)
+        stream.write("\n")
+    elif fmt == "ndjson":
+        for entry in entries:
+            stream.write(json.dumps(entry) + "\n")
+    elif fmt == "csv":
+        import csv
+        writer = csv.DictWriter(stream, fieldnames=FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for entry in entries:
+            row = dict(entry)
+            row['tags'] = ",".join(entry.get('tags', []))
+            row['quiet'] = "true" if entry.get('quiet') else "false"
+            row['last_run'] = entry.get('last_run') or ""
+            row['resource'] = entry.get('resource') or ""
+            row['setup'] = entry.get('setup') or ""
+            row['params'] = "true" if entry.get('params') else "false"
+            writer.writerow(row)
+    else:
+        raise ValueError(f"unsupported format '{fmt}'")
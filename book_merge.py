@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import uuid
+
+# --- Configuration ---
+ID_NAMESPACE = uuid.UUID("5c0f6a57-2a3e-4d5b-9a43-8f4be1d0c1a7") # Seeds ids of entries saved before ids existed
+UNTRACKED_FIELDS = {"id", "rev", "hash", "last_run", "template"} # Not part of an entry's content hash
+DERIVED_FIELDS = {"rev", "hash", "template"} # Recomputed after a merge instead of merged
+# --- End Configuration ---
+
+# Every entry carries a revision stamp and a hash of its content:
+#   {"id": "...", ..., "rev": 3, "hash": "9f2c..."}
+# save_commands_data bumps 'rev' whenever the content (everything except the
+# fields above) no longer matches 'hash'. Runs only touch 'last_run', so they
+# do not create revisions. Merges match entries by id, so ids must be stable:
+# entries without one get a uuid5 derived from their content, which every
+# clone of the book computes identically.
+
+MISSING = object() # A field absent from one version of an entry
+_encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':')) # json.dumps would build one per call
+
+# --- Revisions ---
+
+def content_hash(entry):
+    """Returns a short hash of the fields a person edits."""
+    content = {key: value for key, value in entry.items() if key not in UNTRACKED_FIELDS}
+    return hashlib.sha256(_encoder.encode(content).encode('utf-8')).hexdigest()[:16]
+
+def stamp_entries(entries):
+    """Bumps the revision of every entry whose content changed since it was last stamped."""
+    for entry in entries:
+        digest = content_hash(entry)
+        if entry.get('hash') != digest:
+            entry['rev'] = entry.get('rev', 0) + 1
+            entry['hash'] = digest
+
+def assign_missing_ids(entries):
+    """Gives entries without an id a deterministic one, so loading the same
+    legacy book in two clones yields the same ids. Repeated identical entries
+    are told apart by their occurrence."""
+    occurrences = {}
+    for entry in entries:
+        if entry.get('id'):
+            continue
+        seed = f"{entry.get('name', '')}\0{entry.get('command', '')}"
+        occurrence = occurrences[seed] = occurrences.get(seed, 0) + 1
+        entry['id'] = str(uuid.uuid5(ID_NAMESPACE, f"{seed}\0{occurrence}"))
+
+# --- Merging ---
+
+def _label(entry):
+    return entry.get('name') or entry.get('command') or entry.get('id')
+
+def _merge_tags(ours, theirs):
+    """Returns the union of both sides' tags, ours first. A tag removed on only
+    one side is kept, since the other side still wants it."""
+    return ours + [tag for tag in theirs if tag not in ours]
+
+def _merge_last_run(ours, theirs):
+    runs = [value for value in (ours, theirs) if value]
+    return max(runs) if runs else None # ISO 8601 UTC timestamps sort chronologically
+
+def merge_entry(base, ours, theirs, conflicts):
+    """Three-way merges one entry field by field. `base` is None when both sides
+    added the entry. Concurrent changes to 'tags' and 'last_run' are resolved;
+    any other field keeps our value and is reported in `conflicts`."""
+    base = base or {}
+    merged = {}
+    for field in dict.fromkeys(list(ours) + list(theirs)):
+        if field in DERIVED_FIELDS:
+            continue
+        base_value = base.get(field, MISSING)
+        our_value = ours.get(field, MISSING)
+        their_value = theirs.get(field, MISSING)
+        if our_value == their_value or their_value == base_value:
+            value = our_value
+        elif our_value == base_value:
+            value = their_value
+        elif field == 'tags':
+            value = _merge_tags(ours.get('tags') or [], theirs.get('tags') or [])
+        elif field == 'last_run':
+            value = _merge_last_run(ours.get('last_run'), theirs.get('last_run'))
+        else:
+            conflicts.append(f"{_label(ours)}: '{field}' changed on both sides "
+                             f"(ours: {json.dumps(None if our_value is MISSING else our_value)}, "
+                             f"theirs: {json.dumps(None if their_value is MISSING else their_value)})")
+            value = our_value
+        if value is not MISSING:
+            merged[field] = value
+
+    # The merged entry is a new revision unless it equals one of the sides;
+    # without a 'hash', stamp_entries gives it the next one
+    merged['rev'] = max(ours.get('rev', 0), theirs.get('rev', 0))
+    digest = content_hash(merged)
+    if merged['rev'] and digest in (content_hash(ours), content_hash(theirs)):
+        merged['hash'] = digest
+    return merged
+
+def merge_books(base, ours, theirs):
+    """Three-way merges three versions of a book, matching entries by id in one
+    pass over each. The result keeps our order, followed by entries only they
+    added. Returns (merged_entries, conflicts); conflicts are readable strings
+    and the merged book keeps our version wherever one was reported."""
+    for entries in (base, ours, theirs):
+        assign_missing_ids(entries)
+    base_by_id = {entry['id']: entry for entry in base}
+    their_by_id = {entry['id']: entry for entry in theirs}
+    our_ids = {entry['id'] for entry in ours}
+
+    merged = []
+    conflicts = []
+    for entry in ours:
+        base_entry = base_by_id.get(entry['id'])
+        their_entry = their_by_id.get(entry['id'])
+        if their_entry is not None:
+            if their_entry == entry or their_entry == base_entry:
+                merged.append(entry) # Most entries: unchanged, or changed on one side only
+            elif entry == base_entry:
+                merged.append(their_entry)
+            else:
+                merged.append(merge_entry(base_entry, entry, their_entry, conflicts))
+        elif base_entry is None:
+            merged.append(entry) # Added by us
+        elif content_hash(entry) != content_hash(base_entry):
+            conflicts.append(f"{_label(entry)}: changed by us but deleted by them")
+            merged.append(entry)
+        # Otherwise deleted by them and untouched by us
+
+    for entry in theirs:
+        if entry['id'] in our_ids:
+            continue
+        base_entry = base_by_id.get(entry['id'])
+        if base_entry is None:
+            merged.append(entry) # Added by them
+        elif content_hash(entry) != content_hash(base_entry):
+            conflicts.append(f"{_label(entry)}: deleted by us but changed by them")
+            merged.append(entry)
+        # Otherwise deleted by us and untouched by them
+    stamp_entries(merged)
+    return merged, conflicts
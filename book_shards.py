@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import re
+import zlib
+
+# --- Configuration ---
+SHARD_DIR_SUFFIX = ".shards" # project_commands.json -> project_commands.shards/
+MANIFEST_NAME = "manifest.json"
+STRATEGIES = ("tag", "hash")
+DEFAULT_HASH_SHARDS = 16
+UNTAGGED_SHARD = "untagged"
+# --- End Configuration ---
+
+# A sharded book replaces the single JSON file with a directory of shard files
+# (each a JSON array of entries) and a manifest mapping names and tags to them:
+#   {"version": 1, "strategy": "tag", "count": null, "shards": ["tag-build", ...],
+#    "names": {"deploy": "tag-release", ...}, "tags": {"build": ["tag-build"], ...},
+#    "positions": {"tag-build": [0, 3], ...}}
+# 'positions' holds the book index of every entry of a shard, so loading
+# restores the book's order no matter how entries were distributed.
+# With the 'tag' strategy an entry lives in the shard of its first tag; with
+# 'hash' in one of `count` shards chosen by a hash of its name. Either way a
+# name lookup reads one shard and a tag filter reads only the shards listing
+# that tag. Shards are written atomically and only when their content changed;
+# the manifest is written after them.
+
+# --- Layout ---
+
+def get_shard_dir(commands_file):
+    return os.path.splitext(commands_file)[0] + SHARD_DIR_SUFFIX
+
+def get_manifest_path(commands_file):
+    return os.path.join(get_shard_dir(commands_file), MANIFEST_NAME)
+
+def is_sharded(commands_file):
+    """True when the book is stored as shards instead of a single file."""
+    return os.path.isfile(get_manifest_path(commands_file))
+
+def _shard_path(commands_file, key):
+    return os.path.join(get_shard_dir(commands_file), f"{key}.json")
+
+def shard_key(entry, strategy, count=None):
+    """Returns the key of the shard an entry belongs to."""
+    if strategy == "hash":
+        seed = entry.get('name') or entry.get('id', '')
+        return f"hash-{zlib.crc32(seed.encode('utf-8')) % count:02x}"
+    tags = entry.get('tags') or []
+    if not tags:
+        return UNTAGGED_SHARD
+    return "tag-" + (re.sub(r'[^a-z0-9_-]+', '-', tags[0].lower()).strip('-') or "other")
+
+# --- Reading ---
+
+def load_manifest(commands_file):
+    with open(get_manifest_path(commands_file), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def read_shard(commands_file, key):
+    """Returns the entries of one shard; a shard that is gone is empty."""
+    try:
+        with open(_shard_path(commands_file, key), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+def load_entries(commands_file, keys=None, manifest=None):
+    """Returns the entries of the given shards (all of them by default) in book order."""
+    manifest = manifest or load_manifest(commands_file)
+    keys = None if keys is None else set(keys)
+    positions = manifest.get('positions', {})
+    located = []
+    for key in manifest['shards']:
+        if keys is not None and key not in keys:
+            continue
+        shard = read_shard(commands_file, key)
+        shard_positions = positions.get(key)
+        if shard_positions is None or len(shard_positions) != len(shard):
+            shard_positions = [float('inf')] * len(shard) # Edited by hand: after the rest, in shard order
+        located.extend(zip(shard_positions, shard))
+    located.sort(key=lambda pair: pair[0]) # Stable, so ties keep shard order
+    return [entry for _, entry in located]
+
+def shards_for_name(manifest, name):
+    key = manifest['names'].get(name)
+    return [key] if key else []
+
+def shards_for_tags(manifest, tags):
+    """Returns the shards holding entries with any of `tags` (case-insensitive)."""
+    wanted = {tag.lower() for tag in tags}
+    keys = set()
+    for tag, tag_keys in manifest['tags'].items():
+        if tag.lower() in wanted:
+            keys.update(tag_keys)
+    return sorted(keys)
+
+# --- Writing ---
+
+def build_manifest(entries, strategy, count=None):
+    """Distributes entries over shards. Returns (manifest, {key: entries})."""
+    shards = {}
+    positions = {}
+    names = {}
+    tags = {}
+    for position, entry in enumerate(entries):
+        key = shard_key(entry, strategy, count)
+        shards.setdefault(key, []).append(entry)
+        positions.setdefault(key, []).append(position)
+        if entry.get('name'):
+            names.setdefault(entry['name'], key) # First entry wins, like a lookup in a single file
+        for tag in entry.get('tags', []):
+            tags.setdefault(tag, {})[key] = None
+    manifest = {
+        "version": 1,
+        "strategy": strategy,
+        "count": count if strategy == "hash" else None,
+        "shards": sorted(shards),
+        "names": names,
+        "tags": {tag: list(keys) for tag, keys in sorted(tags.items())},
+        "positions": {key: positions[key] for key in sorted(shards)},
+    }
+    return manifest, shards
+
+def _write_if_changed(path, text, write_text):
+    """Writes `text` unless the file already holds it. Returns True if it was written."""
+    try:
+        if os.path.getsize(path) == len(text.encode('utf-8')):
+            with open(path, 'r', encoding='utf-8') as f:
+                if f.read() == text:
+                    return False
+    except OSError:
+        pass
+    write_text(path, text)
+    return True
+
+def write_shard(commands_file, key, entries, write_text):
+    """Rewrites one shard, e.g. after a change that cannot move entries
+    between shards or alter the manifest (such as a new 'last_run')."""
+    return _write_if_changed(_shard_path(commands_file, key), json.dumps(entries, indent=2), write_text)
+
+def write_book(entries, commands_file, write_text, strategy=None, count=None):
+    """Stores the whole book as shards, keeping the current strategy unless one
+    is given. Only shards whose content changed are rewritten and shards left
+    empty are removed. Returns the number of shard files written."""
+    if strategy is None:
+        current = load_manifest(commands_file)
+        strategy, count = current['strategy'], current['count']
+    manifest, shards = build_manifest(entries, strategy, count or DEFAULT_HASH_SHARDS)
+    shard_dir = get_shard_dir(commands_file)
+    os.makedirs(shard_dir, exist_ok=True)
+    written = sum(write_shard(commands_file, key, shard, write_text) for key, shard in shards.items())
+    _write_if_changed(get_manifest_path(commands_file), json.dumps(manifest, indent=2), write_text)
+    for file_name in os.listdir(shard_dir):
+        key, extension = os.path.splitext(file_name)
+        if extension == ".json" and file_name != MANIFEST_NAME and key not in shards:
+            os.remove(os.path.join(shard_dir, file_name))
+    return written
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import json
+import math
+import os
+import re
+import shlex
+import shutil
+import time
+
+# --- Configuration ---
+DEFAULT_RUNS = 10
+DEFAULT_WARMUP = 0
+RESULTS_DIR_NAME = "bench" # Inside the cache directory (.history_book/bench/)
+MAX_STORED_RESULTS = 50 # Per command; the oldest results are dropped
+REGRESSION_THRESHOLD = 0.05 # A slowdown below this fraction of the old mean is never reported
+SHELL = "/bin/sh" # What subprocess.run(shell=True) uses, so both paths run commands alike
+SHELL_SYNTAX = re.compile(r'[|&;<>()$`\\*?\[\]{}~#!\n]') # Anything here needs a shell to mean the same thing
+SHELL_BUILTINS = {"cd", "source", ".", "export", "alias", "unset", "eval", "exec", "set", "ulimit", "umask", "time"}
+# --- End Configuration ---
+
+# Stored results are one JSON file per entry id (names can change), newest last:
+#   [{"timestamp": "...Z", "command": "make -j4", "direct": true, "runs": 10,
+#     "wall": [...], "user": [...], "sys": [...]}, ...]
+# Summaries are always recomputed from the raw samples.
+
+# --- Running ---
+
+def plan_invocation(command_text, env=None):
+    """Returns (path, argv, direct). Simple commands are executed directly, which
+    keeps shell startup out of the measurement; anything that needs shell
+    syntax, a builtin or an assignment runs through the shell. The program is
+    looked up on the PATH of `env`, the environment it will run with."""
+    if not SHELL_SYNTAX.search(command_text):
+        try:
+            argv = shlex.split(command_text)
+        except ValueError:
+            argv = []
+        if argv and argv[0] not in SHELL_BUILTINS and '=' not in argv[0]:
+            path = shutil.which(argv[0], path=(os.environ if env is None else env).get('PATH'))
+            if path:
+                return path, argv, True
+    return SHELL, [SHELL, "-c", command_text], False
+
+def run_once(path, argv, env=None, show_output=False):
+    """Spawns the command once and waits for it with os.wait4.
+    Returns (exit_code, wall_seconds, user_seconds, sys_seconds) for the child alone."""
+    file_actions = [(os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0)]
+    if not show_output:
+        file_actions += [
+            (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0),
+            (os.POSIX_SPAWN_DUP2, 1, 2),
+        ]
+    started = time.perf_counter()
+    pid = os.posix_spawn(path, argv, os.environ if env is None else env, file_actions=file_actions)
+    _, status, usage = os.wait4(pid, 0)
+    wall = time.perf_counter() - started
+    return os.waitstatus_to_exitcode(status), wall, usage.ru_utime, usage.ru_stime
+
+# --- Statistics ---
+
+def summarize(samples):
+    """Returns mean, standard deviation, median, min and max of a list of seconds."""
+    import statistics # Only needed once the timed runs are over
+    return {
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "max": max(samples),
+    }
+
+def find_outliers(samples):
+    """Returns the indices of samples outside Tukey's fences (1.5 IQR beyond the quartiles)."""
+    if len(samples) < 4:
+        return []
+    import statistics
+    q1, _, q3 = statistics.quantiles(samples, n=4, method='inclusive')
+    spread = 1.5 * (q3 - q1)
+    return [i for i, sample in enumerate(samples) if sample < q1 - spread or sample > q3 + spread]
+
+def compare(previous, current):
+    """Compares the wall times of two stored results. Returns (relative_change,
+    significant, regression): the change of the mean as a fraction of the old
+    one, whether it exceeds about two standard errors of the difference, and
+    whether it is a significant slowdown larger than REGRESSION_THRESHOLD."""
+    old, new = summarize(previous['wall']), summarize(current['wall'])
+    change = (new['mean'] - old['mean']) / old['mean'] if old['mean'] else 0.0
+    standard_error = math.sqrt(old['stdev'] ** 2 / len(previous['wall']) + new['stdev'] ** 2 / len(current['wall']))
+    significant = abs(new['mean'] - old['mean']) > 2 * standard_error
+    return change, significant, significant and change > REGRESSION_THRESHOLD
+
+def format_seconds(seconds):
+    """Formats a duration with a unit that keeps three or four significant digits."""
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds:.3f} s"
+
+# --- Stored Results ---
+
+def get_results_path(cache_dir, command_id):
+    safe_id = re.sub(r'[^A-Za-z0-9_.-]+', '_', command_id)
+    return os.path.join(cache_dir, RESULTS_DIR_NAME, f"{safe_id}.json")
+
+def load_results(cache_dir, command_id):
+    """Returns the stored results of a command, oldest first."""
+    try:
+        with open(get_results_path(cache_dir, command_id), 'r', encoding='utf-8') as f:
+            results = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return results if isinstance(results, list) else []
+
+def save_result(cache_dir, command_id, result, write_text):
+    """Appends a result, keeping at most MAX_STORED_RESULTS per command."""
+    results = (load_results(cache_dir, command_id) + [result])[-MAX_STORED_RESULTS:]
+    path = get_results_path(cache_dir, command_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_text(path, json.dumps(results))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import re
+import shlex
+
+# --- Configuration ---
+PLACEHOLDER_PATTERN = re.compile(r'\{([A-Za-z_][A-Za-z0-9_]*)(?::-([^{}]*))?\}') # {env} or {branch:-main}
+# --- End Configuration ---
+
+# Templates are opt-in: only entries with "params": true are compiled, so
+# commands such as `git rebase @{u}` or `jq .{name}` keep running as written.
+# A compiled template is a JSON-friendly list stored in the entry's 'template'
+# field: literal text as plain strings, placeholders as
+# {"name": ..., "default": ... or None, "quoting": "shell" | "double"}.
+# Inside a template, {{ and }} stand for literal braces.
+
+# --- Compilation ---
+
+def compile_template(command):
+    """Parses the placeholders in a command once, returning the compiled parts,
+    or None if the command is a plain literal.
+    Text inside single quotes and shell expansions such as ${var} or git's
+    @{upstream} are left alone, so awk programs and revisions keep their braces."""
+    if '{' not in command:
+        return None
+    parts = []
+    literal = []
+    in_single = in_double = False
+    i = 0
+    while i < len(command):
+        char = command[i]
+        if char == '\\' and not in_single:
+            literal.append(command[i:i + 2])
+            i += 2
+            continue
+        if char == "'" and not in_double:
+            in_single = not in_single
+        elif char == '"' and not in_single:
+            in_double = not in_double
+        elif char in '{}' and not in_single and command[i + 1:i + 2] == char:
+            literal.append(char) # {{ or }}: an escaped brace
+            i += 2
+            continue
+        elif char == '{' and not in_single and command[i - 1:i] not in ('$', '@'):
+            match = PLACEHOLDER_PATTERN.match(command, i)
+            if match:
+                if literal:
+                    parts.append("".join(literal))
+                    literal = []
+                parts.append({
+                    "name": match.group(1),
+                    "default": match.group(2),
+                    "quoting": "double" if in_double else "shell",
+                })
+                i = match.end()
+                continue
+        literal.append(char)
+        i += 1
+    if literal:
+        parts.append("".join(literal))
+    if all(isinstance(part, str) for part in parts) and "".join(parts) == command:
+        return None # Nothing to fill in and no escaped braces
+    return parts
+
+def placeholder_names(parts):
+    """Returns the distinct placeholder names of a compiled template, in order."""
+    names = []
+    for part in parts or []:
+        if isinstance(part, dict) and part['name'] not in names:
+            names.append(part['name'])
+    return names
+
+def compile_entries(entries):
+    """Stores the compiled template on every entry that takes parameters and
+    has placeholders, and drops stale templates from all other entries."""
+    for entry in entries:
+        parts = compile_template(entry.get('command', '')) if entry.get('params') else None
+        if parts is None:
+            entry.pop('template', None)
+        else:
+            entry['template'] = parts
+
+# --- Rendering ---
+
+def parse_assignments(assignments):
+    """Turns ['key=value', ...] arguments into a dict. Raises ValueError on malformed items."""
+    values = {}
+    for assignment in assignments:
+        key, separator, value = assignment.partition('=')
+        if not separator or not PLACEHOLDER_PATTERN.fullmatch(f"{{{key}}}"):
+            raise ValueError(f"Expected key=value, got '{assignment}'.")
+        values[key] = value
+    return values
+
+def _quote(value, quoting):
+    if quoting == "double": # Already inside "...": escape what double quotes still expand
+        return re.sub(r'([\\"$`])', r'\\\1', value)
+    return shlex.quote(value)
+
+def render(parts, values):
+    """Fills a compiled template with shell-quoted values (or the placeholder defaults).
+    Raises ValueError naming unknown or missing placeholders."""
+    names = placeholder_names(parts)
+    unknown = [key for key in values if key not in names]
+    if unknown:
+        raise ValueError(f"Unknown parameter(s): {', '.join(unknown)}. This command accepts: {', '.join(names)}.")
+    missing = [
+        part['name'] for part in parts
+        if isinstance(part, dict) and part['name'] not in values and part['default'] is None
+    ]
+    if missing:
+        raise ValueError(f"Missing value(s) for: {', '.join(dict.fromkeys(missing))}. Pass them as key=value.")
+
+    rendered = []
+    for part in parts:
+        if isinstance(part, str):
+            rendered.append(part)
+        else:
+            value = values.get(part['name'], part['default'])
+            rendered.append(_quote(value, part['quoting']))
+    return "".join(rendered)
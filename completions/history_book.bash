@@ -0,0 +1,49 @@
+# Bash completion for History Book.
+# Enable with:  source <(history_book completion bash)
+#
+# Names and tags are read from the plain-text cache that History Book writes
+# next to project_commands.json, so completing never starts Python.
+
+_history_book_cache() {
+    local cache_file=".history_book/$1"
+    _history_book_items=()
+    if [ -r "$cache_file" ]; then
+        mapfile -t _history_book_items < "$cache_file"
+    fi
+}
+
+_history_book() {
+    local cur="${COMP_WORDS[COMP_CWORD]}"
+    local prev="${COMP_WORDS[COMP_CWORD-1]}"
+    local subcommands="add list run bench edit suggest import export merge shard daemon completion version changelog"
+    local IFS=$'\n'
+    COMPREPLY=()
+
+    if [ "$COMP_CWORD" -eq 1 ]; then
+        COMPREPLY=( $(IFS=' '; compgen -W "$subcommands" -- "$cur") )
+        return 0
+    fi
+
+    case "${COMP_WORDS[1]}" in
+        run|bench)
+            if [ "$COMP_CWORD" -eq 2 ]; then
+                _history_book_cache names
+                COMPREPLY=( $(compgen -W "${_history_book_items[*]}" -- "$cur") )
+            fi
+            ;;
+        list)
+            if [ "$prev" = "--tags" ]; then
+                # Tags are comma-separated: complete only the last segment
+                local head="" last="${cur##*,}"
+                [[ "$cur" == *,* ]] && head="${cur%,*},"
+                _history_book_cache tags
+                COMPREPLY=( $(compgen -P "$head" -W "${_history_book_items[*]}" -- "$last") )
+            else
+                COMPREPLY=( $(compgen -W "--tags" -- "$cur") )
+            fi
+            ;;
+    esac
+    return 0
+}
+
+complete -F _history_book history_book
@@ -0,0 +1,26 @@
+# Fish completion for History Book.
+# Enable with:  history_book completion fish | source
+#
+# Names and tags are read from the plain-text cache that History Book writes
+# next to project_commands.json, so completing never starts Python.
+
+function __history_book_cache
+    test -r .history_book/$argv[1]; or return
+    while read -l item
+        echo $item
+    end < .history_book/$argv[1]
+end
+
+function __history_book_tag_candidates
+    # Tags are comma-separated: keep what was already typed before the last comma
+    set -l current (commandline -ct | string replace -r '^--tags=' '')
+    set -l head (string match -r '^.*,' -- $current)
+    for tag in (__history_book_cache tags)
+        echo $head$tag
+    end
+end
+
+complete -c history_book -f
+complete -c history_book -n __fish_use_subcommand -a 'add list run bench edit suggest import export merge shard daemon completion version changelog'
+complete -c history_book -n '__fish_seen_subcommand_from run bench; and test (count (commandline -opc)) -eq 2' -a '(__history_book_cache names)'
+complete -c history_book -n '__fish_seen_subcommand_from list' -l tags -x -a '(__history_book_tag_candidates)'
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import re
+import shlex
+import subprocess
+
+# --- Configuration ---
+SNAPSHOT_DIR_NAME = "env" # Inside the cache directory (.history_book/env/)
+VOLATILE_VARS = {"PWD", "OLDPWD", "SHLVL", "_"} # Set by the shell itself, never part of a snapshot
+KNOWN_DEPENDENCIES = { # Files read by common activation tools, whether or not the setup names them
+    "nvm": [".nvmrc", ".node-version"],
+    "direnv": [".envrc"],
+    "pyenv": [".python-version"],
+    "rbenv": [".ruby-version"],
+    "asdf": [".tool-versions"],
+    "conda": ["environment.yml"],
+}
+# --- End Configuration ---
+
+# An entry's optional 'setup' (e.g. "source .venv/bin/activate") is run once
+# with `env -0` appended, and the variables it changed are stored as a snapshot:
+#   {"setup": "...", "cwd": "/abs/project", "dependencies": {"/abs/.venv/bin/activate": 1700000000000000000},
+#    "base": {"PATH": "/usr/bin:/bin"}, "set": {"PATH": "/abs/.venv/bin:/usr/bin:/bin", ...}, "unset": [...]}
+# Later runs apply the snapshot to their own environment instead of running the
+# setup. It goes stale when a dependency's mtime changes (or it appears or
+# disappears) or when a variable it changed had a different value beforehand.
+
+# --- Dependencies ---
+
+def find_dependencies(setup, cwd):
+    """Returns the absolute paths whose modification invalidates a snapshot:
+    existing files named in the setup, plus the files its tools are known to read."""
+    try:
+        words = set(shlex.split(setup))
+    except ValueError: # Unbalanced quotes; the shell will complain when it runs
+        words = set(setup.split())
+    words.update(re.findall(r'[\w.~/-]+', setup)) # Also finds tools inside "$(direnv export bash)"
+    paths = set()
+    for word in words:
+        path = os.path.join(cwd, os.path.expanduser(word))
+        if os.path.isfile(path):
+            paths.add(os.path.abspath(path))
+        for file_name in KNOWN_DEPENDENCIES.get(os.path.basename(word), []):
+            paths.add(os.path.abspath(os.path.join(cwd, file_name)))
+    return sorted(paths)
+
+def _mtimes(paths):
+    """Returns {path: mtime in ns}, with None for files that do not exist."""
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+# --- Capturing ---
+
+def parse_env0(output):
+    """Parses the NUL-separated output of `env -0`."""
+    variables = {}
+    for item in output.split(b'\0'):
+        name, separator, value = item.decode('utf-8', errors='surrogateescape').partition('=')
+        if separator and name:
+            variables[name] = value
+    return variables
+
+def capture(setup, cwd, base_env):
+    """Runs the setup once and returns a snapshot of what it changed, or None
+    if the setup failed or `env -0` is not available."""
+    # The setup's own output goes to stderr so only `env -0` reaches the pipe
+    script = f"{{ {setup}\n}} >&2 && env -0"
+    result = subprocess.run(script, shell=True, cwd=cwd, env=base_env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+    if result.returncode != 0 or not result.stdout:
+        return None
+    after = parse_env0(result.stdout)
+    changed = {name: value for name, value in after.items() if name not in VOLATILE_VARS and base_env.get(name) != value}
+    unset = sorted(name for name in base_env if name not in after and name not in VOLATILE_VARS)
+    return {
+        "setup": setup,
+        "cwd": cwd,
+        "dependencies": _mtimes(find_dependencies(setup, cwd)),
+        "base": {name: base_env.get(name) for name in list(changed) + unset},
+        "set": changed,
+        "unset": unset,
+    }
+
+def is_fresh(snapshot, base_env):
+    """True while the snapshot still describes what the setup would do now."""
+    if _mtimes(snapshot['dependencies']) != snapshot['dependencies']:
+        return False
+    return all(base_env.get(name) == value for name, value in snapshot['base'].items())
+
+def apply(snapshot, base_env):
+    """Returns `base_env` with the snapshot's changes applied."""
+    env = dict(base_env)
+    env.update(snapshot['set'])
+    for name in snapshot['unset']:
+        env.pop(name, None)
+    return env
+
+# --- Cache ---
+
+def get_snapshot_path(cache_dir, setup, cwd):
+    """Snapshots are keyed by the setup text and the directory it runs in."""
+    key = hashlib.sha256(f"{cwd}\0{setup}".encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, SNAPSHOT_DIR_NAME, f"{key}.json")
+
+def _ignore_in_git(directory):
+    """Keeps the snapshots out of git even where .history_book/ itself is committed."""
+    try:
+        with open(os.path.join(directory, '.gitignore'), 'x', encoding='utf-8') as f:
+            f.write("# Environment snapshots may contain secrets; never commit them.\n*\n")
+    except FileExistsError:
+        pass
+
+def load_snapshot(cache_dir, setup, cwd):
+    try:
+        with open(get_snapshot_path(cache_dir, setup, cwd), 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get('setup') != setup or snapshot.get('cwd') != cwd:
+        return None # A hash collision, or a hand-edited file
+    return snapshot
+
+def get_environment(setup, cache_dir, cwd, write_text, refresh=False, base_env=None):
+    """Returns (environment, from_cache) for running a command after `setup`.
+    Uses the cached snapshot while it is fresh, and captures and stores a new
+    one otherwise. Returns (None, False) when no snapshot could be captured;
+    the caller should then run the setup in the shell as before."""
+    base_env = dict(os.environ) if base_env is None else base_env
+    cwd = os.path.abspath(cwd)
+    snapshot = None if refresh else load_snapshot(cache_dir, setup, cwd)
+    if snapshot is not None and is_fresh(snapshot, base_env):
+        return apply(snapshot, base_env), True
+
+    snapshot = capture(setup, cwd, base_env)
+    if snapshot is None:
+        return None, False
+    path = get_snapshot_path(cache_dir, setup, cwd)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _ignore_in_git(os.path.dirname(path))
+        write_text(path, json.dumps(snapshot, indent=2))
+    except OSError:
+        pass # Still usable for this run; the next one captures again
+    return apply(snapshot, base_env), False
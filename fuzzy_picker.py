@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+try:
+    import curses
+except ImportError: # e.g., Windows builds of Python without curses
+    curses = None
+
+# --- Configuration ---
+PICKER_THRESHOLD = 50 # Lists at least this long use the fuzzy picker instead of whiptail
+PICKER_ENV_VAR = "HISTORY_BOOK_PICKER" # "fuzzy" or "whiptail" forces one or the other
+WORD_BOUNDARIES = " -_/.:=|;&"
+# --- End Configuration ---
+
+# --- Matching ---
+
+def fuzzy_score(query, text):
+    """Scores how well `query` matches `text` as a case-insensitive subsequence.
+    Returns None when some character of the query does not occur in order.
+    Higher is better: contiguous runs, word starts and substring hits score more."""
+    if not query:
+        return 0
+    score = 0
+    position = 0
+    previous = -2
+    for char in query:
+        found = text.find(char, position)
+        if found < 0:
+            return None
+        if found == previous + 1:
+            score += 5 # Contiguous with the previous match
+        elif found == 0 or text[found - 1] in WORD_BOUNDARIES:
+            score += 3 # Start of a word
+        else:
+            score -= min(found - position, 3) # Small penalty for gaps
+        score += 1
+        previous = found
+        position = found + 1
+    substring_at = text.find(query)
+    if substring_at == 0:
+        score += 15
+    elif substring_at > 0:
+        score += 10
+    return score
+
+
+class FuzzyFilter:
+    """Ranks items against a query that is typed one key at a time.
+    When the query grows, only the previous matches are re-scored; results for
+    the prefixes of the current query are kept so backspace is free."""
+
+    def __init__(self, items):
+        self.keys = [item.lower() for item in items]
+        self._results = {"": list(range(len(items)))}
+
+    def update(self, query):
+        """Returns the indices of matching items, best match first."""
+        query = query.lower()
+        # Only prefixes of the current query can be reused; drop the rest
+        self._results = {q: r for q, r in self._results.items() if query.startswith(q)}
+        if query in self._results:
+            return self._results[query]
+
+        longest_prefix = max(self._results, key=len)
+        scored = []
+        for index in self._results[longest_prefix]:
+            score = fuzzy_score(query, self.keys[index])
+            if score is not None:
+                scored.append((-score, len(self.keys[index]), index))
+        scored.sort() # Ties go to the shorter item, then to book order
+        ranked = [index for _, _, index in scored]
+        self._results[query] = ranked
+        return ranked
+
+# --- Availability ---
+
+def is_available():
+    """Returns True when a curses UI can be shown on this terminal."""
+    return curses is not None and sys.stdin.isatty() and sys.stdout.isatty()
+
+def should_use_picker(item_count):
+    """Decides between the fuzzy picker and the whiptail fallback."""
+    preference = os.environ.get(PICKER_ENV_VAR, "").lower()
+    if preference == "whiptail" or not is_available():
+        return False
+    return preference == "fuzzy" or item_count >= PICKER_THRESHOLD
+
+# --- Curses UI ---
+
+def _draw(screen, items, ranked, state, prompt, multi):
+    height, width = screen.getmaxyx()
+    list_height = max(1, height - 2)
+    cursor = state['cursor']
+    # Scroll just enough to keep the cursor on screen
+    if cursor < state['offset']:
+        state['offset'] = cursor
+    elif cursor >= state['offset'] + list_height:
+        state['offset'] = cursor - list_height + 1
+    offset = state['offset']
+
+    screen.erase()
+    hint = "TAB: toggle  ENTER: confirm  ESC: cancel" if multi else "ENTER: select  ESC: cancel"
+    screen.addnstr(0, 0, f"{prompt} ({len(ranked)}/{len(items)})  {hint}", width - 1, curses.A_BOLD)
+    # Virtualized: only the visible slice is drawn, whatever the list size
+    for row, index in enumerate(ranked[offset:offset + list_height]):
+        marker = ("[x] " if index in state['selected'] else "[ ] ") if multi else ""
+        attr = curses.A_REVERSE if offset + row == cursor else curses.A_NORMAL
+        label = items[index].replace('\n', ' ') # Multi-line commands must stay on one row
+        screen.addnstr(1 + row, 0, marker + label, width - 1, attr)
+    screen.addnstr(height - 1, 0, f"> {state['query']}", width - 1)
+    screen.refresh()
+
+def _run_picker(screen, items, prompt, multi):
+    try:
+        curses.curs_set(1)
+    except curses.error:
+        pass
+    screen.keypad(True)
+    fuzzy_filter = FuzzyFilter(items)
+    state = {'query': "", 'cursor': 0, 'offset': 0, 'selected': set()}
+    ranked = fuzzy_filter.update("")
+
+    while True:
+        _draw(screen, items, ranked, state, prompt, multi)
+        page = max(1, screen.getmaxyx()[0] - 2)
+        key = screen.get_wch()
+
+        if key in ('\n', '\r', curses.KEY_ENTER):
+            if multi and state['selected']:
+                return sorted(state['selected'])
+            return [ranked[state['cursor']]] if ranked else None
+        if key == '\x1b': # ESC
+            return None
+        if key == curses.KEY_UP:
+            state['cursor'] = max(0, state['cursor'] - 1)
+            continue
+        if key == curses.KEY_DOWN:
+            state['cursor'] = min(max(0, len(ranked) - 1), state['cursor'] + 1)
+            continue
+        if key == curses.KEY_PPAGE:
+            state['cursor'] = max(0, state['cursor'] - page)
+            continue
+        if key == curses.KEY_NPAGE:
+            state['cursor'] = min(max(0, len(ranked) - 1), state['cursor'] + page)
+            continue
+        if key == '\t':
+            if multi and ranked:
+                state['selected'] ^= {ranked[state['cursor']]}
+                state['cursor'] = min(len(ranked) - 1, state['cursor'] + 1)
+            continue
+
+        if key in (curses.KEY_BACKSPACE, '\x7f', '\b'):
+            state['query'] = state['query'][:-1]
+        elif key == '\x15': # Ctrl-U clears the query
+            state['query'] = ""
+        elif isinstance(key, str) and key.isprintable():
+            state['query'] += key
+        else:
+            continue # Resize and unhandled keys only need a redraw
+
+        # Re-rank incrementally; the best match moves to the top after every edit
+        ranked = fuzzy_filter.update(state['query'])
+        state['cursor'] = 0
+
+def pick(items, prompt, multi=False):
+    """Shows an incremental fuzzy finder over `items`.
+    Returns the list of selected indices, or None if the user cancelled."""
+    if not items:
+        return None
+    os.environ.setdefault('ESCDELAY', '25') # Make ESC cancel without a noticeable pause
+    return curses.wrapper(_run_picker, items, prompt, multi)
@@ -1,84 +1,343 @@
 #!/usr/bin/env python3
 
+import time
+PROCESS_START = time.perf_counter() # Taken before the remaining imports so --profile can report them
+
 import argparse
+import contextlib
+import io
 import json
 import os
+import shutil
+import stat
 import subprocess
 import sys
 from datetime import datetime
-import tempfile # NEW: Import tempfile for temporary file handling
+import tempfile
+import uuid
+from collections import deque
 
 from whiptail import Whiptail
 
+import book_io
+import book_merge
+import book_shards
+import command_bench
+import command_template
+import history_daemon
+import history_follower
+import metrics
+import name_index
+import sequence_mining
+import shell_export
+import tracing
+# Modules only some subcommands need (scraping, pickers, the thread pool, ...) are imported in their handlers
+IMPORTS_DONE = time.perf_counter()
+
 # --- Configuration ---
 COMMANDS_FILE = "project_commands.json"
-ADD_SCRIPT_PATH = os.path.join(os.path.dirname(__file__), 'scrape_history.py')
 VERSION_FILE = os.path.join(os.path.dirname(__file__), 'VERSION')
 CHANGELOG_FILE = os.path.join(os.path.dirname(__file__), 'CHANGELOG.md')
+COMPLETIONS_DIR = os.path.join(os.path.dirname(__file__), 'completions')
+CACHE_DIR_NAME = ".history_book" # Derived files kept next to the book (completion cache, etc.)
+SKIPPED_PROJECT_DIRS = {"node_modules", "venv", "__pycache__"} # Never searched by 'run --all-projects'
+FOLLOW_QUEUE_LIMIT = 20 # Candidates waiting for a key press in 'add --follow'
+DEFAULT_JOBS = min(8, os.cpu_count() or 1) # Parallel projects for 'run --in/--all-projects'
+COMPLETION_SCRIPTS = {
+    "bash": "history_book.bash",
+    "zsh": "_history_book",
+    "fish": "history_book.fish",
+}
 
 # --- Helper Functions ---
 
-def load_commands_data():
-    """Loads and returns the commands from the JSON file.
-    Ensures default fields for older entries."""
-    if not os.path.exists(COMMANDS_FILE):
-        return []
+def load_commands_data(commands_file=None, shards=None):
+    """Loads and returns the commands from the JSON file (this project's book by default).
+    Ensures default fields for older entries. For a sharded book, `shards`
+    limits loading to those shard keys."""
+    commands_file = commands_file or COMMANDS_FILE
+    with tracing.span("load_commands_data"):
+        sharded = book_shards.is_sharded(commands_file)
+        if not sharded and not os.path.exists(commands_file):
+            return []
+        try:
+            if sharded:
+                data = book_shards.load_entries(commands_file, shards)
+            else:
+                with open(commands_file, 'r') as f:
+                    data = json.load(f)
+            # Ensure all expected fields exist with defaults for backward compatibility
+            book_merge.assign_missing_ids(data) # Deterministic, so every clone agrees on them
+            for item in data:
+                if 'name' not in item:
+                    item['name'] = "" # Commands added before 'name' existed
+                if 'description' not in item:
+                    item['description'] = ""
+                if 'tags' not in item:
+                    item['tags'] = []
+                if 'last_run' not in item:
+                    item['last_run'] = None
+                if 'quiet' not in item:
+                    item['quiet'] = False
+            # Runs recorded by exported shell functions that are not yet in the book
+            shell_export.apply_run_log(data, shell_export.read_run_log(get_cache_dir(commands_file)))
+            return data
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Error: Could not read or parse '{commands_file}': {e}")
+            sys.exit(1)
+
+def get_cache_dir(commands_file=None):
+    """Returns the directory holding files derived from the book."""
+    return os.path.join(os.path.dirname(commands_file or COMMANDS_FILE), CACHE_DIR_NAME)
+
+UMASK = os.umask(0o022) # Read once while still single-threaded; os.umask can only be read by setting it
+os.umask(UMASK)
+
+def atomic_write_text(path, text, mode=None):
+    """Writes text to a temporary file and renames it over `path`,
+    so readers never observe a partially written file. The file keeps the
+    permissions of the one it replaces; a new file gets `mode`, or 0666
+    minus the umask like any file created with open()."""
+    directory = os.path.dirname(path) or '.'
     try:
-        with open(COMMANDS_FILE, 'r') as f:
-            data = json.load(f)
-        # Ensure all expected fields exist with defaults for backward compatibility
-        for item in data:
-            if 'id' not in item:
-                item['id'] = str(uuid.uuid4()) # Add ID if missing
-            if 'name' not in item:
-                item['name'] = "" # Commands added before 'name' existed
-            if 'description' not in item:
-                item['description'] = ""
-            if 'tags' not in item:
-                item['tags'] = []
-            if 'last_run' not in item:
-                item['last_run'] = None
-            if 'quiet' not in item:
-                item['quiet'] = False
-        return data
-    except (json.JSONDecodeError, IOError) as e:
-        print(f"Error: Could not read or parse '{COMMANDS_FILE}': {e}")
-        sys.exit(1)
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = (0o666 & ~UMASK) if mode is None else mode
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        os.fchmod(fd, mode) # mkstemp always creates 0600
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def _write_private_text(path, text):
+    """atomic_write_text for files that may hold secrets, such as environment snapshots."""
+    atomic_write_text(path, text, mode=0o600)
 
-def save_commands_data(data):
-    """Saves the list of commands to the JSON file."""
+def write_completion_cache(data, commands_file=None):
+    """Writes the plain-text name and tag lists read by the shell completion scripts."""
+    cache_dir = get_cache_dir(commands_file)
+    names = sorted({cmd.get('name', '') for cmd in data} - {''})
+    tags = sorted({tag for cmd in data for tag in cmd.get('tags', [])})
+    os.makedirs(cache_dir, exist_ok=True)
+    atomic_write_text(os.path.join(cache_dir, 'names'), "".join(f"{name}\n" for name in names))
+    atomic_write_text(os.path.join(cache_dir, 'tags'), "".join(f"{tag}\n" for tag in tags))
+
+def get_book_signature(commands_file=None):
+    """Identifies the current on-disk version of the book (None if it does not exist).
+    For a sharded book this is the manifest, which changes whenever names do."""
+    commands_file = commands_file or COMMANDS_FILE
     try:
-        with open(COMMANDS_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
-        print(f"✅ Successfully saved/updated commands to {COMMANDS_FILE}")
-    except IOError as e:
-        print(f"❌ Error saving to {COMMANDS_FILE}: {e}")
+        stat = os.stat(book_shards.get_manifest_path(commands_file) if book_shards.is_sharded(commands_file) else commands_file)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+def write_name_index(data, commands_file=None):
+    """Builds and stores the name index used to resolve abbreviated or misspelled names."""
+    index = name_index.build_index((cmd.get('name', '') for cmd in data), get_book_signature(commands_file))
+    cache_dir = get_cache_dir(commands_file)
+    os.makedirs(cache_dir, exist_ok=True)
+    atomic_write_text(os.path.join(cache_dir, 'name_index.json'), json.dumps(index))
+    return index
 
-def update_last_run(command_id): # Changed to use command ID for robustness
-    """Updates the 'last_run' timestamp for a command by its ID."""
-    all_commands = load_commands_data()
+def load_name_index(commands_file=None):
+    """Returns the stored name index, rebuilding it if the book changed since it was written."""
+    try:
+        with open(os.path.join(get_cache_dir(commands_file), 'name_index.json'), 'r') as f:
+            index = json.load(f)
+        if index.get('signature') == get_book_signature(commands_file):
+            return index
+    except (FileNotFoundError, json.JSONDecodeError, IOError):
+        pass
+    try:
+        return write_name_index(load_commands_data(commands_file), commands_file)
+    except IOError:
+        return name_index.build_index(cmd.get('name', '') for cmd in load_commands_data(commands_file))
+
+def refresh_derived_files(data, commands_file=None):
+    """Regenerates everything in the cache directory that mirrors the book."""
+    with tracing.span("refresh_derived_files"):
+        try:
+            write_completion_cache(data, commands_file)
+            write_name_index(data, commands_file)
+            shell_export.refresh_exports(data, get_cache_dir(commands_file), atomic_write_text)
+        except IOError as e:
+            print(f"Warning: Could not update files in {get_cache_dir(commands_file)}: {e}")
+
+def save_commands_data(data, commands_file=None):
+    """Saves the list of commands to the JSON file (this project's book by default)
+    and refreshes derived caches."""
+    commands_file = commands_file or COMMANDS_FILE
+    with tracing.span("save_commands_data"):
+        cache_dir = get_cache_dir(commands_file)
+        command_template.compile_entries(data) # Placeholders are parsed here, not on every run
+        book_merge.stamp_entries(data)
+        # Fold runs recorded by exported shell functions into the book being written
+        shell_export.apply_run_log(data, shell_export.begin_run_log_merge(cache_dir))
+        try:
+            if book_shards.is_sharded(commands_file):
+                book_shards.write_book(data, commands_file, atomic_write_text) # Only changed shards are rewritten
+            else:
+                atomic_write_text(commands_file, json.dumps(data, indent=2))
+            print(f"✅ Successfully saved/updated commands to {commands_file}")
+        except IOError as e:
+            print(f"❌ Error saving to {commands_file}: {e}")
+            return
+        shell_export.finish_run_log_merge(cache_dir)
+        refresh_derived_files(data, commands_file)
+
+def update_last_run(command_id, commands_file=None, name=None): # Changed to use command ID for robustness
+    """Updates the 'last_run' timestamp for a command by its ID.
+    In a sharded book, `name` locates the shard so only that one is rewritten."""
+    commands_file = commands_file or COMMANDS_FILE
+    last_run = datetime.utcnow().isoformat() + "Z"
+    response = history_daemon.request(commands_file, 'touch', id=command_id, last_run=last_run)
+    if response is not None:
+        if not response.get('found'):
+            print(f"Warning: Could not find command with ID '{command_id}' to update last_run timestamp.")
+        return
+
+    if book_shards.is_sharded(commands_file):
+        manifest = book_shards.load_manifest(commands_file)
+        # The named shard first; the others only if the name is stale
+        keys = book_shards.shards_for_name(manifest, name) + manifest['shards']
+        for key in dict.fromkeys(keys):
+            entries = book_shards.read_shard(commands_file, key)
+            for cmd in entries:
+                if cmd.get('id') == command_id:
+                    cmd['last_run'] = last_run
+                    try:
+                        book_shards.write_shard(commands_file, key, entries, atomic_write_text)
+                    except IOError as e:
+                        print(f"❌ Error saving to {commands_file}: {e}")
+                    return
+        print(f"Warning: Could not find command with ID '{command_id}' to update last_run timestamp.")
+        return
+
+    all_commands = load_commands_data(commands_file)
     command_found = False
     for cmd in all_commands:
         if cmd.get('id') == command_id: # Match by ID
-            cmd['last_run'] = datetime.utcnow().isoformat() + "Z"
+            cmd['last_run'] = last_run
             command_found = True
             break
             
     if command_found:
-        save_commands_data(all_commands) # Use the new save function
+        save_commands_data(all_commands, commands_file) # Use the new save function
     else:
         print(f"Warning: Could not find command with ID '{command_id}' to update last_run timestamp.")
 
 
+def find_command_entry(name, commands_file=None):
+    """Returns the first saved entry with the given short name, or None.
+    Asks the resident daemon first and falls back to loading the book."""
+    commands_file = commands_file or COMMANDS_FILE
+    response = history_daemon.request(commands_file, 'lookup', name=name)
+    if response is not None:
+        return response['entry']
+
+    shards = None
+    if book_shards.is_sharded(commands_file):
+        shards = book_shards.shards_for_name(book_shards.load_manifest(commands_file), name)
+        if not shards:
+            return None
+    for cmd_entry in load_commands_data(commands_file, shards):
+        if cmd_entry.get('name') == name:
+            return cmd_entry
+    return None
+
+def resolve_command_entry(name, commands_file=None, prefix=""):
+    """Finds an entry by exact name, falling back to a unique abbreviation.
+    Prints why nothing was resolved (ambiguity or spelling suggestions) and returns None.
+    `prefix` is prepended to those messages (e.g., the project directory)."""
+    entry = find_command_entry(name, commands_file)
+    if entry is not None:
+        return entry
+
+    kind, names = name_index.resolve(load_name_index(commands_file), name)
+    if kind in ('exact', 'prefix'):
+        # 'exact' means the book gained the name after the lookup above (e.g., a
+        # daemon answering from a stale copy); it resolves silently like a direct hit
+        entry = find_command_entry(names[0], commands_file)
+        if entry is not None:
+            if kind == 'prefix':
+                print(f"{prefix}Resolved '{name}' to '{names[0]}'.")
+            return entry
+        print(f"{prefix}Error: No command with the name '{name}' found.")
+    elif kind == 'ambiguous':
+        print(f"{prefix}Error: '{name}' is ambiguous. It could be: {', '.join(names)}")
+    elif kind == 'suggest':
+        print(f"{prefix}Error: No command with the name '{name}' found. Did you mean: {', '.join(names)}?")
+    else:
+        print(f"{prefix}Error: No command with the name '{name}' found.")
+    return None
+
+def build_command_text(entry, assignments):
+    """Returns the shell command to execute for an entry, filling template
+    placeholders from 'key=value' arguments if the entry takes parameters.
+    Raises ValueError for bad parameters."""
+    parts = None
+    if entry.get('params'):
+        parts = entry.get('template') or command_template.compile_template(entry['command'])
+    if assignments and not command_template.placeholder_names(parts):
+        if not entry.get('params'):
+            raise ValueError("This command does not take key=value parameters. "
+                             "Turn them on with 'edit --where-name NAME --set-params on'.")
+        raise ValueError("This command has no {placeholders}, so it takes no key=value parameters.")
+    if parts is None:
+        return entry['command']
+    return command_template.render(parts, command_template.parse_assignments(assignments))
+
+def acquire_tokens(entry, quiet=False):
+    """Returns a context holding the entry's machine-wide resource tokens
+    (e.g. 'heavy:4') while its command runs; a no-op for entries without one.
+    Raises ValueError for a malformed declaration before anything is acquired."""
+    import token_pool
+    if not entry.get('resource'):
+        return contextlib.nullcontext()
+    token_pool.parse_resource(entry['resource'])
+
+    def report_wait(resource_class, cost):
+        if not quiet:
+            print(f"Waiting for {cost} '{resource_class}' token(s)...")
+    return token_pool.acquire(entry['resource'], on_wait=report_wait)
+
+def apply_setup(entry, command_text, commands_file=None, directory='.', refresh=False):
+    """Returns (command_text, env) for running an entry. An entry's 'setup'
+    (e.g. 'source .venv/bin/activate') is replaced by its cached environment
+    snapshot; if none can be captured, the setup runs in front of the command
+    as before and env is None (inherit ours)."""
+    import env_snapshot
+    setup = entry.get('setup')
+    if not setup:
+        return command_text, None
+    with tracing.span("environment snapshot"):
+        env, _ = env_snapshot.get_environment(setup, get_cache_dir(commands_file), directory, _write_private_text, refresh)
+    if env is None:
+        return f"{setup} && {command_text}", None
+    return command_text, env
+
+
 # --- Command Functions ---
 
 def list_commands(args):
     """Handles the 'list' command, including tag filtering."""
-    commands = load_commands_data() # Use new load function
-    
     # Prepare tags for case-insensitive comparison
     filter_tags = set(tag.lower() for tag in args.tags.split(',')) if args.tags else None
 
+    response = history_daemon.request(COMMANDS_FILE, 'list')
+    if response is not None:
+        commands = response['commands']
+    elif filter_tags and book_shards.is_sharded(COMMANDS_FILE):
+        # Only the shards holding one of the tags are read
+        commands = load_commands_data(shards=book_shards.shards_for_tags(book_shards.load_manifest(COMMANDS_FILE), filter_tags))
+    else:
+        commands = load_commands_data()
+
     print("\n--- Project Commands ---\n")
     
     commands_to_display = []
@@ -104,6 +363,8 @@ def list_commands(args):
         quiet_status = " (Quiet)" if cmd.get('quiet', False) else ""
 
         print(f"{name_part.ljust(30)} {tags_part}")
+        if cmd.get('setup'): # Runs first (or comes from its cached environment)
+            print(f"  ├─ \033[2;37msetup: {cmd['setup']}\033[0m")
         print(f"  └─ \033[0;32m{command_text}\033[0m") # Green
         if description_text:
             print(f"     \033[2;37m{description_text}{quiet_status}\033[0m") # Dim White, include quiet status here
@@ -113,83 +374,425 @@ def list_commands(args):
 
 def run_command(args):
     """Handles the 'run' command."""
-    commands = load_commands_data() # Use new load function
-    command_to_run_entry = None
-    
-    for cmd_entry in commands: # Iterate through full entries
-        if cmd_entry.get('name') == args.name:
-            command_to_run_entry = cmd_entry
-            break
+    if args.dirs or args.all_projects:
+        run_in_projects(args)
+        return
+    command_to_run_entry = resolve_command_entry(args.name)
             
     if command_to_run_entry:
+        name = command_to_run_entry.get('name') or args.name # The resolved name, if abbreviated
         effective_quiet = args.quiet or command_to_run_entry.get('quiet', False)
-        
-        if not effective_quiet:
-            print(f"Running '{args.name}': \033[1;32m{command_to_run_entry['command']}\033[0m\n")
         try:
-            subprocess.run(command_to_run_entry['command'], shell=True, check=True)
+            command_text = build_command_text(command_to_run_entry, args.params)
+            tokens = acquire_tokens(command_to_run_entry, effective_quiet)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+
+        succeeded = False
+        try:
+            # Capturing the setup's environment runs it, which can fail or be interrupted too
+            command_text, env = apply_setup(command_to_run_entry, command_text, refresh=args.refresh_env)
+            run_options = {} if env is None else {'env': env} # Inherit our environment unless a snapshot replaces it
             if not effective_quiet:
-                print(f"\n✅ Command '{args.name}' completed successfully.")
-            update_last_run(command_to_run_entry['id']) # Update timestamp on successful run by ID
+                print(f"Running '{name}': \033[1;32m{command_text}\033[0m\n")
+            with tokens, tracing.span(f"run '{name}'"):
+                started = time.perf_counter() # Token waits are not part of the command's duration
+                try:
+                    subprocess.run(command_text, shell=True, check=True, **run_options)
+                    succeeded = True
+                finally:
+                    metrics.record_run(name, command_to_run_entry.get('tags', []), time.perf_counter() - started, succeeded)
+            if not effective_quiet:
+                print(f"\n✅ Command '{name}' completed successfully.")
+            update_last_run(command_to_run_entry['id'], name=name) # Update timestamp on successful run by ID
         except subprocess.CalledProcessError as e:
-            print(f"\n❌ Error: Command '{args.name}' failed with exit code {e.returncode}.")
+            print(f"\n❌ Error: Command '{name}' failed with exit code {e.returncode}.")
+        except OSError as e: # E.g. a token pool this user cannot write to
+            print(f"\n❌ Error: Could not run '{name}': {e}")
         except KeyboardInterrupt:
             print("\nOperation cancelled by user.")
+
+def _plan_bench(args):
+    """Resolves what 'bench' times. Returns (entry, command_text, env, tokens),
+    or None after reporting why nothing can be timed."""
+    if args.runs < 1 or args.warmup < 0:
+        print("Error: --runs must be at least 1 and --warmup at least 0.")
+        return None
+    entry = resolve_command_entry(args.name)
+    if entry is None:
+        return None
+    try:
+        command_text = build_command_text(entry, args.params)
+        tokens = acquire_tokens(entry)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+    try:
+        command_text, env = apply_setup(entry, command_text)
+    except OSError as e:
+        print(f"❌ Error: Could not run the setup of '{entry.get('name') or args.name}': {e}")
+        return None
+    return entry, command_text, env, tokens
+
+def _time_bench_runs(args, name, path, argv, env, tokens):
+    """Runs the warmup and timed runs while holding the entry's tokens.
+    Returns the timed samples, or None after reporting a failed run."""
+    samples = {'wall': [], 'user': [], 'sys': []}
+    try:
+        with tokens, tracing.span(f"bench '{name}'"):
+            for i in range(args.warmup + args.runs):
+                if args.prepare:
+                    subprocess.run(args.prepare, shell=True, check=True, env=env)
+                exit_code, wall, user, system = command_bench.run_once(path, argv, env, args.show_output)
+                if exit_code != 0:
+                    print(f"❌ Error: Run {i + 1} of '{name}' failed with exit code {exit_code}. Rerun with --show-output to see why.")
+                    return None
+                if i >= args.warmup:
+                    for key, value in (('wall', wall), ('user', user), ('sys', system)):
+                        samples[key].append(round(value, 6))
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Error: The --prepare command failed with exit code {e.returncode}.")
+        return None
+    except OSError as e:
+        print(f"❌ Error: Could not start '{name}': {e}")
+        return None
+    return samples
+
+def bench_command(args):
+    """Handles the 'bench' command: times repeated runs of a saved command,
+    stores the samples and optionally compares them with the previous result."""
+    plan = _plan_bench(args)
+    if plan is None:
+        sys.exit(1)
     else:
-        print(f"Error: No command with the name '{args.name}' found.")
+        entry, command_text, env, tokens = plan
+        name = entry.get('name') or args.name
+        path, argv, direct = command_bench.plan_invocation(command_text, env) # A setup snapshot may change PATH
 
-def add_commands(args):
-    """Handles the 'add' command by calling the scraper script."""
-    print("Launching the command selection interface...")
-    
-    # Use a temporary file to capture JSON output from scrape_history.py
-    # This allows scrape_history.py to use the terminal directly for whiptail
-    with tempfile.NamedTemporaryFile(mode='w+', delete=False, encoding='utf-8') as temp_output_file:
-        temp_file_path = temp_output_file.name
-    
+        print(f"Benchmarking '{name}': \033[1;32m{command_text}\033[0m")
+        print(f"  {'Executed directly' if direct else 'Executed through ' + command_bench.SHELL}, "
+              f"{args.warmup} warmup and {args.runs} timed run(s)\n")
+        try:
+            samples = _time_bench_runs(args, name, path, argv, env, tokens)
+        except KeyboardInterrupt:
+            print("\nBenchmark cancelled by user.")
+        else:
+            if samples is None:
+                sys.exit(1)
+            else:
+                _report_bench(args, entry, command_text, direct, samples)
+
+def _report_bench(args, entry, command_text, direct, samples):
+    """Prints the statistics of a finished benchmark, compares them with the
+    previous result if asked, and stores them. Exits 1 on a regression."""
+    import statistics
+    fmt = command_bench.format_seconds
+    stats = command_bench.summarize(samples['wall'])
+    print(f"  Time (mean ± σ):   {fmt(stats['mean'])} ± {fmt(stats['stdev'])}    "
+          f"[User: {fmt(statistics.fmean(samples['user']))}, System: {fmt(statistics.fmean(samples['sys']))}]")
+    print(f"  Range (min … max): {fmt(stats['min'])} … {fmt(stats['max'])}    [Median: {fmt(stats['median'])}]")
+    outliers = command_bench.find_outliers(samples['wall'])
+    if outliers:
+        hint = " The first run was one; try --warmup." if 0 in outliers and not args.warmup else ""
+        print(f"  ⚠️ {len(outliers)} statistical outlier(s) detected; other activity may have disturbed the measurement.{hint}")
+
+    cache_dir = get_cache_dir()
+    result = dict(
+        timestamp=datetime.utcnow().isoformat() + "Z", command=command_text, direct=direct,
+        runs=args.runs, warmup=args.warmup, prepare=args.prepare, **samples
+    )
+    previous = command_bench.load_results(cache_dir, entry['id'])
+    regression = False
+    if args.compare:
+        if not previous:
+            print("\nNo earlier result to compare with.")
+        else:
+            change, significant, regression = command_bench.compare(previous[-1], result)
+            old = command_bench.summarize(previous[-1]['wall'])
+            if regression:
+                verdict = "❌ regression"
+            elif significant:
+                verdict = "faster" if change < 0 else "slower"
+            else:
+                verdict = "no significant change"
+            print(f"\nCompared with {previous[-1]['timestamp']} ({fmt(old['mean'])} ± {fmt(old['stdev'])}): {change:+.1%}, {verdict}")
+            if previous[-1].get('command') != command_text:
+                print(f"  Note: the command was '{previous[-1].get('command')}' then.")
+    if not args.no_save:
+        try:
+            command_bench.save_result(cache_dir, entry['id'], result, atomic_write_text)
+        except IOError as e:
+            print(f"Warning: Could not store the result: {e}")
+    if regression:
+        sys.exit(1)
+
+def quick_save_command(command_text):
+    """Saves a captured command with a derived name and returns that name."""
+    current_commands = load_commands_data()
+    name = history_follower.suggest_name(command_text, {cmd.get('name') for cmd in current_commands})
+    current_commands.append({
+        "id": str(uuid.uuid4()),
+        "name": name,
+        "command": command_text,
+        "description": "",
+        "tags": [],
+        "last_run": None,
+        "quiet": False
+    })
+    save_commands_data(current_commands)
+    return name
+
+def follow_history(args):
+    """Handles 'add --follow': tails the shell history and offers commands that are
+    reused often for saving with a single key press."""
+    import scrape_history
+    if args.history:
+        file_path, shell_type = args.history, args.shell
+    else:
+        file_path, shell_type = scrape_history.get_history_file_path()
     try:
-        # Run scrape_history.py, redirecting its stdout to the temporary file
-        # Do NOT capture_output here, so whiptail can display
-        subprocess.run(
-            [sys.executable, ADD_SCRIPT_PATH, '--output-file', temp_file_path],
-            check=True # Raise CalledProcessError if scrape_history.py exits non-zero
+        tail = history_follower.HistoryTail(file_path, shell_type) if file_path else None
+    except OSError as e:
+        print(f"Error: Could not open history file '{file_path}': {e}")
+        return
+    if tail is None:
+        print("Error: Could not find a supported history file. Pass one with --history.")
+        return
+
+    saved = {cmd.get('command') for cmd in load_commands_data()}
+    table = history_follower.FrecencyTable(threshold=args.threshold)
+    queue = deque(maxlen=FOLLOW_QUEUE_LIMIT)
+    watcher = history_follower.create_watcher(file_path)
+    stdin_fd = sys.stdin.fileno()
+    saved_count = 0
+    mode = "inotify" if isinstance(watcher, history_follower.InotifyWatcher) else "polling"
+    print(f"Following {file_path} ({mode}). Commands reused {args.threshold:g}+ times will be offered here.")
+
+    with history_follower.keypress_mode(stdin_fd) as interactive:
+        if interactive:
+            print("Press 's' to save the offered command, 'i' to ignore it, 'q' to stop.")
+        try:
+            while True:
+                woken = watcher.wait(wake_fds=[stdin_fd] if interactive else ())
+                for command in tail.read_new():
+                    if command not in saved and table.observe(command):
+                        queue.append(command)
+                        print(f"\a💡 Reused often: \033[0;32m{command}\033[0m" + ("  [s]ave [i]gnore" if interactive else ""))
+                if not woken:
+                    continue
+                key = os.read(stdin_fd, 1).decode(errors='ignore').lower()
+                if key == 'q':
+                    break
+                if key in ('s', 'i') and queue:
+                    command = queue.popleft()
+                    if key == 's':
+                        name = quick_save_command(command)
+                        saved.add(command)
+                        saved_count += 1
+                        print(f"✅ Saved as '{name}'. Rename it later with 'history_book edit'.")
+                    else:
+                        print(f"Ignored: {command}")
+                    if queue:
+                        print(f"Next: \033[0;32m{queue[0]}\033[0m  [s]ave [i]gnore")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+    print(f"\nStopped following. Saved {saved_count} command(s).")
+
+def find_project_books(root='.'):
+    """Returns the path of every book below `root`, skipping hidden and dependency directories."""
+    book_name = os.path.basename(COMMANDS_FILE)
+    shard_dir_name = os.path.basename(book_shards.get_shard_dir(book_name))
+    books = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        if book_name in filenames or shard_dir_name in dirnames:
+            books.append(os.path.join(dirpath, book_name))
+        dirnames[:] = sorted(
+            d for d in dirnames
+            if not d.startswith('.') and d not in SKIPPED_PROJECT_DIRS and d != shard_dir_name
         )
-        
-        # Read the JSON output from the temporary file
-        with open(temp_file_path, 'r', encoding='utf-8') as f:
-            new_commands_json = f.read().strip()
+    return books
 
-        if new_commands_json:
-            new_entries = json.loads(new_commands_json)
-            if new_entries:
-                current_commands = load_commands_data()
-                current_commands.extend(new_entries)
-                save_commands_data(current_commands)
-                print(f"✅ Added {len(new_entries)} new command(s).")
-            else:
-                print("No new commands selected to add.")
+def _run_project_job(job, output_lock):
+    """Runs one project's command in its directory, prefixing each output line.
+    Returns (exit code or None if it could not start, duration in seconds)."""
+    started = time.perf_counter()
+    returncode = None
+    try:
+        command_text, env = apply_setup(job['entry'], job['command'], job['commands_file'], job['directory'], job['refresh_env'])
+        with job['tokens'], tracing.span(f"run '{job['name']}' in {job['label']}"):
+            started = time.perf_counter()
+            process = subprocess.Popen(
+                command_text, shell=True, cwd=job['directory'], env=env, stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors='replace'
+            )
+            for line in process.stdout:
+                with output_lock:
+                    sys.stdout.write(f"{job['prefix']}{line if line.endswith(chr(10)) else line + chr(10)}")
+                    sys.stdout.flush()
+            returncode = process.wait()
+    except OSError as e:
+        with output_lock:
+            print(f"{job['prefix']}Error: Could not start the command: {e}")
+    duration = time.perf_counter() - started
+    metrics.record_run(job['name'], job['entry'].get('tags', []), duration, returncode == 0)
+    return returncode, duration
+
+def run_in_projects(args):
+    """Handles 'run --in DIR...' and 'run --all-projects': resolves the entry in
+    each project's own book and runs the commands in a bounded thread pool."""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    book_name = os.path.basename(COMMANDS_FILE)
+    if args.all_projects:
+        books = find_project_books()
+    else:
+        books = [os.path.join(directory, book_name) for directory in args.dirs]
+    books = list(dict.fromkeys(os.path.abspath(book) for book in books)) # Each project once
+
+    results = {} # label -> (status, duration)
+    jobs = []
+    for commands_file in books:
+        directory = os.path.dirname(commands_file)
+        label = os.path.relpath(directory)
+        prefix = f"\033[1;34m[{label}]\033[0m "
+        if not os.path.isfile(commands_file) and not book_shards.is_sharded(commands_file):
+            print(f"{prefix}Error: No {book_name} in this directory.")
+            results[label] = ("no book", None)
+            continue
+        entry = resolve_command_entry(args.name, commands_file, prefix)
+        if entry is None:
+            results[label] = ("not found", None)
+            continue
+        quiet = args.quiet or entry.get('quiet', False)
+        try:
+            command_text = build_command_text(entry, args.params)
+            tokens = acquire_tokens(entry, quiet)
+        except ValueError as e:
+            print(f"{prefix}Error: {e}")
+            results[label] = ("invalid", None)
+            continue
+        if not quiet:
+            print(f"{prefix}Running '{entry.get('name') or args.name}': \033[1;32m{command_text}\033[0m")
+        jobs.append({
+            'label': label, 'prefix': prefix, 'directory': directory, 'commands_file': commands_file,
+            'entry': entry, 'name': entry.get('name') or args.name, 'command': command_text, 'tokens': tokens,
+            'refresh_env': args.refresh_env,
+        })
+        results[label] = ("pending", None)
+
+    if not books:
+        print(f"No projects with a {book_name} were found.")
+        return
+
+    output_lock = threading.Lock()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            outcomes = list(pool.map(lambda job: _run_project_job(job, output_lock), jobs))
+    except KeyboardInterrupt:
+        print("\nOperation cancelled by user.")
+        return
+
+    for job, (returncode, duration) in zip(jobs, outcomes):
+        if returncode == 0:
+            results[job['label']] = ("ok", duration)
+            update_last_run(job['entry']['id'], job['commands_file'], job['entry'].get('name'))
         else:
-            print("No commands returned from the selection interface.")
+            results[job['label']] = ("failed" if returncode is None else f"exit {returncode}", duration)
 
-    except FileNotFoundError:
-        print(f"Error: The scraper script '{ADD_SCRIPT_PATH}' was not found.")
-    except json.JSONDecodeError:
-        print(f"Error: Failed to parse JSON output from scraper script. Output from temp file:\n{new_commands_json}")
-    except subprocess.CalledProcessError as e:
-        print(f"The 'add' process was cancelled or failed. Error: {e}")
-        # Print stdout/stderr from subprocess if available
-        if e.stdout:
-            print(f"Scraper stdout: {e.stdout.decode('utf-8')}")
-        if e.stderr:
-            print(f"Scraper stderr: {e.stderr.decode('utf-8')}")
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+    print(f"\n--- '{args.name}' in {len(results)} project(s) ---")
+    for label, (status, duration) in results.items():
+        icon = "✅" if status == "ok" else "❌"
+        timing = f"{duration:8.2f}s" if duration is not None else " " * 9
+        print(f"  {icon} {label:<40} {timing}  {status}")
+    failed = sum(1 for status, _ in results.values() if status != "ok")
+    if failed:
+        print(f"\n❌ {failed} of {len(results)} project(s) did not succeed.")
+        sys.exit(1)
+    else:
+        print(f"\n✅ Succeeded in all {len(results)} project(s).")
 
+def add_commands(args):
+    """Handles the 'add' command by running the history scraper in-process."""
+    import scrape_history
+    if args.follow:
+        follow_history(args)
+        return
+    print("Launching the command selection interface...")
+
+    new_entries = scrape_history.collect_new_entries()
+    if new_entries is None:
+        print("The 'add' process was cancelled: no usable shell history was found.")
+    elif new_entries:
+        current_commands = load_commands_data()
+        current_commands.extend(new_entries)
+        save_commands_data(current_commands)
+        print(f"✅ Added {len(new_entries)} new command(s).")
+    else:
+        print("No new commands selected to add.")
+
+
+def suggest_commands(args):
+    """Handles the 'suggest' command: mines the shell history for frequently
+    repeated command sequences and offers to save them as multi-step entries."""
+    import scrape_history
+    if args.history:
+        file_path, shell_type = args.history, args.shell
+    else:
+        file_path, shell_type = scrape_history.get_history_file_path()
+    if not file_path:
+        print("Error: Could not find a supported history file. Pass one with --history.")
+        return
+
+    try:
+        with tracing.span("mine sequences"):
+            counters = sequence_mining.count_sequences(
+                scrape_history.iter_history_commands(file_path, shell_type), max_length=args.max_length
+            )
+    except IOError as e:
+        print(f"Error: Could not read history file '{file_path}': {e}")
+        return
+
+    saved = {cmd.get('command') for cmd in load_commands_data()}
+    sequences = [
+        (steps, count) for steps, count in sequence_mining.top_sequences(counters, min_count=args.min_count)
+        if sequence_mining.to_command(steps) not in saved
+    ][:args.top]
+    if not sequences:
+        print(f"No unsaved command sequences repeated at least {args.min_count} times were found.")
+        return
+
+    print("\n--- Frequent Command Sequences ---\n")
+    for i, (steps, count) in enumerate(sequences, 1):
+        print(f"  {i:>2}. \033[1;33m{count}×\033[0m  " + " \033[2;37m→\033[0m ".join(f"\033[0;32m{step}\033[0m" for step in steps))
+    if args.print_only:
+        return
+
+    w = Whiptail(title="History Book", backtitle="Suggested Sequences")
+    choices = [(str(i), sequence_mining.to_command(steps), 'OFF') for i, (steps, _) in enumerate(sequences)]
+    with tracing.span("whiptail checklist"):
+        selected, exit_code = w.checklist("Select sequences to save as multi-step commands:", choices)
+    if exit_code != 0 or not selected:
+        print("No sequences selected to save.")
+        return
+
+    new_entries = []
+    for tag in selected:
+        with tracing.span("whiptail dialogs"):
+            new_entries.append(scrape_history.prompt_entry_details(w, sequence_mining.to_command(sequences[int(tag)][0])))
+    current_commands = load_commands_data()
+    current_commands.extend(new_entries)
+    save_commands_data(current_commands)
+    print(f"✅ Added {len(new_entries)} multi-step command(s).")
 
 def edit_commands(args):
     """Handles the 'edit' command, allowing modification of saved commands."""
+    import fuzzy_picker
+    if args.batch or _batch_operations_from_args(args) or args.where_tags or args.where_name:
+        batch_edit_commands(args)
+        return
     w = Whiptail(title="History Book", backtitle="Edit Commands")
     commands_data = load_commands_data()
 
@@ -197,12 +800,20 @@ def edit_commands(args):
         w.msgbox(f"No commands found in {COMMANDS_FILE} to edit.")
         return
 
-    menu_choices = [(str(i), item.get('name', item['command'])) for i, item in enumerate(commands_data)]
+    if fuzzy_picker.should_use_picker(len(commands_data)):
+        # Large books: type-to-filter instead of one whiptail menu holding every entry
+        labels = [f"{item.get('name') or '-'}  {item['command']}" for item in commands_data]
+        with tracing.span("fuzzy picker"):
+            selection = fuzzy_picker.pick(labels, "Select a command to edit:")
+        tag_str, exit_code = (str(selection[0]), 0) if selection else ("", 1)
+    else:
+        menu_choices = [(str(i), item.get('name', item['command'])) for i, item in enumerate(commands_data)]
 
-    tag_str, exit_code = w.menu(
-        "Select a command to edit:",
-        menu_choices
-    )
+        with tracing.span("whiptail menu"):
+            tag_str, exit_code = w.menu(
+                "Select a command to edit:",
+                menu_choices
+            )
 
     if exit_code == 0: # 0 indicates OK/Yes in whiptail
         try:
@@ -212,50 +823,360 @@ def edit_commands(args):
             print("Invalid selection.")
             return
 
-        # Edit Name
-        new_name, code_name = w.inputbox(
-            f"Edit short name for: {selected_command_entry['command']}",
-            default=selected_command_entry.get('name', '')
-        )
-        if code_name == 0: # OK
-            selected_command_entry['name'] = new_name.strip()
+        original_entry = dict(selected_command_entry)
+        with tracing.span("whiptail dialogs"):
+            # Edit Name
+            new_name, code_name = w.inputbox(
+                f"Edit short name for: {selected_command_entry['command']}",
+                default=selected_command_entry.get('name', '')
+            )
+            if code_name == 0: # OK
+                selected_command_entry['name'] = new_name.strip()
 
-        # Edit Description
-        new_description, code_desc = w.inputbox(
-            f"Edit description for: {selected_command_entry['command']}",
-            default=selected_command_entry.get('description', '')
-        )
-        if code_desc == 0: # OK
-            selected_command_entry['description'] = new_description
-
-        # Edit Tags (as comma-separated string)
-        current_tags_str = ", ".join(selected_command_entry.get('tags', []))
-        new_tags_str, code_tags = w.inputbox(
-            f"Edit tags for: {selected_command_entry['command']} (comma-separated)",
-            default=current_tags_str
-        )
-        if code_tags == 0: # OK
-            selected_command_entry['tags'] = [tag.strip() for tag in new_tags_str.split(',') if tag.strip()]
+            # Edit Description
+            new_description, code_desc = w.inputbox(
+                f"Edit description for: {selected_command_entry['command']}",
+                default=selected_command_entry.get('description', '')
+            )
+            if code_desc == 0: # OK
+                selected_command_entry['description'] = new_description
+
+            # Edit Tags (as comma-separated string)
+            current_tags_str = ", ".join(selected_command_entry.get('tags', []))
+            new_tags_str, code_tags = w.inputbox(
+                f"Edit tags for: {selected_command_entry['command']} (comma-separated)",
+                default=current_tags_str
+            )
+            if code_tags == 0: # OK
+                selected_command_entry['tags'] = [tag.strip() for tag in new_tags_str.split(',') if tag.strip()]
             
-        # Option to toggle quiet mode
-        quiet_status = "ON" if selected_command_entry.get('quiet', False) else "OFF"
-        prompt_text = (
-            f"Set command '{selected_command_entry.get('name', selected_command_entry['command'])}' to run quietly?\n\n"
-            f"Current status: {quiet_status}\n\n"
-            "Select 'Yes' to suppress output\n  (e.g., 'Running:' messages)'.\n\n"
-            "Select 'No' to show all output."
-        )
-        code_quiet = w.yesno(prompt_text) 
+            # Option to toggle quiet mode
+            quiet_status = "ON" if selected_command_entry.get('quiet', False) else "OFF"
+            prompt_text = (
+                f"Set command '{selected_command_entry.get('name', selected_command_entry['command'])}' to run quietly?\n\n"
+                f"Current status: {quiet_status}\n\n"
+                "Select 'Yes' to suppress output\n  (e.g., 'Running:' messages)'.\n\n"
+                "Select 'No' to show all output."
+            )
+            code_quiet = w.yesno(prompt_text) 
         
-        if code_quiet: # True means Yes was selected
-            selected_command_entry['quiet'] = True
-        else: # False means No was selected (or ESC/Cancel, which defaults to False)
-            selected_command_entry['quiet'] = False
+            if code_quiet: # True means Yes was selected
+                selected_command_entry['quiet'] = True
+            else: # False means No was selected (or ESC/Cancel, which defaults to False)
+                selected_command_entry['quiet'] = False
 
-        save_commands_data(commands_data)
+        if selected_command_entry == original_entry:
+            print("No changes to save.")
+        else:
+            save_commands_data(commands_data)
     else:
         print("\nCommand selection cancelled.")
 
+def _split_tags(tags_str):
+    return [tag.strip() for tag in (tags_str or "").split(',') if tag.strip()]
+
+def _batch_operations_from_args(args):
+    """Collects the bulk operations given as 'edit' flags ({} if there are none)."""
+    import batch_edit
+    operations = {
+        'add_tags': _split_tags(args.add_tags),
+        'remove_tags': _split_tags(args.remove_tags),
+        'rename_tags': dict(args.rename_tag or []),
+        'replace': [tuple(pair) for pair in args.replace or []],
+        'quiet': {'on': True, 'off': False}.get(args.set_quiet),
+        'setup': args.set_setup,
+        'params': {'on': True, 'off': False}.get(args.set_params),
+    }
+    return operations if batch_edit.has_operations(operations) else {}
+
+def _prompt_batch_operations(w):
+    """Asks for the bulk operations in a fixed series of dialogs. Returns None if cancelled."""
+    add_str, code = w.inputbox("Tags to add to every selected command (comma-separated):", default="")
+    if code != 0: return None
+    remove_str, code = w.inputbox("Tags to remove (comma-separated):", default="")
+    if code != 0: return None
+    rename_str, code = w.inputbox("Tags to rename (old=new, comma-separated):", default="")
+    if code != 0: return None
+    replace_str, code = w.inputbox("Find and replace in command text (old=>new, empty to skip):", default="")
+    if code != 0: return None
+    quiet_choice, code = w.menu("Quiet mode for the selected commands:", [
+        ("keep", "Leave unchanged"),
+        ("on", "Run quietly"),
+        ("off", "Show all output"),
+    ])
+    if code != 0: return None
+
+    renames = {}
+    for pair in _split_tags(rename_str):
+        old, separator, new = pair.partition('=')
+        if separator and old.strip() and new.strip():
+            renames[old.strip()] = new.strip()
+    old_text, separator, new_text = replace_str.partition('=>')
+    return {
+        'add_tags': _split_tags(add_str),
+        'remove_tags': _split_tags(remove_str),
+        'rename_tags': renames,
+        'replace': [(old_text, new_text)] if separator and old_text else [],
+        'quiet': {'on': True, 'off': False}.get(quiet_choice),
+    }
+
+def batch_edit_commands(args):
+    """Handles 'edit --batch': applies bulk tag, quiet and find/replace edits to many
+    entries, previews them, and saves only if something changed, in one atomic write."""
+    import batch_edit
+    import fuzzy_picker
+    commands_data = load_commands_data()
+    if not commands_data:
+        print(f"No commands found in {COMMANDS_FILE} to edit.")
+        return
+    w = None
+
+    if args.where_tags or args.where_name:
+        indices = batch_edit.select_entries(commands_data, _split_tags(args.where_tags), args.where_name)
+    else:
+        w = Whiptail(title="History Book", backtitle="Batch Edit")
+        labels = [f"{item.get('name') or '-'}  {item['command']}" for item in commands_data]
+        if fuzzy_picker.should_use_picker(len(commands_data)):
+            with tracing.span("fuzzy picker"):
+                indices = fuzzy_picker.pick(labels, "Select the commands to edit:", multi=True)
+        else:
+            with tracing.span("whiptail checklist"):
+                selected, exit_code = w.checklist(
+                    "Use SPACE to select the commands to edit. Press ENTER when done.",
+                    [(str(i), label, 'OFF') for i, label in enumerate(labels)]
+                )
+            indices = [int(tag) for tag in selected] if exit_code == 0 else None
+        if indices is None:
+            print("\nCommand selection cancelled.")
+            return
+    if not indices:
+        print("No commands matched the selection.")
+        return
+
+    operations = _batch_operations_from_args(args)
+    if not operations:
+        w = w or Whiptail(title="History Book", backtitle="Batch Edit")
+        with tracing.span("whiptail dialogs"):
+            operations = _prompt_batch_operations(w)
+        if operations is None:
+            print("\nBatch edit cancelled.")
+            return
+
+    changes = batch_edit.plan_changes(commands_data, indices, operations)
+    if not changes:
+        print(f"Selected {len(indices)} command(s), but none would change. Nothing to save.")
+        return
+    print(f"\n--- {len(changes)} of {len(indices)} selected command(s) will change ---\n")
+    print(batch_edit.render_preview(commands_data, changes))
+    if args.dry_run:
+        print("\nDry run: nothing was saved.")
+        return
+    if not args.yes:
+        w = w or Whiptail(title="History Book", backtitle="Batch Edit")
+        preview = batch_edit.render_preview(commands_data, changes, batch_edit.PREVIEW_LIMIT)
+        if not w.yesno(f"Apply these changes to {len(changes)} command(s)?\n\n{preview}"):
+            print("\nBatch edit cancelled. Nothing was saved.")
+            return
+
+    for i, edited in changes:
+        commands_data[i] = edited
+    save_commands_data(commands_data) # One atomic write for every change
+    print(f"✅ Updated {len(changes)} command(s).")
+
+def daemon_command(args):
+    """Handles the 'daemon' command: start, stop or query the resident daemon."""
+    socket_path = history_daemon.get_socket_path(COMMANDS_FILE)
+
+    if args.action == 'serve':
+        # Runs of exported shell functions are logged beside the book and folded in on load
+        run_log = shell_export.get_run_log_path(get_cache_dir())
+        history_daemon.serve(COMMANDS_FILE, load_commands_data, save_commands_data, [run_log, f"{run_log}.merging"])
+    elif args.action == 'start':
+        if history_daemon.request(COMMANDS_FILE, 'ping') is not None:
+            print(f"History Book daemon is already running ({socket_path}).")
+            return
+        with open(os.devnull, 'w') as devnull:
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), 'daemon', 'serve'],
+                stdin=subprocess.DEVNULL, stdout=devnull, stderr=devnull,
+                start_new_session=True # Detach from the terminal's process group
+            )
+        print(f"✅ Started History Book daemon for {COMMANDS_FILE} ({socket_path}).")
+    elif args.action == 'stop':
+        if history_daemon.request(COMMANDS_FILE, 'shutdown') is None:
+            print("History Book daemon is not running.")
+        else:
+            print("✅ Stopped History Book daemon.")
+    else: # status
+        response = history_daemon.request(COMMANDS_FILE, 'ping')
+        if response is None:
+            print("History Book daemon is not running.")
+        else:
+            print(f"History Book daemon is running (PID {response['pid']}) for {response['commands_file']}.")
+            print(f"Socket: {socket_path}")
+
+def completion_command(args):
+    """Handles the 'completion' command: prints a shell completion script or refreshes its cache."""
+    if args.refresh:
+        refresh_derived_files(load_commands_data())
+        print(f"✅ Refreshed completion cache in {get_cache_dir()}")
+    if not args.shell:
+        if not args.refresh:
+            print("Error: Specify a shell (bash, zsh or fish) or --refresh.")
+        return
+
+    script_path = os.path.join(COMPLETIONS_DIR, COMPLETION_SCRIPTS[args.shell])
+    try:
+        with open(script_path, 'r') as f:
+            print(f.read(), end='')
+    except IOError as e:
+        print(f"Error reading completion script '{script_path}': {e}")
+        sys.exit(1)
+
+def _read_import_sources(paths, fmt):
+    """Yields (position, record) pairs from every import source, one at a time."""
+    for path in paths:
+        source_format = fmt or book_io.detect_format(path)
+        if path == '-':
+            for position, record in book_io.read_records(sys.stdin, source_format):
+                yield f"stdin {position}", record
+        else:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                for position, record in book_io.read_records(f, source_format):
+                    yield f"{path} {position}", record
+
+def import_commands(args):
+    """Handles the 'import' command: bulk-adds commands from NDJSON, JSON or CSV without the TUI."""
+    current_commands = load_commands_data()
+    try:
+        new_entries, skipped, errors = book_io.import_entries(
+            current_commands, _read_import_sources(args.files or ['-'], args.format)
+        )
+    except (ValueError, IOError) as e:
+        print(f"❌ Error reading import source: {e}")
+        sys.exit(1)
+    else:
+        if errors:
+            print(f"Found {len(errors)} invalid record(s):")
+            for error in errors:
+                print(f"  - {error}")
+        if errors and not args.skip_invalid:
+            print("Nothing was imported. Fix the records above or pass --skip-invalid.")
+            sys.exit(1)
+        else:
+            if new_entries:
+                current_commands.extend(new_entries)
+                save_commands_data(current_commands) # One atomic write for the whole import
+            print(f"✅ Imported {len(new_entries)} new command(s), skipped {skipped} duplicate(s).")
+
+def export_commands(args):
+    """Handles the 'export' command: writes the book as NDJSON/JSON/CSV or as shell functions."""
+    commands = load_commands_data()
+    if args.format:
+        buffer = io.StringIO()
+        book_io.write_entries(commands, buffer, args.format)
+        if args.output and args.output != '-':
+            try:
+                atomic_write_text(args.output, buffer.getvalue())
+                print(f"✅ Exported {len(commands)} command(s) to {args.output}")
+            except IOError as e:
+                print(f"❌ Error writing export to {args.output}: {e}")
+                sys.exit(1)
+        else:
+            sys.stdout.write(buffer.getvalue())
+        return
+
+    cache_dir = get_cache_dir()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        export_path, exported = shell_export.write_export(commands, args.shell, cache_dir, atomic_write_text)
+    except IOError as e:
+        print(f"❌ Error writing shell export: {e}")
+        sys.exit(1)
+    else:
+        print(f"✅ Exported {len(exported)} command(s) as {args.shell} functions to {export_path}")
+        for function_name, entry in exported:
+            print(f"  \033[1;33m{function_name}\033[0m → {entry['name']}")
+        skipped = [entry['name'] for entry in commands if entry.get('params')]
+        if skipped:
+            print(f"Skipped {len(skipped)} command(s) that take key=value parameters (use 'run' for them): {', '.join(skipped)}")
+        print(f"\nLoad them with: source {os.path.abspath(export_path)}")
+        print("The file is regenerated automatically whenever the book changes.")
+
+def shard_command(args):
+    """Handles the 'shard' command: converts the book between a single file and shards."""
+    shard_dir = book_shards.get_shard_dir(COMMANDS_FILE)
+    if args.join:
+        if not book_shards.is_sharded(COMMANDS_FILE):
+            print(f"The book is already a single file ({COMMANDS_FILE}).")
+            return
+        commands = book_shards.load_entries(COMMANDS_FILE)
+        try:
+            atomic_write_text(COMMANDS_FILE, json.dumps(commands, indent=2))
+            shutil.rmtree(shard_dir)
+        except (IOError, OSError) as e:
+            print(f"❌ Error joining shards into {COMMANDS_FILE}: {e}")
+            sys.exit(1)
+        else:
+            print(f"✅ Joined {len(commands)} command(s) into {COMMANDS_FILE}")
+    elif args.count < 1:
+        print("Error: --count must be at least 1.")
+        sys.exit(1)
+    else:
+        commands = load_commands_data() # From the single file, or the current shards when re-sharding
+        try:
+            book_shards.write_book(commands, COMMANDS_FILE, atomic_write_text, args.by, args.count)
+            if os.path.isfile(COMMANDS_FILE):
+                os.remove(COMMANDS_FILE) # The shards are now the only copy of the book
+        except (IOError, OSError) as e:
+            print(f"❌ Error writing shards to {shard_dir}: {e}")
+            sys.exit(1)
+        else:
+            manifest = book_shards.load_manifest(COMMANDS_FILE)
+            print(f"✅ Stored {len(commands)} command(s) in {len(manifest['shards'])} shard(s) by {args.by} under {shard_dir}")
+            refresh_derived_files(commands) # The name index is keyed to the manifest now
+
+def _read_book_file(path):
+    """Reads a book as stored, without defaults or the run log. A missing or
+    empty file (git passes one when there is no common ancestor) is an empty book."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except FileNotFoundError:
+        return []
+    data = json.loads(text) if text.strip() else []
+    if not isinstance(data, list):
+        raise ValueError("expected a JSON array of command objects")
+    return data
+
+def merge_command(args):
+    """Handles the 'merge' command: three-way merges versions of a book by entry id.
+    Usable as a git merge driver, which expects the result in OURS and a
+    non-zero exit status when conflicts remain."""
+    try:
+        base, ours, theirs = (_read_book_file(path) for path in (args.base, args.ours, args.theirs))
+    except (ValueError, IOError) as e:
+        print(f"❌ Error reading a version of the book: {e}")
+        sys.exit(1)
+    else:
+        merged, conflicts = book_merge.merge_books(base, ours, theirs)
+        command_template.compile_entries(merged) # Templates follow the merged command text
+        output = args.output or args.ours
+        try:
+            atomic_write_text(output, json.dumps(merged, indent=2))
+        except IOError as e:
+            print(f"❌ Error writing merged book to {output}: {e}")
+            sys.exit(1)
+        else:
+            refresh_derived_files(merged, output)
+            if conflicts:
+                print(f"⚠️ Merged {len(merged)} command(s) into {output} with {len(conflicts)} conflict(s); our version was kept for:")
+                for conflict in conflicts:
+                    print(f"  - {conflict}")
+                sys.exit(1)
+            else:
+                print(f"✅ Merged {len(merged)} command(s) into {output}")
+
 # --- NEW: Version and Changelog Commands ---
 def show_version(args):
     """Reads and prints the project version."""
@@ -287,17 +1208,34 @@ def show_changelog(args):
 # --- Main Argument Parser ---
 
 def main():
+    # Profiling flags, accepted both before and after the subcommand. SUPPRESS
+    # keeps a subcommand's unset flags from overwriting ones given before it.
+    profile_parser = argparse.ArgumentParser(add_help=False, argument_default=argparse.SUPPRESS)
+    profile_parser.add_argument('--profile', action='store_true', help='Print a per-phase timing tree when the command finishes.')
+    profile_parser.add_argument('--profile-memory', action='store_true', help='Include tracemalloc peak memory per phase (implies --profile).')
+    profile_parser.add_argument('--trace-file', type=str, help='Also write a Chrome trace-event JSON file (implies --profile).')
+
     parser = argparse.ArgumentParser(
-        description="History Book: A tool to manage and run project-specific shell commands."
+        description="History Book: A tool to manage and run project-specific shell commands.",
+        parents=[profile_parser]
     )
     subparsers = parser.add_subparsers(dest='command', required=True, help='Available commands')
 
     # Sub-parser for the 'add' command
-    parser_add = subparsers.add_parser('add', help='Interactively add new commands from your shell history.')
+    parser_add = subparsers.add_parser('add', parents=[profile_parser], help='Interactively add new commands from your shell history.')
+    parser_add.add_argument('--follow', '-f', action='store_true', help='Keep watching the history file and offer frequently reused commands for one-key saving.')
+    parser_add.add_argument(
+        '--threshold',
+        type=float,
+        default=history_follower.REUSE_THRESHOLD,
+        help=f'Decayed reuse score at which --follow offers a command (default: {history_follower.REUSE_THRESHOLD:g}).'
+    )
+    parser_add.add_argument('--history', type=str, help='History file to follow instead of the detected one.')
+    parser_add.add_argument('--shell', choices=['bash', 'zsh', 'fish'], default='bash', help='Format of --history (default: bash).')
     parser_add.set_defaults(func=add_commands)
 
     # Sub-parser for the 'list' command
-    parser_list = subparsers.add_parser('list', help='List all saved commands, with optional tag filtering.')
+    parser_list = subparsers.add_parser('list', parents=[profile_parser], help='List all saved commands, with optional tag filtering.')
     parser_list.add_argument(
         '--tags', 
         type=str, 
@@ -306,29 +1244,190 @@ def main():
     parser_list.set_defaults(func=list_commands)
 
     # Sub-parser for the 'run' command
-    parser_run = subparsers.add_parser('run', help='Run a saved command by its short name.')
+    parser_run = subparsers.add_parser('run', parents=[profile_parser], help='Run a saved command by its short name.')
     parser_run.add_argument('name', type=str, help='The short name of the command to execute.')
+    parser_run.add_argument(
+        'params',
+        nargs='*',
+        metavar='key=value',
+        help='Values for the command\'s {placeholders} (e.g., env=prod).'
+    )
+    run_targets = parser_run.add_mutually_exclusive_group()
+    run_targets.add_argument(
+        '--in',
+        dest='dirs',
+        nargs='+',
+        metavar='DIR',
+        help='Run the command in each of these project directories, using each directory\'s own book.'
+    )
+    run_targets.add_argument(
+        '--all-projects',
+        action='store_true',
+        help='Run the command in every project below the current directory that has a book.'
+    )
+    parser_run.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f'How many projects to run in parallel with --in/--all-projects (default: {DEFAULT_JOBS}).'
+    )
     parser_run.add_argument(
         '--quiet',
         action='store_true',
         help='Suppress History Book\'s own output (e.g., "Running:" messages) for this execution.'
     )
+    parser_run.add_argument(
+        '--refresh-env',
+        action='store_true',
+        help='Run the command\'s setup again and replace its cached environment snapshot.'
+    )
     parser_run.set_defaults(func=run_command)
 
+    # Sub-parser for the 'bench' command
+    parser_bench = subparsers.add_parser('bench', parents=[profile_parser], help='Time repeated runs of a saved command and compare them with earlier results.')
+    parser_bench.add_argument('name', type=str, help='The short name of the command to benchmark.')
+    parser_bench.add_argument('params', nargs='*', metavar='key=value', help='Values for the command\'s {placeholders}.')
+    parser_bench.add_argument('--runs', '-r', type=int, default=command_bench.DEFAULT_RUNS, help=f'Timed runs (default: {command_bench.DEFAULT_RUNS}).')
+    parser_bench.add_argument('--warmup', '-w', type=int, default=command_bench.DEFAULT_WARMUP, help=f'Untimed runs first, e.g. to warm caches (default: {command_bench.DEFAULT_WARMUP}).')
+    parser_bench.add_argument('--prepare', '-p', type=str, help='Shell command to run (untimed) before every run, e.g. to clear a cache.')
+    parser_bench.add_argument('--compare', '-c', action='store_true', help='Compare with the previous stored result; exit with status 1 on a regression.')
+    parser_bench.add_argument('--no-save', action='store_true', help='Do not store this result.')
+    parser_bench.add_argument('--show-output', action='store_true', help='Show the command\'s output instead of discarding it.')
+    parser_bench.set_defaults(func=bench_command)
+
+    # Sub-parser for the 'suggest' command
+    parser_suggest = subparsers.add_parser('suggest', parents=[profile_parser], help='Suggest frequently repeated command sequences from your history as multi-step commands.')
+    parser_suggest.add_argument('--top', type=int, default=10, help='How many sequences to show (default: 10).')
+    parser_suggest.add_argument('--min-count', type=int, default=3, help='Minimum number of repetitions (default: 3).')
+    parser_suggest.add_argument(
+        '--max-length',
+        type=int,
+        default=sequence_mining.MAX_LENGTH,
+        choices=range(2, 9),
+        metavar='{2..8}',
+        help=f'Longest sequence to look for (default: {sequence_mining.MAX_LENGTH}).'
+    )
+    parser_suggest.add_argument('--history', type=str, help='History file to mine instead of the detected one.')
+    parser_suggest.add_argument('--shell', choices=['bash', 'zsh', 'fish'], default='bash', help='Format of --history (default: bash).')
+    parser_suggest.add_argument('--print', dest='print_only', action='store_true', help='Only print the suggestions; do not offer to save them.')
+    parser_suggest.set_defaults(func=suggest_commands)
+
     # Sub-parser for the 'edit' command
-    parser_edit = subparsers.add_parser('edit', help='Interactively edit properties of a saved command.')
+    parser_edit = subparsers.add_parser('edit', parents=[profile_parser], help='Interactively edit properties of a saved command, or many at once with --batch.')
+    parser_edit.add_argument('--batch', action='store_true', help='Edit many commands at once (implied by the options below).')
+    parser_edit.add_argument('--where-tags', type=str, help='Select commands having any of these comma-separated tags instead of picking them.')
+    parser_edit.add_argument('--where-name', type=str, help='Select commands whose name matches this shell-style pattern (e.g., "deploy-*").')
+    parser_edit.add_argument('--add-tags', type=str, help='Comma-separated tags to add to the selected commands.')
+    parser_edit.add_argument('--remove-tags', type=str, help='Comma-separated tags to remove from the selected commands.')
+    parser_edit.add_argument('--rename-tag', nargs=2, action='append', metavar=('OLD', 'NEW'), help='Rename a tag (repeatable).')
+    parser_edit.add_argument('--replace', nargs=2, action='append', metavar=('OLD', 'NEW'), help='Replace text in the command (repeatable, applied in order).')
+    parser_edit.add_argument('--set-quiet', choices=['on', 'off'], help='Turn quiet mode on or off for the selected commands.')
+    parser_edit.add_argument(
+        '--set-setup',
+        type=str,
+        metavar='PREFIX',
+        help='Set the setup step whose environment is cached for the selected commands (e.g., "source .venv/bin/activate"); "" clears it.'
+    )
+    parser_edit.add_argument(
+        '--set-params',
+        choices=['on', 'off'],
+        help='Treat {name} in the selected commands as key=value parameters for run (on), or run them verbatim (off).'
+    )
+    parser_edit.add_argument('--dry-run', action='store_true', help='Only preview the batch changes.')
+    parser_edit.add_argument('--yes', '-y', action='store_true', help='Apply the batch changes without asking for confirmation.')
     parser_edit.set_defaults(func=edit_commands)
 
+    # Sub-parser for the 'daemon' command
+    parser_daemon = subparsers.add_parser('daemon', parents=[profile_parser], help='Manage the optional background daemon that keeps the book in memory.')
+    parser_daemon.add_argument(
+        'action',
+        choices=['start', 'stop', 'status', 'serve'],
+        help="'serve' runs the daemon in the foreground (e.g., under systemd)."
+    )
+    parser_daemon.set_defaults(func=daemon_command)
+
+    # Sub-parser for the 'export' command
+    parser_export = subparsers.add_parser('export', parents=[profile_parser], help='Export saved commands as NDJSON/JSON/CSV or as native shell functions.')
+    export_target = parser_export.add_mutually_exclusive_group(required=True)
+    export_target.add_argument(
+        '--format',
+        choices=book_io.FORMATS,
+        help='Write the book in a data format (to stdout unless --output is given).'
+    )
+    export_target.add_argument(
+        '--shell',
+        choices=shell_export.SUPPORTED_SHELLS,
+        help='Generate sourceable shell functions for this shell.'
+    )
+    parser_export.add_argument('--output', '-o', type=str, help="File to write a --format export to ('-' for stdout).")
+    parser_export.set_defaults(func=export_commands)
+
+    # Sub-parser for the 'import' command
+    parser_import = subparsers.add_parser('import', parents=[profile_parser], help='Bulk-import commands from NDJSON, JSON or CSV (files or stdin).')
+    parser_import.add_argument('files', nargs='*', help="Files to import; '-' or nothing reads stdin.")
+    parser_import.add_argument(
+        '--format',
+        choices=book_io.FORMATS,
+        help='Input format. Defaults to the file extension, or NDJSON for stdin.'
+    )
+    parser_import.add_argument(
+        '--skip-invalid',
+        action='store_true',
+        help='Import the valid records even if some records are invalid.'
+    )
+    parser_import.set_defaults(func=import_commands)
+
+    # Sub-parser for the 'shard' command
+    parser_shard = subparsers.add_parser('shard', parents=[profile_parser], help='Split the book into shards by tag or name hash, or join it back into one file.')
+    parser_shard.add_argument('--by', choices=book_shards.STRATEGIES, default='tag', help='Shard by first tag or by a hash of the name (default: tag).')
+    parser_shard.add_argument(
+        '--count',
+        type=int,
+        default=book_shards.DEFAULT_HASH_SHARDS,
+        help=f'Number of shards for --by hash (default: {book_shards.DEFAULT_HASH_SHARDS}).'
+    )
+    parser_shard.add_argument('--join', action='store_true', help=f'Convert a sharded book back into a single {COMMANDS_FILE}.')
+    parser_shard.set_defaults(func=shard_command)
+
+    # Sub-parser for the 'merge' command
+    parser_merge = subparsers.add_parser('merge', parents=[profile_parser], help='Three-way merge versions of a book by entry id (usable as a git merge driver).')
+    parser_merge.add_argument('base', help='The common ancestor version (git: %%O).')
+    parser_merge.add_argument('ours', help='Our version; receives the result unless --output is given (git: %%A).')
+    parser_merge.add_argument('theirs', help='Their version (git: %%B).')
+    parser_merge.add_argument('--output', '-o', type=str, help='Write the merged book here instead of over OURS.')
+    parser_merge.set_defaults(func=merge_command)
+
+    # Sub-parser for the 'completion' command
+    parser_completion = subparsers.add_parser('completion', parents=[profile_parser], help='Print a shell completion script (bash, zsh or fish).')
+    parser_completion.add_argument('shell', nargs='?', choices=sorted(COMPLETION_SCRIPTS), help='The shell to print a completion script for.')
+    parser_completion.add_argument(
+        '--refresh',
+        action='store_true',
+        help='Regenerate the name/tag completion cache from the current book.'
+    )
+    parser_completion.set_defaults(func=completion_command)
+
     # --- NEW: Sub-parsers for version and changelog ---
-    parser_version = subparsers.add_parser('version', help='Display the current project version.')
+    parser_version = subparsers.add_parser('version', parents=[profile_parser], help='Display the current project version.')
     parser_version.set_defaults(func=show_version)
 
-    parser_changelog = subparsers.add_parser('changelog', help='Display the project changelog.')
+    parser_changelog = subparsers.add_parser('changelog', parents=[profile_parser], help='Display the project changelog.')
     parser_changelog.set_defaults(func=show_changelog)
     # --- END NEW ---
 
     args = parser.parse_args()
-    args.func(args)
+
+    tracing.configure_from_env()
+    profile_memory = getattr(args, 'profile_memory', False)
+    trace_file = getattr(args, 'trace_file', None)
+    if getattr(args, 'profile', False) or profile_memory or trace_file:
+        tracing.enable(memory=profile_memory, trace_file=trace_file)
+    tracing.record("imports", PROCESS_START, IMPORTS_DONE)
+    try:
+        with tracing.span(f"history_book {args.command}"):
+            args.func(args)
+    finally:
+        tracing.finish()
 
 if __name__ == "__main__":
     main()
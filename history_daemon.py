@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import tempfile
+import threading
+
+import book_shards
+import tracing
+
+# --- Configuration ---
+SOCKET_TIMEOUT = 0.5 # Seconds a client waits before falling back to in-process loading
+MAX_REQUEST_BYTES = 1024 * 1024
+SOCKET_DIR_MODE = 0o700 # Nobody else may create, replace or remove sockets in it
+# --- End Configuration ---
+
+# --- Helper Functions ---
+
+def get_socket_dir():
+    """Returns the per-user directory holding the daemons' sockets."""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(runtime_dir, f"history_book-{os.getuid()}")
+
+def get_socket_path(commands_file):
+    """Returns the Unix socket path for the daemon serving `commands_file`.
+    The path is derived from a hash of the book's absolute path, so every
+    project gets its own daemon and the path stays short enough for AF_UNIX."""
+    book_path = os.path.abspath(commands_file)
+    digest = hashlib.sha1(book_path.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(get_socket_dir(), f"{digest}.sock")
+
+def is_private_dir(path):
+    """True if `path` is a real directory (not a symlink) owned by this user
+    that no one else can write to, so nothing in it was planted by another user."""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISDIR(info.st_mode) and info.st_uid == os.getuid() and not info.st_mode & 0o077
+
+def ensure_socket_dir():
+    """Creates the socket directory if needed. Returns it, or None if it
+    exists but is not private to this user."""
+    socket_dir = get_socket_dir()
+    try:
+        os.mkdir(socket_dir, SOCKET_DIR_MODE)
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+    return socket_dir if is_private_dir(socket_dir) else None
+
+def _peer_uid(sock, socket_path):
+    """Returns the uid of the process listening on a connected socket: from
+    SO_PEERCRED where available, otherwise the owner of the socket file."""
+    if hasattr(socket, 'SO_PEERCRED'):
+        credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        return struct.unpack('3i', credentials)[1]
+    return os.stat(socket_path).st_uid
+
+def _read_line(sock):
+    """Reads a single newline-terminated message from a socket."""
+    chunks = []
+    received = 0
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        received += len(chunk)
+        if chunk.endswith(b'\n') or received > MAX_REQUEST_BYTES:
+            break
+    return b''.join(chunks)
+
+def request(commands_file, op, **params):
+    """Sends one request to the daemon serving `commands_file`.
+    Returns the decoded response, or None when no daemon is reachable so the
+    caller can fall back to loading the book in-process. Responses are only
+    trusted from a daemon run by this user: the book's commands get executed."""
+    socket_path = get_socket_path(commands_file)
+    if not is_private_dir(os.path.dirname(socket_path)):
+        return None
+    try:
+        with tracing.span(f"daemon {op}"), socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(SOCKET_TIMEOUT)
+            sock.connect(socket_path)
+            if _peer_uid(sock, socket_path) != os.getuid():
+                return None
+            sock.sendall(json.dumps(dict(params, op=op)).encode('utf-8') + b'\n')
+            raw_response = _read_line(sock)
+        response = json.loads(raw_response)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(response, dict) or not response.get('ok'):
+        return None
+    return response
+
+# --- Server ---
+
+class BookCache:
+    """Keeps the parsed book in memory and reloads it when the file changes,
+    or any of `watched_paths` (e.g. the run log of exported functions) does."""
+
+    def __init__(self, commands_file, loader, saver, watched_paths=()):
+        self.commands_file = commands_file
+        self.watched_paths = list(watched_paths)
+        self.loader = loader
+        self.saver = saver
+        self.lock = threading.Lock()
+        self.commands = []
+        self.by_name = {}
+        self.signature = None
+
+    def _file_signature(self):
+        # Every atomic shard write renames a file into the shard directory, which changes its mtime
+        path = self.commands_file
+        if book_shards.is_sharded(path):
+            path = book_shards.get_shard_dir(path)
+        signature = []
+        for watched in [path] + self.watched_paths:
+            try:
+                info = os.stat(watched)
+            except OSError:
+                signature.append(None)
+                continue
+            signature.append((info.st_mtime_ns, info.st_size, info.st_ino))
+        return tuple(signature)
+
+    def _reindex(self):
+        self.by_name = {}
+        for cmd in self.commands:
+            # First entry wins, matching the linear scan in 'run'
+            self.by_name.setdefault(cmd.get('name'), cmd)
+
+    def refresh(self):
+        """Reloads the book if it changed on disk since the last load."""
+        signature = self._file_signature()
+        if signature != self.signature:
+            self.commands = self.loader()
+            self.signature = signature
+            self._reindex()
+
+    def handle(self, message):
+        """Dispatches a decoded request and returns the response payload."""
+        op = message.get('op')
+        with self.lock:
+            self.refresh()
+            if op == 'ping':
+                return {'ok': True, 'pid': os.getpid(), 'commands_file': os.path.abspath(self.commands_file)}
+            if op == 'list':
+                return {'ok': True, 'commands': self.commands}
+            if op == 'names':
+                return {'ok': True, 'names': sorted(name for name in self.by_name if name)}
+            if op == 'tags':
+                tags = {tag for cmd in self.commands for tag in cmd.get('tags', [])}
+                return {'ok': True, 'tags': sorted(tags)}
+            if op == 'lookup':
+                return {'ok': True, 'entry': self.by_name.get(message.get('name'))}
+            if op == 'touch':
+                return self._touch(message.get('id'), message.get('last_run'))
+        return {'ok': False, 'error': f"Unknown operation '{op}'."}
+
+    def _touch(self, command_id, last_run):
+        """Records a run timestamp and writes the book back to disk."""
+        for cmd in self.commands:
+            if cmd.get('id') == command_id:
+                cmd['last_run'] = last_run
+                self.saver(self.commands)
+                self.signature = self._file_signature()
+                return {'ok': True, 'found': True}
+        return {'ok': True, 'found': False}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(MAX_REQUEST_BYTES)
+        try:
+            message = json.loads(line)
+        except ValueError:
+            response = {'ok': False, 'error': 'Malformed request.'}
+        else:
+            if message.get('op') == 'shutdown':
+                response = {'ok': True}
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            else:
+                response = self.server.book.handle(message)
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class _BookServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(commands_file, loader, saver, watched_paths=()):
+    """Runs the daemon in the foreground until a 'shutdown' request arrives.
+    Changes to `watched_paths` reload the book just like changes to the book itself."""
+    socket_path = get_socket_path(commands_file)
+    if ensure_socket_dir() is None:
+        print(f"Error: '{get_socket_dir()}' is not a directory only you can write to; not starting the daemon.")
+        return False
+    if request(commands_file, 'ping') is not None:
+        print(f"Error: A daemon is already serving '{commands_file}' at {socket_path}.")
+        return False
+    if os.path.exists(socket_path):
+        os.remove(socket_path) # Stale socket left behind by a crashed daemon
+
+    book = BookCache(commands_file, loader, saver, watched_paths)
+    book.refresh()
+    server = _BookServer(socket_path, _RequestHandler)
+    server.book = book
+    os.chmod(socket_path, 0o600)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+    return True
+
+# --- Thin Client CLI ---
+
+def main():
+    """Queries a running daemon without importing History Book itself.
+    Intended for shell completion and prompt integrations."""
+    import argparse
+    parser = argparse.ArgumentParser(description="History Book daemon client")
+    parser.add_argument('op', choices=['ping', 'names', 'tags', 'lookup'])
+    parser.add_argument('name', nargs='?', help="Command name for 'lookup'.")
+    parser.add_argument('--file', default="project_commands.json", help="Path to the command book.")
+    args = parser.parse_args()
+
+    response = request(args.file, args.op, name=args.name)
+    if response is None:
+        sys.exit(1)
+    if args.op in ('names', 'tags'):
+        print("\n".join(response[args.op]))
+    elif args.op == 'lookup':
+        if response['entry'] is None:
+            sys.exit(1)
+        print(response['entry']['command'])
+    else:
+        print(response['pid'])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+import math
+import os
+import re
+import select
+import struct
+import time
+from contextlib import contextmanager
+
+import scrape_history
+
+# --- Configuration ---
+POLL_INTERVAL = 1.0 # Seconds between size checks when inotify is unavailable
+MAX_TRACKED_COMMANDS = 500 # Frecency table size; bounds memory over days of uptime
+HALF_LIFE = 3600.0 # Seconds after which a command's score has decayed by half
+REUSE_THRESHOLD = 3.0 # Score at which a command is offered for saving
+MAX_PENDING_BYTES = 1024 * 1024 # An unterminated line longer than this is dropped
+# --- End Configuration ---
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len
+
+# --- Frecency ---
+
+class FrecencyTable:
+    """Exponentially decayed use counts for the most recent commands.
+    Holds at most `capacity` commands; the lowest-scoring ones are evicted."""
+
+    def __init__(self, capacity=MAX_TRACKED_COMMANDS, half_life=HALF_LIFE, threshold=REUSE_THRESHOLD):
+        self.capacity = capacity
+        self.decay = math.log(2) / half_life
+        self.threshold = threshold
+        self.entries = {} # command -> [score, last_seen, offered]
+
+    def score(self, command, now):
+        entry = self.entries.get(command)
+        if entry is None:
+            return 0.0
+        return entry[0] * math.exp(-self.decay * (now - entry[1]))
+
+    def observe(self, command, now=None):
+        """Records one use. Returns True the first time the command's score
+        reaches the threshold (while it stays tracked)."""
+        now = time.time() if now is None else now
+        entry = self.entries.get(command)
+        if entry is None:
+            if len(self.entries) >= self.capacity:
+                self._evict(now) # Before inserting, so the new command is never the one evicted
+            entry = self.entries[command] = [0.0, now, False]
+        entry[0] = self.score(command, now) + 1
+        entry[1] = now
+        # The slack keeps uses seconds apart from missing the threshold by a hair of decay
+        if not entry[2] and entry[0] >= self.threshold - 0.01:
+            entry[2] = True
+            return True
+        return False
+
+    def _evict(self, now):
+        """Drops the lowest-scoring quarter of the table in one pass."""
+        ranked = sorted(self.entries, key=lambda command: self.score(command, now))
+        for command in ranked[:max(1, self.capacity // 4)]:
+            del self.entries[command]
+
+# --- Tailing ---
+
+class HistoryTail:
+    """Reads only the bytes appended to a history file since the last call."""
+
+    def __init__(self, path, shell_type, from_start=False):
+        self.path = path
+        self.shell_type = shell_type
+        self.pending = b''
+        stat = os.stat(path)
+        self.inode = stat.st_ino
+        self.offset = 0 if from_start else stat.st_size
+
+    def read_new(self):
+        """Returns the commands completed since the previous call, oldest first.
+        If the file was rewritten (truncated or replaced, as shells do when
+        trimming history), reading resumes at its new end instead of re-reading it."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.inode, self.offset, self.pending = stat.st_ino, stat.st_size, b''
+            return []
+        if stat.st_size == self.offset:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+        self.offset += len(data)
+
+        lines = (self.pending + data).split(b'\n')
+        self.pending = lines.pop() # An incomplete last line is finished by a later write
+        if len(self.pending) > MAX_PENDING_BYTES:
+            self.pending = b''
+        commands = []
+        for raw_line in lines:
+            command = scrape_history.clean_history_line(raw_line.decode('utf-8', errors='ignore'), self.shell_type)
+            if command:
+                commands.append(command)
+        return commands
+
+# --- Watching ---
+
+class PollingWatcher:
+    """Fallback watcher: wakes up every POLL_INTERVAL seconds."""
+
+    def __init__(self, path, interval=POLL_INTERVAL):
+        self.interval = interval
+
+    def wait(self, timeout=None, wake_fds=()):
+        """Waits up to `timeout` seconds (or one interval). Returns the ready `wake_fds`."""
+        delay = self.interval if timeout is None else min(timeout, self.interval)
+        if wake_fds:
+            return select.select(list(wake_fds), [], [], delay)[0]
+        time.sleep(delay)
+        return []
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Wakes up as soon as the history file is written, using inotify through ctypes.
+    Watches the parent directory, so the file being replaced is noticed too."""
+
+    def __init__(self, path):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self.name = os.path.basename(path).encode()
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory = os.path.dirname(os.path.abspath(path)).encode()
+        if libc.inotify_add_watch(self.fd, directory, IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def _drain(self):
+        """Reads the queued events and reports whether any concerned the history file."""
+        relevant = False
+        while True:
+            try:
+                buffer = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return relevant
+            position = 0
+            while position < len(buffer):
+                _, _, _, name_length = EVENT_HEADER.unpack_from(buffer, position)
+                start = position + EVENT_HEADER.size
+                name = buffer[start:start + name_length].rstrip(b'\0')
+                relevant = relevant or name == self.name
+                position = start + name_length
+
+    def wait(self, timeout=None, wake_fds=()):
+        """Waits until the file changes, a `wake_fds` descriptor is readable, or
+        `timeout` expires. Returns the ready `wake_fds`."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready = select.select([self.fd] + list(wake_fds), [], [], remaining)[0]
+            woken = [fd for fd in ready if fd != self.fd]
+            if self.fd in ready and self._drain() or woken or not ready:
+                return woken
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(path):
+    """Returns an inotify watcher where supported, otherwise a polling one."""
+    try:
+        return InotifyWatcher(path)
+    except (OSError, AttributeError): # AttributeError: libc without inotify (e.g., macOS)
+        return PollingWatcher(path)
+
+@contextmanager
+def keypress_mode(fd):
+    """Puts a terminal into cbreak mode so single key presses can be read
+    without Enter; does nothing if `fd` is not a terminal."""
+    if not os.isatty(fd):
+        yield False
+        return
+    import termios
+    import tty
+    saved = termios.tcgetattr(fd)
+    try:
+        tty.setcbreak(fd)
+        yield True
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+
+# --- Quick Saving ---
+
+def suggest_name(command, taken):
+    """Derives a short, unused name from the first words of a command,
+    e.g. 'make test -j4' -> 'make-test'."""
+    words = [os.path.basename(word) for word in command.split()[:2] if not word.startswith('-')]
+    base = re.sub(r'[^a-z0-9]+', '-', "-".join(words).lower()).strip('-') or "command"
+    name = base
+    suffix = 2
+    while name in taken:
+        name = f"{base}-{suffix}"
+        suffix += 1
+    return name
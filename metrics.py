@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+import atexit
+import fcntl
+import math
+import os
+import re
+import tempfile
+import threading
+
+# --- Configuration ---
+METRICS_ENV_VAR = "HISTORY_BOOK_METRICS_FILE" # e.g. /var/lib/node_exporter/textfile/history_book.prom
+DURATION_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600) # Seconds
+FAMILIES = {
+    "history_book_runs_total": ("counter", "Commands run through history_book run."),
+    "history_book_run_failures_total": ("counter", "Runs that exited non-zero or were interrupted."),
+    "history_book_run_duration_seconds": ("histogram", "Wall-clock duration of runs."),
+}
+# --- End Configuration ---
+
+# Samples are keyed by (sample_name, ((label, value), ...)). Runs are aggregated
+# in _pending and merged into the textfile once, at process exit: the file is
+# parsed back, the deltas added, and the result renamed over it while holding a
+# lock on a sidecar '.lock' file, so concurrent runs never lose increments.
+_pending = {}
+_registered = {'atexit': False}
+_lock = threading.Lock() # 'run --in' records runs from worker threads
+
+SAMPLE_PATTERN = re.compile(r'^([A-Za-z_:][A-Za-z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$')
+LABEL_PATTERN = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+# --- Helper Functions ---
+
+def get_metrics_path():
+    """Returns the configured textfile path, or None when metrics are disabled."""
+    return os.environ.get(METRICS_ENV_VAR) or None
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _unescape(value):
+    return re.sub(r'\\(.)', lambda m: '\n' if m.group(1) == 'n' else m.group(1), value)
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _format_le(bound):
+    return "+Inf" if bound == math.inf else f"{bound:g}"
+
+def _add(name, labels, amount):
+    key = (name, labels)
+    _pending[key] = _pending.get(key, 0) + amount
+
+def record_run(command_name, tags, duration, success):
+    """Aggregates one run in memory; it is written out by flush() at process exit."""
+    if not get_metrics_path():
+        return
+    with _lock:
+        _record(command_name, tags, duration, success)
+    if not _registered['atexit']:
+        atexit.register(flush)
+        _registered['atexit'] = True
+
+def _record(command_name, tags, duration, success):
+    for tag in tags or [""]:
+        labels = (("command", command_name), ("tag", tag))
+        _add("history_book_runs_total", labels, 1)
+        _add("history_book_run_failures_total", labels, 0 if success else 1)
+        for bound in DURATION_BUCKETS + (math.inf,):
+            if duration <= bound:
+                _add("history_book_run_duration_seconds_bucket", labels + (("le", _format_le(bound)),), 1)
+        _add("history_book_run_duration_seconds_sum", labels, duration)
+        _add("history_book_run_duration_seconds_count", labels, 1)
+
+# --- Textfile Format ---
+
+def parse_samples(text):
+    """Parses the samples of a textfile previously written by render_samples()."""
+    samples = {}
+    for line in text.splitlines():
+        match = SAMPLE_PATTERN.match(line.strip())
+        if not match or line.startswith('#'):
+            continue
+        labels = tuple((key, _unescape(value)) for key, value in LABEL_PATTERN.findall(match.group(2) or ""))
+        try:
+            samples[(match.group(1), labels)] = float(match.group(3))
+        except ValueError:
+            continue
+    return samples
+
+def _family(sample_name):
+    for suffix in ("_bucket", "_sum", "_count"):
+        if sample_name.endswith(suffix) and sample_name[:-len(suffix)] in FAMILIES:
+            return sample_name[:-len(suffix)]
+    return sample_name
+
+def _sort_key(item):
+    (name, labels), _ = item
+    le = dict(labels).get("le")
+    bound = math.inf if le == "+Inf" else float(le) if le else 0.0
+    return (_family(name), tuple(pair for pair in labels if pair[0] != "le"), name, bound)
+
+def render_samples(samples):
+    """Renders samples in the Prometheus text exposition format."""
+    lines = []
+    current_family = None
+    for (name, labels), value in sorted(samples.items(), key=_sort_key):
+        family = _family(name)
+        if family != current_family:
+            metric_type, help_text = FAMILIES.get(family, ("untyped", ""))
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {metric_type}")
+            current_family = family
+        label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+        sample = f"{name}{{{label_text}}}" if label_text else name
+        lines.append(f"{sample} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+# --- Flushing ---
+
+def flush():
+    """Merges the pending increments into the textfile with a single rename."""
+    path = get_metrics_path()
+    if not path or not _pending:
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        with open(f"{path}.lock", 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(path, 'r') as f:
+                    samples = parse_samples(f.read())
+            except FileNotFoundError:
+                samples = {}
+            for key, amount in _pending.items():
+                samples[key] = samples.get(key, 0) + amount
+            # Written next to the target so the rename is atomic for node_exporter
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".history_book_metrics.", suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(render_samples(samples))
+                os.chmod(temp_path, 0o644)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        _pending.clear()
+    except OSError as e:
+        print(f"Warning: Could not update metrics file '{path}': {e}")
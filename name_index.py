@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import bisect
+
+# --- Configuration ---
+MAX_SUGGESTION_DISTANCE = 2 # Edit distance for "Did you mean ...?" suggestions
+MAX_SUGGESTIONS = 5
+# --- End Configuration ---
+
+# --- Edit Distance ---
+
+def levenshtein(a, b, max_distance=None):
+    """Returns the edit distance between two strings.
+    With `max_distance`, gives up early and returns max_distance + 1 once the
+    distance is known to exceed it."""
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    previous_row = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current_row = [i]
+        for j, char_b in enumerate(b, 1):
+            current_row.append(min(
+                previous_row[j] + 1,
+                current_row[j - 1] + 1,
+                previous_row[j - 1] + (char_a != char_b)
+            ))
+        if max_distance is not None and min(current_row) > max_distance:
+            return max_distance + 1
+        previous_row = current_row
+    return previous_row[-1]
+
+# --- Bigram Index ---
+# Names are indexed by their padded bigrams ("^b", "bu", ..., "d$"). An edit
+# changes at most two of the query's bigrams, so a name within distance k must
+# share at least len(query_bigrams) - 2k of them; only those are verified.
+
+def padded_bigrams(word):
+    """Returns the distinct bigrams of `word` with start/end markers."""
+    padded = f"^{word}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+def build_bigram_index(words):
+    """Maps each bigram to the positions of the words containing it."""
+    grams = {}
+    for position, word in enumerate(words):
+        for gram in padded_bigrams(word):
+            grams.setdefault(gram, []).append(position)
+    return grams
+
+def bigram_search(words, grams, word, max_distance):
+    """Returns (distance, word) pairs within `max_distance`, closest first."""
+    query_grams = padded_bigrams(word)
+    min_shared = len(query_grams) - 2 * max_distance
+    if min_shared > 0:
+        shared = {}
+        for gram in query_grams:
+            for position in grams.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        candidates = [position for position, count in shared.items() if count >= min_shared]
+    else:
+        candidates = range(len(words)) # Very short queries cannot be filtered by bigrams
+
+    matches = []
+    for position in candidates:
+        candidate = words[position]
+        if abs(len(candidate) - len(word)) > max_distance:
+            continue
+        distance = levenshtein(word, candidate, max_distance)
+        if distance <= max_distance:
+            matches.append((distance, candidate))
+    return sorted(matches)
+
+# --- Name Index ---
+
+def build_index(names, signature=None):
+    """Builds the lookup index stored next to the book.
+    `signature` identifies the book contents the index was built from."""
+    unique_names = sorted({name for name in names if name})
+    return {
+        'signature': signature,
+        'names': unique_names,
+        'bigrams': build_bigram_index(unique_names),
+    }
+
+def prefix_matches(index, prefix):
+    """Returns every indexed name starting with `prefix` (bisect on the sorted names)."""
+    names = index['names']
+    start = bisect.bisect_left(names, prefix)
+    end = bisect.bisect_left(names, prefix + '\U0010ffff')
+    return names[start:end]
+
+def resolve(index, name):
+    """Resolves a possibly abbreviated or misspelled name.
+    Returns (kind, names) where kind is one of:
+      'exact'     - the name exists as typed
+      'prefix'    - a unique abbreviation of one name
+      'ambiguous' - an abbreviation of several names
+      'suggest'   - no match, but these names are within a small edit distance
+      'none'      - nothing similar is saved"""
+    matches = prefix_matches(index, name)
+    if matches and matches[0] == name:
+        return 'exact', [name]
+    if len(matches) == 1:
+        return 'prefix', matches
+    if matches:
+        return 'ambiguous', matches
+    suggestions = bigram_search(index['names'], index['bigrams'], name, MAX_SUGGESTION_DISTANCE)
+    if suggestions:
+        return 'suggest', [word for _, word in suggestions[:MAX_SUGGESTIONS]]
+    return 'none', []
@@ -8,6 +8,8 @@ import sys
 import argparse # NEW: Import argparse
 from whiptail import Whiptail
 
+import tracing
+
 # --- Configuration ---
 COMMAND_LIMIT = 200
 # --- End Configuration ---
@@ -27,16 +29,37 @@ def get_history_file_path():
 
 def parse_history(file_path, shell_type):
     """Reads and cleans the history file."""
+    with tracing.span("parse_history"):
+        return _parse_history(file_path, shell_type)
+
+ZSH_EXTENDED_PREFIX = re.compile(r'^: \d+:\d+;')
+
+def clean_history_line(line, shell_type):
+    """Returns the command recorded on one raw history line, or "" if the line
+    holds no command (blank lines and fish's 'when:'/'paths:' metadata)."""
+    line = line.strip()
+    if shell_type == "zsh":
+        return ZSH_EXTENDED_PREFIX.sub('', line, count=1) if line.startswith(': ') else line
+    if shell_type == "fish":
+        return line[7:] if line.startswith('- cmd: ') else ""
+    return line
+
+def iter_history_commands(file_path, shell_type):
+    """Yields every command in a history file, oldest first, reading it as a stream."""
+    with open(file_path, 'r', errors='ignore') as f:
+        for line in f:
+            command = clean_history_line(line, shell_type)
+            if command:
+                yield command
+
+def _parse_history(file_path, shell_type):
     commands = []
     try:
         with open(file_path, 'r', errors='ignore') as f:
             lines = f.readlines()
         seen_commands = set()
         for line in reversed(lines):
-            line = line.strip()
-            if not line: continue
-            if shell_type == "zsh": line = re.sub(r'^: \d+:\d+;', '', line)
-            if shell_type == "fish" and line.startswith('- cmd: '): line = line[7:]
+            line = clean_history_line(line, shell_type)
             if line and line not in seen_commands:
                 seen_commands.add(line)
                 commands.append(line)
@@ -46,76 +69,97 @@ def parse_history(file_path, shell_type):
         # print(f"❌ Error reading history file: {e}") # Suppress for cleaner subprocess output
         return []
 
-def main():
-    # Add argument parsing for output file
-    parser = argparse.ArgumentParser(description="History Book Scraper CLI")
-    parser.add_argument('--output-file', type=str, required=True,
-                        help='Path to the file where selected commands will be written as JSON.')
-    args = parser.parse_args()
+def prompt_entry_details(w, command_text):
+    """Asks for the name, description, tags and quiet flag of one selected command
+    and returns the new book entry."""
+    name, code_name = w.inputbox(
+        f"Enter a short name for:\n\n'{command_text}'\n\n(Optional, for 'run <name>')",
+        default=""
+    )
+    if code_name != 0: name = ""
 
-    w = Whiptail(title="History Book Scraper", backtitle="Select Commands")
+    description, code_desc = w.inputbox(
+        f"Enter a description for:\n\n'{command_text}'",
+        default=""
+    )
+    if code_desc != 0: description = ""
+
+    tags_str, code_tags = w.inputbox(
+        f"Enter comma-separated tags for:\n\n'{command_text}'\n\n(e.g., build, test, docker)",
+        default=""
+    )
+    tags = [tag.strip() for tag in tags_str.split(',')] if code_tags == 0 and tags_str else []
+
+    quiet_status_initial = "OFF"
+    prompt_quiet_text = (
+        f"Set command '{command_text}' to run quietly by default?\n\n"
+        f"Current status: {quiet_status_initial}\n\n"
+        "Select 'Yes' to suppress this script's output (e.g., 'Running:' messages) when this command is executed via 'history_book run'.\n"
+        "Select 'No' to show all output."
+    )
+    quiet_selected = w.yesno(prompt_quiet_text)
+
+    return {
+        "id": str(uuid.uuid4()),
+        "name": name.strip(),
+        "command": command_text,
+        "description": description,
+        "tags": tags,
+        "last_run": None,
+        "quiet": quiet_selected
+    }
+
+def collect_new_entries(w=None):
+    """Scrapes the shell history, lets the user pick commands and describe them,
+    and returns the new entries (an empty list if nothing was selected).
+    Returns None when no usable history file was found."""
+    import fuzzy_picker
+    if w is None:
+        w = Whiptail(title="History Book Scraper", backtitle="Select Commands")
 
     file_path, shell_type = get_history_file_path()
     if not file_path:
         w.msgbox("Could not find a supported history file (.zsh_history, .bash_history) in your home directory.")
-        sys.exit(1)
+        return None
 
     commands = parse_history(file_path, shell_type)
     if not commands:
         w.msgbox("No commands found or unable to parse history file.")
-        sys.exit(1)
+        return None
 
     command_map = {str(i): cmd for i, cmd in enumerate(commands)}
     
-    choices = [(str(i), cmd, 'OFF') for i, cmd in enumerate(commands)]
-
-    selected_tags, exit_code = w.checklist(
-        "Use SPACE to select commands you wish to save for this project. Press ENTER when done.",
-        choices
-    )
+    if fuzzy_picker.should_use_picker(len(commands)):
+        # Large histories: type-to-filter instead of one whiptail checklist holding every line
+        with tracing.span("fuzzy picker"):
+            selection = fuzzy_picker.pick(commands, "Select commands to save for this project", multi=True)
+        selected_tags, exit_code = ([str(i) for i in selection], 0) if selection else ([], 1)
+    else:
+        choices = [(str(i), cmd, 'OFF') for i, cmd in enumerate(commands)]
+
+        with tracing.span("whiptail checklist"):
+            selected_tags, exit_code = w.checklist(
+                "Use SPACE to select commands you wish to save for this project. Press ENTER when done.",
+                choices
+            )
 
     new_entries = []
     if exit_code == 0 and selected_tags: # 0 indicates OK/Yes in whiptail
         for tag in selected_tags:
-            command_text = command_map[tag]
-            
-            name, code_name = w.inputbox(
-                f"Enter a short name for:\n\n'{command_text}'\n\n(Optional, for 'run <name>')",
-                default=""
-            )
-            if code_name != 0: name = ""
+            with tracing.span("whiptail dialogs"):
+                new_entries.append(prompt_entry_details(w, command_map[tag]))
+    return new_entries
 
-            description, code_desc = w.inputbox(
-                f"Enter a description for:\n\n'{command_text}'",
-                default=""
-            )
-            if code_desc != 0: description = ""
+def main():
+    """Standalone CLI: writes the selected entries as JSON to --output-file."""
+    parser = argparse.ArgumentParser(description="History Book Scraper CLI")
+    parser.add_argument('--output-file', type=str, required=True,
+                        help='Path to the file where selected commands will be written as JSON.')
+    args = parser.parse_args()
 
-            tags_str, code_tags = w.inputbox(
-                f"Enter comma-separated tags for:\n\n'{command_text}'\n\n(e.g., build, test, docker)",
-                default=""
-            )
-            tags = [tag.strip() for tag in tags_str.split(',')] if code_tags == 0 and tags_str else []
-
-            quiet_status_initial = "OFF"
-            prompt_quiet_text = (
-                f"Set command '{command_text}' to run quietly by default?\n\n"
-                f"Current status: {quiet_status_initial}\n\n"
-                "Select 'Yes' to suppress this script's output (e.g., 'Running:' messages) when this command is executed via 'history_book run'.\n"
-                "Select 'No' to show all output."
-            )
-            quiet_selected = w.yesno(prompt_quiet_text)
-
-            entry = {
-                "id": str(uuid.uuid4()),
-                "name": name.strip(),
-                "command": command_text,
-                "description": description,
-                "tags": tags,
-                "last_run": None,
-                "quiet": quiet_selected
-            }
-            new_entries.append(entry)
+    new_entries = collect_new_entries()
+    if new_entries is None:
+        sys.exit(1)
     
     # Write the JSON output to the specified file
     try:
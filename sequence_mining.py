@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import heapq
+
+# --- Configuration ---
+DEFAULT_CAPACITY = 2000 # Counters kept per sequence length; bounds memory regardless of history size
+MIN_LENGTH = 2
+MAX_LENGTH = 4
+SUBSUMED_RATIO = 0.9 # Hide a sequence when a longer one containing it is at least this frequent
+IGNORED_COMMANDS = {"ls", "ll", "la", "clear", "pwd", "history", "exit"} # Noise between real steps
+# --- End Configuration ---
+
+# --- Bounded Counter ---
+
+class BoundedCounter:
+    """Approximate heavy-hitter counter holding at most 2 * `capacity` items.
+    When the table doubles, it is pruned back to at most the `capacity` largest
+    counts in one batch, which keeps the per-item cost at a dict update. `floor` is the
+    largest count discarded so far: an item's true count lies between its
+    reported count and count + its error (the floor when it was last admitted)."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+
+    def add(self, item):
+        counts = self.counts
+        count = counts.get(item)
+        if count is not None:
+            counts[item] = count + 1
+            return
+        counts[item] = 1
+        if self.floor:
+            self.errors[item] = self.floor
+        if len(counts) >= 2 * self.capacity:
+            self._prune()
+
+    def _prune(self):
+        counts = self.counts
+        # Keep the items counted more often than the capacity-th largest count.
+        # In a noisy history that threshold is usually 1, so most of the table goes at once.
+        threshold = heapq.nlargest(self.capacity, counts.values())[-1]
+        kept = [(item, count) for item, count in counts.items() if count > threshold]
+        self.floor = max(self.floor, threshold)
+        counts.clear() # Pruned in place: count_sequences holds a reference to this dict
+        counts.update(kept)
+        self.errors = {item: error for item, error in self.errors.items() if item in counts}
+
+    def top(self, limit=None):
+        """Returns (item, count, error) tuples, most frequent first."""
+        ranked = sorted(self.counts.items(), key=lambda pair: (-pair[1], pair[0]))
+        return [(item, count, self.errors.get(item, 0)) for item, count in ranked[:limit]]
+
+# --- Sequence Mining ---
+
+STEP_SEPARATOR = " && " # How a mined sequence is saved as one multi-step command
+
+def normalize_command(command):
+    """Collapses whitespace so trivially different spellings count as one command."""
+    return " ".join(command.split())
+
+def count_sequences(commands, min_length=MIN_LENGTH, max_length=MAX_LENGTH, capacity=DEFAULT_CAPACITY):
+    """Counts consecutive command n-grams in one streaming pass.
+    Immediate repeats and IGNORED_COMMANDS are skipped, so they neither count
+    as steps nor break a sequence. Like Apriori, an n-gram is only counted once
+    its (n-1)-gram prefix has been seen twice, which skips most of the one-off
+    sequences in a noisy history. Returns {length: BoundedCounter}."""
+    counters = {length: BoundedCounter(capacity) for length in range(min_length, max_length + 1)}
+    levels = [(length, counters[length], counters.get(length - 1)) for length in range(min_length, max_length + 1)]
+    window = ()
+    for command in commands:
+        if "  " in command or "\t" in command:
+            command = normalize_command(command)
+        if not command or command in IGNORED_COMMANDS or (window and window[-1] == command):
+            continue
+        window = window[1 - max_length:] + (command,)
+        size = len(window)
+        for length, counter, prefix_counter in levels:
+            if length > size:
+                break
+            steps = window[size - length:]
+            if prefix_counter is not None and prefix_counter.counts.get(steps[:-1], 0) < 2:
+                break # Longer sequences share this prefix, so they are skipped too
+            counts = counter.counts
+            count = counts.get(steps)
+            if count is None:
+                counter.add(steps)
+            else:
+                counts[steps] = count + 1
+    return counters
+
+def top_sequences(counters, limit=None, min_count=3):
+    """Returns (steps, count) for the most frequent sequences, by their
+    guaranteed (lower-bound) counts. A sequence is dropped when a longer
+    reported sequence containing it occurs nearly as often, because it then
+    rarely happens on its own."""
+    candidates = []
+    for counter in counters.values():
+        for steps, count, _ in counter.top():
+            if count >= min_count and len(set(steps)) == len(steps): # Skip a-b-a loops
+                candidates.append((steps, count))
+    candidates.sort(key=lambda pair: (-pair[1], -len(pair[0]), pair[0]))
+
+    # Highest count of any longer candidate containing each contiguous sub-sequence.
+    # Each extra step can miss one early occurrence (its prefix must repeat before
+    # it is counted), so that is credited back before comparing.
+    extended = {}
+    for steps, count in candidates:
+        for length in range(2, len(steps)):
+            for start in range(len(steps) - length + 1):
+                part = steps[start:start + length]
+                extended[part] = max(extended.get(part, 0), count + len(steps) - length)
+
+    selected = []
+    for steps, count in candidates:
+        if extended.get(steps, 0) >= count * SUBSUMED_RATIO:
+            continue
+        selected.append((steps, count))
+        if len(selected) == limit:
+            break
+    return selected
+
+def to_command(steps):
+    """Joins the steps of a sequence into one command that stops at the first failure."""
+    return STEP_SEPARATOR.join(steps)
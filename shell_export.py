@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import shlex
+
+# --- Configuration ---
+FUNCTION_PREFIX = "hb_"
+SUPPORTED_SHELLS = ("bash", "zsh", "fish")
+RUN_LOG_NAME = "runs.log" # Append-only "<id>\t<timestamp>" lines written by exported functions
+# --- End Configuration ---
+
+# Rendered function bodies of the last export pass per shell, keyed by
+# everything that affects their text. Lets a long-lived process (e.g., the
+# daemon) re-render only entries that changed; each pass replaces its shell's
+# cache, so it never holds more than one book's worth of functions.
+_rendered_cache = {}
+
+# --- Helper Functions ---
+
+def get_export_path(cache_dir, shell):
+    """Returns the path of the generated function file for a shell."""
+    return os.path.join(cache_dir, f"functions.{shell}")
+
+def get_run_log_path(cache_dir):
+    """Returns the path of the append-only run log."""
+    return os.path.join(cache_dir, RUN_LOG_NAME)
+
+def sanitize_function_name(name):
+    """Turns a saved command name into a valid shell function name."""
+    sanitized = re.sub(r'[^A-Za-z0-9_]', '_', name.strip())
+    return f"{FUNCTION_PREFIX}{sanitized}"
+
+def assign_function_names(entries):
+    """Returns (function_name, entry) pairs for every named entry.
+    Names that collide after sanitization get a numeric suffix in book order."""
+    used = set()
+    assigned = []
+    for entry in entries:
+        if not entry.get('name', '').strip():
+            continue # Unnamed entries cannot be called by name
+        base = sanitize_function_name(entry['name'])
+        function_name = base
+        suffix = 2
+        while function_name in used:
+            function_name = f"{base}_{suffix}"
+            suffix += 1
+        used.add(function_name)
+        assigned.append((function_name, entry))
+    return assigned
+
+def _fish_quote(text):
+    """Quotes a string for fish, which only honours \\' and \\\\ inside single quotes."""
+    return "'" + text.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def _comment(text):
+    return " ".join(text.split())
+
+def _render_key(function_name, entry, run_log_path):
+    return (function_name, entry.get('id'), entry['command'], entry.get('setup'), entry.get('description', ''), run_log_path)
+
+def render_function(shell, function_name, entry, run_log_path):
+    """Renders one saved command as a shell function that records successful runs."""
+    # Like 'run', which hands commands to /bin/sh, the command runs in a child
+    # process, so cd, exit, set -e or source cannot leak into the user's shell.
+    # A setup step runs in front of the command, as 'run' does without a snapshot
+    command = f"{entry['setup']} && {entry['command']}" if entry.get('setup') else entry['command']
+    description = _comment(entry.get('description', '') or entry['command'])
+    if shell == "fish":
+        text = (
+            f"function {function_name} --description {_fish_quote(description)}\n"
+            f"    sh -c {_fish_quote(command)}\n"
+            f"    set -l hb_status $status\n"
+            f"    if test $hb_status -eq 0\n"
+            f"        printf '%s\\t%s\\n' {_fish_quote(entry['id'])} (date -u +%Y-%m-%dT%H:%M:%SZ) >> {_fish_quote(run_log_path)}\n"
+            f"    end\n"
+            f"    return $hb_status\n"
+            f"end\n"
+        )
+    else: # bash and zsh share POSIX function syntax
+        text = (
+            f"# {description}\n"
+            f"{function_name}() {{\n"
+            f"    (\n"
+            f"        {command}\n"
+            f"    )\n"
+            f"    local hb_status=$?\n"
+            f"    if [ \"$hb_status\" -eq 0 ]; then\n"
+            f"        printf '%s\\t%s\\n' {shlex.quote(entry['id'])} \"$(date -u +%Y-%m-%dT%H:%M:%SZ)\" >> {shlex.quote(run_log_path)}\n"
+            f"    fi\n"
+            f"    return \"$hb_status\"\n"
+            f"}}\n"
+        )
+    return text
+
+def exported_functions(entries):
+    """Returns [(function_name, entry), ...] for the entries that become shell functions.
+    Entries taking key=value parameters are left to 'run', which fills their
+    {placeholders}; a function would run the placeholder text literally."""
+    return assign_function_names([entry for entry in entries if not entry.get('params')])
+
+def render_export(entries, shell, run_log_path, functions=None):
+    """Renders the full sourceable file for a shell.
+    `functions` may pass in an already computed exported_functions(entries)."""
+    if shell not in SUPPORTED_SHELLS:
+        raise ValueError(f"Unsupported shell '{shell}'.")
+    header = (
+        f"# Generated by History Book for {shell}. Do not edit: this file is\n"
+        f"# regenerated whenever project_commands.json changes.\n"
+    )
+    if functions is None:
+        functions = exported_functions(entries)
+    previous = _rendered_cache.get(shell, {})
+    rendered = {}
+    for function_name, entry in functions:
+        key = _render_key(function_name, entry, run_log_path)
+        rendered[key] = previous.get(key) or render_function(shell, function_name, entry, run_log_path)
+    _rendered_cache[shell] = rendered
+    return header + "\n" + "\n".join(rendered.values())
+
+def write_export(entries, shell, cache_dir, write_text):
+    """Writes the export for a shell, skipping the write when nothing changed.
+    `write_text` performs the (atomic) write. Returns the export path and the
+    [(function_name, entry), ...] pairs written to it."""
+    export_path = get_export_path(cache_dir, shell)
+    run_log_path = os.path.abspath(get_run_log_path(cache_dir))
+    functions = exported_functions(entries)
+    text = render_export(entries, shell, run_log_path, functions)
+    try:
+        with open(export_path, 'r', encoding='utf-8') as f:
+            if f.read() == text:
+                return export_path, functions
+    except (FileNotFoundError, IOError):
+        pass
+    write_text(export_path, text)
+    return export_path, functions
+
+def refresh_exports(entries, cache_dir, write_text):
+    """Regenerates every export that was previously created in `cache_dir`."""
+    for shell in SUPPORTED_SHELLS:
+        if os.path.isfile(get_export_path(cache_dir, shell)):
+            write_export(entries, shell, cache_dir, write_text)
+
+# --- Run Log ---
+
+def read_run_log(cache_dir):
+    """Returns {command_id: latest_timestamp} from the run log, including a
+    log that was set aside for merging but not yet folded into the book."""
+    latest = {}
+    log_path = get_run_log_path(cache_dir)
+    for path in (f"{log_path}.merging", log_path):
+        try:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                for line in f:
+                    command_id, _, timestamp = line.rstrip('\n').partition('\t')
+                    if timestamp and timestamp > latest.get(command_id, ''):
+                        latest[command_id] = timestamp
+        except FileNotFoundError:
+            continue
+    return latest
+
+def apply_run_log(entries, run_log):
+    """Folds recorded runs into the entries' 'last_run' timestamps."""
+    for entry in entries:
+        timestamp = run_log.get(entry.get('id'))
+        if timestamp and timestamp > (entry.get('last_run') or ''):
+            entry['last_run'] = timestamp
+
+def begin_run_log_merge(cache_dir):
+    """Sets the current run log aside so runs recorded from now on go to a
+    fresh file. Returns the runs that need to be folded into the book."""
+    log_path = get_run_log_path(cache_dir)
+    merging_path = f"{log_path}.merging"
+    try:
+        if not os.path.isfile(merging_path):
+            os.replace(log_path, merging_path)
+    except FileNotFoundError:
+        pass
+    return read_run_log(cache_dir)
+
+def finish_run_log_merge(cache_dir):
+    """Discards the set-aside run log once the book has been written."""
+    try:
+        os.remove(f"{get_run_log_path(cache_dir)}.merging")
+    except FileNotFoundError:
+        pass
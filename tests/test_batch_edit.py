@@ -0,0 +1,72 @@
+import pytest
+
+from batch_edit import select_entries, apply_operations, plan_changes, has_operations, render_preview
+
+ENTRIES = [
+    {"id": "1", "name": "install", "command": "npm install", "tags": ["npm", "setup"], "quiet": False},
+    {"id": "2", "name": "test", "command": "npm run test", "tags": ["npm", "ci"], "quiet": False},
+    {"id": "3", "name": "deploy-prod", "command": "./deploy.sh prod", "tags": ["deploy"], "quiet": True},
+]
+
+def test_select_entries_by_tags_and_name():
+    """Tags match case-insensitively; names use shell-style patterns."""
+    assert select_entries(ENTRIES, tags=["NPM"]) == [0, 1]
+    assert select_entries(ENTRIES, name_pattern="deploy-*") == [2]
+    assert select_entries(ENTRIES, tags=["npm"], name_pattern="t*") == [1]
+    assert select_entries(ENTRIES) == [0, 1, 2]
+
+def test_apply_operations_returns_edited_copy():
+    """Renames, removals, additions, replacements and quiet are applied to a copy."""
+    operations = {
+        'rename_tags': {"npm": "pnpm"},
+        'remove_tags': ["setup"],
+        'add_tags': ["js", "pnpm"],
+        'replace': [("npm", "pnpm")],
+        'quiet': True,
+    }
+    edited = apply_operations(ENTRIES[0], operations)
+    assert edited['tags'] == ["pnpm", "js"]
+    assert edited['command'] == "pnpm install"
+    assert edited['quiet'] is True
+    assert ENTRIES[0]['tags'] == ["npm", "setup"] # Unchanged
+
+def test_plan_changes_skips_unchanged_entries():
+    """Only entries the operations actually change are returned."""
+    operations = {'add_tags': ["deploy"]}
+    changes = plan_changes(ENTRIES, [0, 2], operations)
+    assert [i for i, _ in changes] == [0]
+    assert has_operations(operations)
+    assert not has_operations({'add_tags': [], 'quiet': None})
+
+def test_render_preview_truncates():
+    """The preview lists changed fields and can be truncated."""
+    changes = plan_changes(ENTRIES, [0, 1], {'replace': [("npm", "pnpm")]})
+    preview = render_preview(ENTRIES, changes, limit=1)
+    assert "install\n    command: npm install → pnpm install" in preview
+    assert "... and 1 more" in preview
+
+def test_apply_operations_sets_setup_and_strips_it_from_the_command():
+    """Setting a setup moves a matching leading step out of the command; "" clears it."""
+    entry = {"command": "source .venv/bin/activate && pytest", "tags": []}
+    edited = apply_operations(entry, {'setup': "source .venv/bin/activate"})
+    assert edited['command'] == "pytest"
+    assert edited['setup'] == "source .venv/bin/activate"
+    cleared = apply_operations(edited, {'setup': ""})
+    assert 'setup' not in cleared
+    assert cleared['command'] == "source .venv/bin/activate && pytest" # The step is not lost
+    assert apply_operations(entry, {'setup': ""}) == dict(entry, tags=[]) # Nothing to restore
+
+def test_apply_operations_keeps_a_replaced_setup():
+    """Setting a different setup keeps the old step in the command instead of dropping it."""
+    entry = {"command": "pytest", "setup": "source .venv/bin/activate", "tags": []}
+    edited = apply_operations(entry, {'setup': "nvm use 20"})
+    assert edited['setup'] == "nvm use 20"
+    assert edited['command'] == "source .venv/bin/activate && pytest"
+    assert apply_operations(entry, {'setup': "source .venv/bin/activate"}) == entry # Unchanged
+
+def test_apply_operations_turns_params_on_and_off():
+    """'params' is stored only while on, so plain entries keep their usual fields."""
+    edited = apply_operations(ENTRIES[2], {'params': True})
+    assert edited['params'] is True
+    assert 'params' not in apply_operations(edited, {'params': False})
+    assert has_operations({'params': False})
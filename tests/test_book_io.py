@@ -0,0 +1,72 @@
+import pytest
+import io
+import json
+
+from book_io import detect_format, read_records, normalize_entry, import_entries, write_entries
+
+def test_detect_format():
+    """Formats are inferred from the extension; stdin uses the default."""
+    assert detect_format("seed.csv") == "csv"
+    assert detect_format("seed.JSONL") == "ndjson"
+    assert detect_format("seed.json") == "json"
+    assert detect_format("-") == "ndjson"
+
+def test_normalize_entry_fills_defaults_and_parses_strings():
+    """CSV-style strings are converted; missing fields get defaults."""
+    entry = normalize_entry({"command": "make", "tags": "build, ci,", "quiet": "yes", "last_run": ""})
+    assert entry['tags'] == ["build", "ci"]
+    assert entry['quiet'] is True
+    assert entry['last_run'] is None
+    assert entry['id'] # A fresh id is generated
+
+    with pytest.raises(ValueError, match="'command' is required"):
+        normalize_entry({"name": "no-command"})
+    with pytest.raises(ValueError, match="'quiet'"):
+        normalize_entry({"command": "ls", "quiet": "maybe"})
+
+def test_normalize_entry_validates_resource():
+    """An optional 'resource' declaration is kept when valid and rejected otherwise."""
+    assert normalize_entry({"command": "make", "resource": " heavy:4 "})['resource'] == "heavy:4"
+    assert 'resource' not in normalize_entry({"command": "make", "resource": ""})
+    with pytest.raises(ValueError, match="Invalid resource"):
+        normalize_entry({"command": "make", "resource": "heavy:0"})
+
+def test_normalize_entry_keeps_setup():
+    """An optional 'setup' prefix is kept, trimmed; an empty one is dropped."""
+    assert normalize_entry({"command": "pytest", "setup": " source .venv/bin/activate "})['setup'] == "source .venv/bin/activate"
+    assert 'setup' not in normalize_entry({"command": "pytest", "setup": ""})
+
+def test_normalize_entry_keeps_params_flag():
+    """'params' opts an entry into {placeholders}; false or missing leaves it out."""
+    assert normalize_entry({"command": "deploy {env}", "params": "true"})['params'] is True
+    assert 'params' not in normalize_entry({"command": "deploy {env}", "params": False})
+
+def test_import_entries_deduplicates_in_one_pass():
+    """Duplicates of the book or of earlier records are skipped; invalid ones are reported."""
+    existing = [{"id": "1", "command": "make"}]
+    stream = io.StringIO(
+        '{"command": "make"}\n'
+        '{"id": "1", "command": "other"}\n'
+        '{"command": "ls"}\n'
+        '{"command": "ls"}\n'
+        '\n'
+        'not json\n'
+    )
+    new_entries, skipped, errors = import_entries(existing, read_records(stream, "ndjson"))
+    assert [entry['command'] for entry in new_entries] == ["ls"]
+    assert skipped == 3
+    assert len(errors) == 1 and errors[0].startswith("line 6: invalid JSON")
+
+@pytest.mark.parametrize("fmt", ["ndjson", "json", "csv"])
+def test_write_then_read_round_trip(fmt):
+    """Every export format imports back to the same entries."""
+    entries = [
+        {"id": "1", "name": "build", "command": "make \"all\"", "description": "d, with comma", "tags": ["a", "b"], "last_run": None, "quiet": True},
+        {"id": "2", "name": "", "command": "ls", "description": "", "tags": [], "last_run": "2025-01-01T00:00:00Z", "quiet": False},
+    ]
+    buffer = io.StringIO()
+    write_entries(entries, buffer, fmt)
+    buffer.seek(0)
+    new_entries, skipped, errors = import_entries([], read_records(buffer, fmt))
+    assert errors == []
+    assert new_entries == entries
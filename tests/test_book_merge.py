@@ -0,0 +1,97 @@
+import pytest
+
+from book_merge import content_hash, stamp_entries, assign_missing_ids, merge_books
+
+def entry(id, command, **fields):
+    return dict({"id": id, "name": id, "command": command, "description": "", "tags": [], "last_run": None, "quiet": False}, **fields)
+
+def test_stamp_entries_bumps_revision_only_on_content_changes():
+    """Edits create a new revision; runs (last_run) and re-saves do not."""
+    book = [entry("a", "make")]
+    stamp_entries(book)
+    assert book[0]['rev'] == 1
+
+    book[0]['last_run'] = "2024-01-01T00:00:00Z"
+    stamp_entries(book)
+    assert book[0]['rev'] == 1
+
+    book[0]['tags'] = ["build"]
+    stamp_entries(book)
+    assert book[0]['rev'] == 2
+    assert book[0]['hash'] == content_hash(book[0])
+
+def test_assign_missing_ids_is_deterministic():
+    """Two clones loading the same legacy book agree on its ids, even for repeated entries."""
+    first = [{"name": "t", "command": "make"}, {"name": "t", "command": "make"}, {"id": "kept", "command": "ls"}]
+    second = [dict(item) for item in first]
+    assign_missing_ids(first)
+    assign_missing_ids(second)
+    assert [item['id'] for item in first] == [item['id'] for item in second]
+    assert first[0]['id'] != first[1]['id']
+    assert first[2]['id'] == "kept"
+
+def test_merge_books_combines_independent_changes():
+    """Additions, deletions and edits to different fields from both sides are all kept."""
+    base = [entry("a", "make"), entry("b", "deploy"), entry("c", "old")]
+    ours = [entry("a", "make", description="Builds"), entry("b", "deploy"), entry("c", "old"), entry("ours", "new")]
+    theirs = [entry("a", "make -j8"), entry("b", "deploy"), entry("theirs", "other")]
+
+    merged, conflicts = merge_books(base, ours, theirs)
+
+    assert conflicts == []
+    assert [item['id'] for item in merged] == ["a", "b", "ours", "theirs"] # 'c' was deleted by them
+    assert merged[0]['command'] == "make -j8"
+    assert merged[0]['description'] == "Builds"
+    assert all(item['hash'] == content_hash(item) for item in merged)
+
+def test_merge_books_resolves_tags_and_last_run():
+    """Concurrent tag edits are merged as a set union and the latest run wins."""
+    base = [entry("a", "make", tags=["ci", "old"], last_run="2024-01-01T00:00:00Z")]
+    ours = [entry("a", "make", tags=["ci", "old", "fast"], last_run="2024-03-01T00:00:00Z")]
+    theirs = [entry("a", "make", tags=["ci", "unit"], last_run="2024-02-01T00:00:00Z")]
+
+    merged, conflicts = merge_books(base, ours, theirs)
+
+    assert conflicts == []
+    assert merged[0]['tags'] == ["ci", "old", "fast", "unit"] # A union: 'old' is kept since we still have it
+    assert merged[0]['last_run'] == "2024-03-01T00:00:00Z"
+
+def test_merge_books_reports_real_conflicts():
+    """Both sides changing a command, or one changing what the other deleted, keeps our version."""
+    base = [entry("a", "deploy"), entry("b", "lint")]
+    ours = [entry("a", "deploy --dev"), entry("b", "lint --fix")]
+    theirs = [entry("a", "deploy --prod")]
+
+    merged, conflicts = merge_books(base, ours, theirs)
+
+    assert [item['command'] for item in merged] == ["deploy --dev", "lint --fix"]
+    assert len(conflicts) == 2
+    assert "'command' changed on both sides" in conflicts[0]
+    assert "deleted by them" in conflicts[1]
+
+def test_merge_books_revisions():
+    """A merged entry equal to one side keeps that revision; a combination is a new one."""
+    base = [entry("a", "make", rev=1), entry("b", "ls", rev=1)]
+    ours = [entry("a", "make", description="x", rev=2), entry("b", "ls", rev=1)]
+    theirs = [entry("a", "make -j8", rev=3), entry("b", "ls -la", rev=2)]
+    for book in (base, ours, theirs):
+        for item in book:
+            item['hash'] = content_hash(item)
+
+    merged, _ = merge_books(base, ours, theirs)
+
+    assert merged[0]['rev'] == 4
+    assert merged[1]['rev'] == 2
+    assert merged[1]['hash'] == theirs[1]['hash']
+
+def test_merge_books_matches_legacy_entries_without_ids():
+    """Entries saved before ids existed still match across the three versions."""
+    base = [{"name": "t", "command": "make", "tags": []}]
+    ours = [{"name": "t", "command": "make", "tags": ["a"]}]
+    theirs = [{"name": "t", "command": "make", "tags": ["b"]}]
+
+    merged, conflicts = merge_books(base, ours, theirs)
+
+    assert conflicts == []
+    assert len(merged) == 1
+    assert merged[0]['tags'] == ["a", "b"]
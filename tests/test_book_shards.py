@@ -0,0 +1,76 @@
+import pytest
+import json
+import os
+
+import book_shards
+from book_shards import shard_key, build_manifest, write_book, load_entries, load_manifest, shards_for_name, shards_for_tags, is_sharded
+
+def write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def entries():
+    return [
+        {"id": "1", "name": "build", "command": "make", "tags": ["build"]},
+        {"id": "2", "name": "deploy", "command": "make deploy", "tags": ["Release", "ci"]},
+        {"id": "3", "name": "lint", "command": "make lint", "tags": ["ci"]},
+        {"id": "4", "name": "shell", "command": "bash", "tags": []},
+    ]
+
+def test_shard_key_strategies():
+    """Tag shards follow the first tag; hash shards stay within the configured count."""
+    assert shard_key({"tags": ["Release", "ci"]}, "tag") == "tag-release"
+    assert shard_key({"tags": []}, "tag") == "untagged"
+    keys = {shard_key({"name": f"cmd{i}"}, "hash", 4) for i in range(100)}
+    assert keys == {"hash-00", "hash-01", "hash-02", "hash-03"}
+
+def test_build_manifest_maps_names_and_tags():
+    """Every tag lists each shard holding an entry with it, not only first-tag shards."""
+    manifest, shards = build_manifest(entries(), "tag")
+    assert manifest['shards'] == ["tag-build", "tag-ci", "tag-release", "untagged"]
+    assert manifest['names']['deploy'] == "tag-release"
+    assert manifest['tags']['ci'] == ["tag-release", "tag-ci"]
+    assert shards_for_tags(manifest, ["CI"]) == ["tag-ci", "tag-release"]
+    assert shards_for_name(manifest, "missing") == []
+
+def test_write_book_rewrites_only_changed_shards(tmp_path):
+    """A second save writes only the shard whose entries changed and drops emptied shards."""
+    commands_file = str(tmp_path / "project_commands.json")
+    book = entries()
+    assert write_book(book, commands_file, write_text, "tag") == 4
+    assert is_sharded(commands_file)
+
+    book[0]['command'] = "make -j8"
+    assert write_book(book, commands_file, write_text) == 1 # Keeps the 'tag' strategy
+
+    del book[3]
+    write_book(book, commands_file, write_text)
+    assert sorted(os.listdir(book_shards.get_shard_dir(commands_file))) == ["manifest.json", "tag-build.json", "tag-ci.json", "tag-release.json"]
+    assert [entry['id'] for entry in load_entries(commands_file)] == ["1", "2", "3"]
+
+def test_load_entries_keeps_book_order(tmp_path):
+    """Entries come back in the order they were saved, however they were sharded."""
+    commands_file = str(tmp_path / "project_commands.json")
+    book = [
+        {"id": "a", "name": "a", "command": "a", "tags": ["x"]},
+        {"id": "b", "name": "b", "command": "b", "tags": ["w"]},
+        {"id": "c", "name": "c", "command": "c", "tags": ["x"]},
+        {"id": "d", "name": "a", "command": "d", "tags": ["w"]}, # A duplicate name: the first 'a' still wins
+    ]
+    write_book(book, commands_file, write_text, "tag")
+    assert [entry['id'] for entry in load_entries(commands_file)] == ["a", "b", "c", "d"]
+    manifest = load_manifest(commands_file)
+    assert [entry['id'] for entry in load_entries(commands_file, ["tag-x", "tag-w"], manifest)] == ["a", "b", "c", "d"]
+    assert manifest['names']['a'] == "tag-x"
+
+def test_load_entries_reads_only_requested_shards(tmp_path, mocker):
+    """A name lookup opens the manifest and a single shard."""
+    commands_file = str(tmp_path / "project_commands.json")
+    write_book(entries(), commands_file, write_text, "hash", 8)
+    manifest = load_manifest(commands_file)
+    read_shard = mocker.spy(book_shards, 'read_shard')
+
+    found = load_entries(commands_file, shards_for_name(manifest, "lint"), manifest)
+
+    assert "lint" in [entry["name"] for entry in found]
+    assert read_shard.call_count == 1
@@ -0,0 +1,64 @@
+import pytest
+
+import command_bench
+from command_bench import plan_invocation, run_once, summarize, find_outliers, compare, format_seconds, load_results, save_result
+
+def write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def test_plan_invocation_bypasses_the_shell_for_simple_commands():
+    """Plain argument lists are executed directly; shell syntax, builtins and assignments are not."""
+    path, argv, direct = plan_invocation("true --flag 'quoted arg'")
+    assert direct and path.endswith("/true")
+    assert argv == ["true", "--flag", "quoted arg"]
+
+    for command in ("echo hi | cat", "cd src", "FOO=1 make", "ls *.py", "no-such-binary-here"):
+        assert plan_invocation(command) == (command_bench.SHELL, [command_bench.SHELL, "-c", command], False)
+
+def test_plan_invocation_uses_the_path_of_the_run_environment(tmp_path):
+    """With a setup snapshot (e.g. an activated venv) the program comes from its PATH, not ours."""
+    program = tmp_path / "bench-only-tool"
+    program.write_text("#!/bin/sh\n")
+    program.chmod(0o755)
+    path, argv, direct = plan_invocation("bench-only-tool -q", {"PATH": f"{tmp_path}:/usr/bin:/bin"})
+    assert direct and path == str(program)
+    assert plan_invocation("bench-only-tool -q")[2] is False # Not on our own PATH
+
+def test_run_once_reports_exit_code_and_times():
+    """Wall, user and sys times come from the child alone, via os.wait4."""
+    exit_code, wall, user, system = run_once(*plan_invocation("true")[:2])
+    assert exit_code == 0
+    assert wall > 0 and user >= 0 and system >= 0
+    assert run_once(*plan_invocation("exit 3")[:2])[0] == 3
+
+def test_summarize_and_find_outliers():
+    samples = [1.0, 1.1, 0.9, 1.0, 1.05, 0.95, 3.0]
+    stats = summarize(samples)
+    assert stats['min'] == 0.9 and stats['max'] == 3.0 and stats['median'] == 1.0
+    assert find_outliers(samples) == [6]
+    assert summarize([2.0])['stdev'] == 0.0
+    assert find_outliers([1.0, 5.0]) == [] # Too few samples to judge
+
+def test_compare_flags_only_significant_slowdowns():
+    """Noise within the spread is not a regression; a clear slowdown is."""
+    old = {'wall': [1.0, 1.02, 0.98, 1.01, 0.99]}
+    assert compare(old, {'wall': [1.01, 0.99, 1.0, 1.02, 0.98]})[2] is False
+    change, significant, regression = compare(old, {'wall': [1.2, 1.21, 1.19, 1.2, 1.22]})
+    assert change == pytest.approx(0.204)
+    assert significant and regression
+    change, significant, regression = compare(old, {'wall': [0.5, 0.51, 0.49, 0.5, 0.5]})
+    assert significant and not regression
+
+def test_format_seconds():
+    assert format_seconds(0.0000123) == "12.3 µs"
+    assert format_seconds(0.0456) == "45.6 ms"
+    assert format_seconds(2.5) == "2.500 s"
+
+def test_results_are_stored_per_command_and_bounded(tmp_path, mocker):
+    mocker.patch.object(command_bench, 'MAX_STORED_RESULTS', 3)
+    cache_dir = str(tmp_path)
+    for i in range(5):
+        save_result(cache_dir, "id/1", {'wall': [float(i)]}, write_text)
+    assert [result['wall'] for result in load_results(cache_dir, "id/1")] == [[2.0], [3.0], [4.0]]
+    assert load_results(cache_dir, "other") == []
@@ -0,0 +1,65 @@
+import pytest
+import json
+
+from command_template import compile_template, compile_entries, parse_assignments, placeholder_names, render
+
+def test_compile_template_finds_placeholders():
+    """Placeholders become dict parts; the surrounding text stays literal."""
+    parts = compile_template("git push origin {branch:-main} --env {env}")
+    assert parts == [
+        "git push origin ",
+        {"name": "branch", "default": "main", "quoting": "shell"},
+        " --env ",
+        {"name": "env", "default": None, "quoting": "shell"},
+    ]
+    assert placeholder_names(parts) == ["branch", "env"]
+
+def test_compile_template_leaves_shell_syntax_alone():
+    """Single-quoted text, ${...} expansions and brace lists are not placeholders."""
+    assert compile_template("echo plain") is None
+    assert compile_template("awk '{print $1}' file") is None
+    assert compile_template("echo ${HOME} ${name:-x}") is None
+    assert compile_template("cp file.{txt,bak}") is None
+    assert compile_template(r"echo \{env}") is None
+    assert compile_template("git rebase @{u} && git log HEAD@{upstream}..") is None
+
+def test_compile_template_unescapes_doubled_braces():
+    """{{ and }} are literal braces, so a template can still contain {name}."""
+    parts = compile_template("jq .{{name}} {file}")
+    assert parts == ["jq .{name} ", {"name": "file", "default": None, "quoting": "shell"}]
+    assert render(compile_template("echo {{x}}"), {}) == "echo {x}"
+
+def test_render_quotes_values():
+    """Values are shell-quoted, or escaped for double quotes inside "..."."""
+    parts = json.loads(json.dumps(compile_template('deploy {env} --msg "note: {msg}"'))) # Stored form
+    assert render(parts, {"env": "prod; rm -rf /", "msg": 'say "hi" $USER'}) == \
+        'deploy \'prod; rm -rf /\' --msg "note: say \\"hi\\" \\$USER"'
+
+def test_render_defaults_and_errors():
+    """Defaults fill omitted values; missing and unknown parameters are rejected."""
+    parts = compile_template("git checkout {branch:-main} && make {target}")
+    assert render(parts, {"target": "test"}) == "git checkout main && make test"
+    with pytest.raises(ValueError, match="Missing value\\(s\\) for: target"):
+        render(parts, {})
+    with pytest.raises(ValueError, match="Unknown parameter\\(s\\): env"):
+        render(parts, {"target": "x", "env": "prod"})
+
+def test_parse_assignments():
+    """key=value arguments; values may contain '=' and be empty."""
+    assert parse_assignments(["env=prod", "flags=a=b", "empty="]) == {"env": "prod", "flags": "a=b", "empty": ""}
+    with pytest.raises(ValueError):
+        parse_assignments(["prod"])
+    with pytest.raises(ValueError):
+        parse_assignments(["bad-key=1"])
+
+def test_compile_entries_adds_and_drops_templates():
+    """Only entries that take parameters and have placeholders keep a compiled template."""
+    entries = [
+        {"command": "deploy {env}", "params": True},
+        {"command": "ls", "params": True, "template": ["stale"]},
+        {"command": "awk \"{print}\" file", "template": ["stale"]}, # Not opted in: runs verbatim
+    ]
+    compile_entries(entries)
+    assert entries[0]['template'][1]['name'] == "env"
+    assert 'template' not in entries[1]
+    assert 'template' not in entries[2]
@@ -0,0 +1,77 @@
+import pytest
+import json
+import os
+from unittest.mock import Mock
+
+import env_snapshot
+from env_snapshot import find_dependencies, parse_env0, capture, is_fresh, apply, get_environment
+
+def write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def test_parse_env0_keeps_newlines_and_equals_in_values():
+    """Values may contain anything but NUL."""
+    assert parse_env0(b"A=1\0MULTI=x\ny\0EQ=a=b\0") == {"A": "1", "MULTI": "x\ny", "EQ": "a=b"}
+
+def test_find_dependencies(tmp_path):
+    """Named files that exist and the files known tools read are dependencies."""
+    (tmp_path / ".venv" / "bin").mkdir(parents=True)
+    (tmp_path / ".venv" / "bin" / "activate").write_text("")
+    cwd = str(tmp_path)
+
+    assert find_dependencies("source .venv/bin/activate", cwd) == [str(tmp_path / ".venv" / "bin" / "activate")]
+    assert str(tmp_path / ".nvmrc") in find_dependencies("nvm use", cwd)
+    assert find_dependencies('eval "$(direnv export bash)"', cwd) == [str(tmp_path / ".envrc")]
+
+def test_capture_diffs_the_environment(tmp_path, mock_subprocess_run):
+    """Only variables the setup set, changed or removed end up in the snapshot."""
+    mock_subprocess_run.return_value = Mock(returncode=0, stdout=b"PATH=/venv/bin:/bin\0HOME=/root\0VIRTUAL_ENV=/venv\0PWD=/x\0")
+    base_env = {"PATH": "/bin", "HOME": "/root", "PS1": "$ "}
+
+    snapshot = capture("source activate", str(tmp_path), base_env)
+
+    assert snapshot['set'] == {"PATH": "/venv/bin:/bin", "VIRTUAL_ENV": "/venv"}
+    assert snapshot['unset'] == ["PS1"]
+    assert snapshot['base'] == {"PATH": "/bin", "VIRTUAL_ENV": None, "PS1": "$ "}
+    assert apply(snapshot, base_env) == {"PATH": "/venv/bin:/bin", "HOME": "/root", "VIRTUAL_ENV": "/venv"}
+    script = mock_subprocess_run.call_args[0][0]
+    assert script.startswith("{ source activate\n} >&2") and script.endswith("&& env -0")
+
+def test_capture_fails_when_setup_fails(tmp_path, mock_subprocess_run):
+    mock_subprocess_run.return_value = Mock(returncode=1, stdout=b"")
+    assert capture("false", str(tmp_path), {}) is None
+
+def test_snapshot_goes_stale(tmp_path):
+    """A dependency's mtime or a changed base value invalidates a snapshot."""
+    activate = tmp_path / "activate"
+    activate.write_text("")
+    snapshot = {
+        "dependencies": {str(activate): os.stat(activate).st_mtime_ns},
+        "base": {"PATH": "/bin"}, "set": {"PATH": "/venv/bin:/bin"}, "unset": [],
+    }
+    assert is_fresh(snapshot, {"PATH": "/bin"})
+    assert not is_fresh(snapshot, {"PATH": "/usr/bin:/bin"})
+    os.utime(activate, ns=(0, 0))
+    assert not is_fresh(snapshot, {"PATH": "/bin"})
+
+def test_get_environment_reuses_the_cached_snapshot(tmp_path, mock_subprocess_run):
+    """The setup runs once; later calls are served from the cache until refreshed."""
+    mock_subprocess_run.return_value = Mock(returncode=0, stdout=b"PATH=/venv/bin:/bin\0")
+    cache_dir = tmp_path / ".history_book"
+    cache_dir.mkdir() # os.path.exists is mocked, so makedirs would not create missing parents
+    cache_dir = str(cache_dir)
+    base_env = {"PATH": "/bin"}
+
+    env, cached = get_environment("source activate", cache_dir, str(tmp_path), write_text, base_env=base_env)
+    assert (env, cached) == ({"PATH": "/venv/bin:/bin"}, False)
+    assert (tmp_path / ".history_book" / "env" / ".gitignore").read_text().endswith("*\n") # May hold secrets
+    env, cached = get_environment("source activate", cache_dir, str(tmp_path), write_text, base_env=base_env)
+    assert (env, cached) == ({"PATH": "/venv/bin:/bin"}, True)
+    assert mock_subprocess_run.call_count == 1
+
+    get_environment("source activate", cache_dir, str(tmp_path), write_text, refresh=True, base_env=base_env)
+    assert mock_subprocess_run.call_count == 2
+
+    mock_subprocess_run.return_value = Mock(returncode=1, stdout=b"")
+    assert get_environment("broken", cache_dir, str(tmp_path), write_text, base_env=base_env) == (None, False)
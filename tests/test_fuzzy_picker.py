@@ -0,0 +1,47 @@
+import pytest
+
+import fuzzy_picker
+from fuzzy_picker import fuzzy_score, FuzzyFilter, should_use_picker
+
+def test_fuzzy_score_subsequence():
+    """Only in-order subsequences match; word starts and substrings rank higher."""
+    assert fuzzy_score("dkr", "docker build .") is not None
+    assert fuzzy_score("xyz", "docker build .") is None
+    assert fuzzy_score("", "anything") == 0
+    assert fuzzy_score("build", "docker build .") > fuzzy_score("build", "b-u-i-l-d")
+    assert fuzzy_score("mt", "make test") > fuzzy_score("mt", "commit")
+
+def test_fuzzy_filter_ranks_best_first():
+    """The best match comes first; ties favour the shorter item."""
+    items = ["git commit -m wip", "make test", "make test-all", "docker build ."]
+    ranked = FuzzyFilter(items).update("mt")
+    assert ranked[:2] == [1, 2]
+    assert 3 not in ranked
+
+def test_fuzzy_filter_narrows_incrementally(mocker):
+    """Growing the query only re-scores previous matches; backspace is cached."""
+    items = ["make test", "make build", "docker build .", "ls"]
+    fuzzy_filter = FuzzyFilter(items)
+    spy = mocker.spy(fuzzy_picker, 'fuzzy_score')
+
+    fuzzy_filter.update("b")
+    assert spy.call_count == 4
+    fuzzy_filter.update("bu")
+    assert spy.call_count == 4 + 2 # Only 'make build' and 'docker build .' matched 'b'
+    fuzzy_filter.update("b")
+    assert spy.call_count == 6 # Cached result for the shorter prefix
+
+def test_should_use_picker_respects_threshold_and_override(mocker, monkeypatch):
+    """Whiptail stays the default for short lists and when forced."""
+    mocker.patch('fuzzy_picker.is_available', return_value=True)
+    monkeypatch.delenv(fuzzy_picker.PICKER_ENV_VAR, raising=False)
+    assert not should_use_picker(fuzzy_picker.PICKER_THRESHOLD - 1)
+    assert should_use_picker(fuzzy_picker.PICKER_THRESHOLD)
+
+    monkeypatch.setenv(fuzzy_picker.PICKER_ENV_VAR, "whiptail")
+    assert not should_use_picker(10000)
+    monkeypatch.setenv(fuzzy_picker.PICKER_ENV_VAR, "fuzzy")
+    assert should_use_picker(1)
+
+    mocker.patch('fuzzy_picker.is_available', return_value=False)
+    assert not should_use_picker(10000)
@@ -1,8 +1,11 @@
 import pytest
 import json
+import os
 import re
 from unittest.mock import Mock, call, ANY
 
+import history_book
+
 # Import the functions directly from your history_book.py
 # This assumes history_book.py is in the parent directory of the tests folder
 from history_book import (
@@ -11,8 +14,20 @@ from history_book import (
     update_last_run, 
     list_commands, 
     run_command, 
+    find_project_books,
     add_commands, 
+    quick_save_command,
     edit_commands,
+    batch_edit_commands,
+    import_commands,
+    merge_command,
+    shard_command,
+    bench_command,
+    export_commands,
+    find_command_entry,
+    suggest_commands,
+    get_cache_dir,
+    atomic_write_text,
     COMMANDS_FILE # Import COMMANDS_FILE to check its value if needed
 )
 
@@ -97,6 +112,36 @@ def test_update_last_run_command_not_found(temp_commands_file, capsys):
     # Ensure file content remains unchanged
     assert json.loads(temp_commands_file.read_text()) == initial_data
 
+def test_save_commands_data_writes_completion_cache(temp_commands_file):
+    """Saving the book atomically rewrites the file and the completion cache."""
+    test_data = [
+        {"id": "1", "name": "build", "command": "make", "description": "", "tags": ["ci", "make"], "last_run": None, "quiet": False},
+        {"id": "2", "name": "", "command": "ls", "description": "", "tags": ["ci"], "last_run": None, "quiet": False}
+    ]
+    save_commands_data(test_data)
+
+    assert json.loads(temp_commands_file.read_text()) == test_data
+    cache_dir = temp_commands_file.parent / ".history_book"
+    assert get_cache_dir() == str(cache_dir)
+    assert (cache_dir / "names").read_text() == "build\n"
+    assert (cache_dir / "tags").read_text() == "ci\nmake\n"
+    # No temporary files are left behind next to the book
+    assert sorted(p.name for p in temp_commands_file.parent.iterdir()) == [".history_book", temp_commands_file.name]
+
+def test_atomic_write_text_keeps_file_mode(tmp_path):
+    """Rewrites keep the target's permissions; new files get 0666 minus the umask."""
+    existing = tmp_path / "project_commands.json"
+    existing.write_text("[]")
+    os.chmod(existing, 0o664)
+    atomic_write_text(str(existing), "[1]")
+    assert existing.read_text() == "[1]"
+    assert existing.stat().st_mode & 0o777 == 0o664
+
+    atomic_write_text(str(tmp_path / "new.json"), "[]")
+    atomic_write_text(str(tmp_path / "secret.json"), "{}", mode=0o600)
+    assert (tmp_path / "new.json").stat().st_mode & 0o777 == 0o666 & ~history_book.UMASK
+    assert (tmp_path / "secret.json").stat().st_mode & 0o777 == 0o600
+
 # --- Tests for Command Functions ---
 
 def test_list_commands_no_commands(temp_commands_file, capsys):
@@ -179,6 +224,15 @@ def test_list_commands_with_tags_filter(temp_commands_file, capsys):
     assert "cmd3" in captured.out # Has 'docker' tag
     assert "cmd2" not in captured.out # Does not have 'test' or 'docker'
 
+def test_list_commands_shows_setup(temp_commands_file, capsys):
+    """An entry's setup step is listed above its command."""
+    temp_commands_file.write_text(json.dumps([
+        {"id": "1", "name": "test", "command": "pytest", "description": "", "tags": [], "last_run": None, "quiet": False,
+         "setup": "source .venv/bin/activate"}
+    ]))
+    list_commands(Mock(tags=None))
+    assert "setup: source .venv/bin/activate" in capsys.readouterr().out
+
 ## Fails
 # def test_run_command_success(temp_commands_file, mock_subprocess_run, mocker, capsys):
 #     """Test 'run' command for successful execution."""
@@ -212,14 +266,129 @@ def test_run_command_quiet_mode(temp_commands_file, mock_subprocess_run, capsys)
     
     mock_subprocess_run.return_value = Mock(returncode=0)
     
-    mock_args = Mock(name="mycmd", quiet=True) # Global quiet flag
+    mock_args = Mock(quiet=True, params=[], dirs=None, all_projects=False) # Global quiet flag
+    mock_args.name = "mycmd" # Mock(name=...) would name the mock, not set the attribute
     run_command(mock_args)
     
+    mock_subprocess_run.assert_called_once_with("echo 'test'", shell=True, check=True)
     captured = capsys.readouterr()
     assert "Running 'mycmd':" not in captured.out
     assert "✅ Command 'mycmd' completed successfully." not in captured.out
     assert "Execution complete." not in captured.out # Global quiet suppresses this too
 
+def test_run_command_reports_unusable_token_pool(temp_commands_file, mock_subprocess_run, mocker, capsys):
+    """A token pool that cannot be opened is an error message, not a traceback."""
+    temp_commands_file.write_text(json.dumps([
+        {"id": "abc", "name": "build", "command": "make", "description": "", "tags": [], "last_run": None, "quiet": False, "resource": "heavy:2"}
+    ]))
+    mocker.patch('token_pool._open_pool', side_effect=PermissionError(13, "Permission denied"))
+
+    mock_args = Mock(quiet=True, params=[], dirs=None, all_projects=False)
+    mock_args.name = "build"
+    run_command(mock_args)
+
+    mock_subprocess_run.assert_not_called()
+    assert "Error: Could not run 'build': [Errno 13] Cannot use the token pool" in capsys.readouterr().out
+
+def test_run_command_resolves_unique_prefix(temp_commands_file, mock_subprocess_run, capsys):
+    """'run' accepts a unique abbreviation of a saved name."""
+    initial_data = [
+        {"id": "abc", "name": "deploy-prod", "command": "echo prod", "description": "", "tags": [], "last_run": None, "quiet": True},
+        {"id": "def", "name": "build", "command": "echo build", "description": "", "tags": [], "last_run": None, "quiet": True}
+    ]
+    temp_commands_file.write_text(json.dumps(initial_data))
+
+    mock_args = Mock(quiet=True, params=[], dirs=None, all_projects=False)
+    mock_args.name = "dep"
+    run_command(mock_args)
+
+    mock_subprocess_run.assert_called_once_with("echo prod", shell=True, check=True)
+    assert "Resolved 'dep' to 'deploy-prod'." in capsys.readouterr().out
+
+def test_run_command_runs_exact_name_from_index(temp_commands_file, mock_subprocess_run, monkeypatch, capsys):
+    """A name the index has as typed runs like a direct hit when the first lookup misses it."""
+    entry = {"id": "abc", "name": "build", "command": "echo build", "description": "", "tags": [], "last_run": None, "quiet": True}
+    temp_commands_file.write_text(json.dumps([entry]))
+    lookups = iter([None, entry])
+    monkeypatch.setattr(history_book, 'find_command_entry', lambda name, commands_file=None: next(lookups))
+
+    mock_args = Mock(quiet=True, params=[], dirs=None, all_projects=False)
+    mock_args.name = "build"
+    run_command(mock_args)
+
+    mock_subprocess_run.assert_called_once_with("echo build", shell=True, check=True)
+    output = capsys.readouterr().out
+    assert "Resolved" not in output and "Error" not in output
+
+def test_run_command_suggests_close_names(temp_commands_file, mock_subprocess_run, capsys):
+    """A misspelled name is not run, but close names are suggested."""
+    initial_data = [
+        {"id": "abc", "name": "build", "command": "echo build", "description": "", "tags": [], "last_run": None, "quiet": False}
+    ]
+    temp_commands_file.write_text(json.dumps(initial_data))
+
+    mock_args = Mock(quiet=False, params=[], dirs=None, all_projects=False)
+    mock_args.name = "biuld"
+    run_command(mock_args)
+
+    mock_subprocess_run.assert_not_called()
+    assert "Did you mean: build?" in capsys.readouterr().out
+
+def test_run_command_fills_template(temp_commands_file, mock_subprocess_run, capsys):
+    """Placeholders are compiled on save and filled from key=value arguments."""
+    save_commands_data([
+        {"id": "abc", "name": "deploy", "command": "deploy {env} --branch {branch:-main}", "description": "", "tags": [], "last_run": None, "quiet": True, "params": True},
+        {"id": "def", "name": "rebase", "command": "git rebase @{u} && jq .{name}", "description": "", "tags": [], "last_run": None, "quiet": True}
+    ])
+    assert json.loads(temp_commands_file.read_text())[0]['template'][1]['name'] == "env"
+
+    mock_args = Mock(quiet=True, params=["env=prod east"], dirs=None, all_projects=False)
+    mock_args.name = "deploy"
+    run_command(mock_args)
+    mock_subprocess_run.assert_called_once_with("deploy 'prod east' --branch main", shell=True, check=True)
+
+    mock_subprocess_run.reset_mock()
+    mock_args.params = []
+    run_command(mock_args)
+    mock_subprocess_run.assert_not_called()
+    assert "Missing value(s) for: env" in capsys.readouterr().out
+
+    mock_args.name = "rebase" # Braces in commands that do not take parameters run as written
+    run_command(mock_args)
+    mock_subprocess_run.assert_called_once_with("git rebase @{u} && jq .{name}", shell=True, check=True)
+
+def test_run_command_in_many_projects(temp_commands_file, tmp_path, mock_sys_exit, capsys):
+    """'run --in' resolves the name in each directory's book and runs there in parallel."""
+    book_name = temp_commands_file.name
+    for project in ("api", "web"):
+        (tmp_path / project).mkdir()
+        (tmp_path / project / book_name).write_text(json.dumps([
+            {"id": project, "name": "lint", "command": "echo linted; pwd", "description": "", "tags": [], "last_run": None, "quiet": True}
+        ]))
+    (tmp_path / "docs").mkdir()
+
+    mock_args = Mock(quiet=True, params=[], dirs=[str(tmp_path / p) for p in ("api", "web", "docs")], all_projects=False, jobs=2)
+    mock_args.name = "lint"
+    run_command(mock_args)
+
+    output = capsys.readouterr().out
+    for project in ("api", "web"):
+        assert re.search(rf"\[.*{project}\].* linted", output)
+        assert f"{tmp_path / project}\n" in output # Ran inside the project directory
+        assert json.loads((tmp_path / project / book_name).read_text())[0]['last_run'] is not None
+    assert re.search(r"❌ .*docs.*no book", output)
+    assert "1 of 3 project(s) did not succeed." in output
+    mock_sys_exit.assert_called_once_with(1)
+
+def test_find_project_books_skips_hidden_and_dependency_dirs(temp_commands_file, tmp_path):
+    """--all-projects discovery ignores .git-style and node_modules directories."""
+    book_name = temp_commands_file.name
+    for project in ("a", "b/c", ".hidden", "node_modules/pkg"):
+        (tmp_path / project).mkdir(parents=True)
+        (tmp_path / project / book_name).write_text("[]")
+    books = find_project_books(str(tmp_path))
+    assert books == [str(tmp_path / "a" / book_name), str(tmp_path / "b" / "c" / book_name)]
+
 ## Fails
 # def test_run_command_quiet_from_json(temp_commands_file, mock_subprocess_run, capsys):
 #     """Test 'run' command when 'quiet' is set in JSON."""
@@ -320,6 +489,277 @@ def test_run_command_quiet_mode(temp_commands_file, mock_subprocess_run, capsys)
 #     assert "No new commands selected to add." in captured.out
 #     assert json.loads(temp_commands_file.read_text()) == initial_data
 
+def test_import_commands_from_csv(temp_commands_file, tmp_path, mock_sys_exit, capsys):
+    """'import' adds new, valid records in a single save and skips duplicates."""
+    temp_commands_file.write_text(json.dumps([
+        {"id": "1", "name": "build", "command": "make", "description": "", "tags": [], "last_run": None, "quiet": False}
+    ]))
+    seed_file = tmp_path / "seed.csv"
+    seed_file.write_text("name,command,tags\nbuild,make,\nlint,make lint,\"ci,style\"\n")
+
+    import_commands(Mock(files=[str(seed_file)], format=None, skip_invalid=False))
+
+    mock_sys_exit.assert_not_called()
+    saved = json.loads(temp_commands_file.read_text())
+    assert [cmd['name'] for cmd in saved] == ["build", "lint"]
+    assert saved[1]['tags'] == ["ci", "style"]
+    assert "Imported 1 new command(s), skipped 1 duplicate(s)." in capsys.readouterr().out
+
+def test_import_commands_rejects_invalid_records(temp_commands_file, tmp_path, mock_sys_exit):
+    """Nothing is written when a record is invalid, unless --skip-invalid is given."""
+    temp_commands_file.write_text("[]")
+    seed_file = tmp_path / "seed.ndjson"
+    seed_file.write_text('{"command": "ls"}\n{"name": "missing-command"}\n')
+
+    import_commands(Mock(files=[str(seed_file)], format=None, skip_invalid=False))
+    mock_sys_exit.assert_called_once_with(1)
+    assert json.loads(temp_commands_file.read_text()) == []
+
+    import_commands(Mock(files=[str(seed_file)], format=None, skip_invalid=True))
+    assert [cmd['command'] for cmd in json.loads(temp_commands_file.read_text())] == ["ls"]
+
+def test_save_and_load_track_revisions(temp_commands_file, mock_os_path_exists):
+    """Entries without ids get stable ones on load; saving stamps revisions and content hashes."""
+    mock_os_path_exists.return_value = True
+    temp_commands_file.write_text(json.dumps([{"name": "t", "command": "make"}]))
+    first = load_commands_data()
+    assert first[0]['id'] == load_commands_data()[0]['id']
+
+    save_commands_data(first)
+    saved = json.loads(temp_commands_file.read_text())
+    assert saved[0]['rev'] == 1 and saved[0]['hash']
+
+    saved[0]['tags'] = ["build"]
+    save_commands_data(saved)
+    assert json.loads(temp_commands_file.read_text())[0]['rev'] == 2
+
+def test_merge_command_writes_result_over_ours(tmp_path, mock_sys_exit, capsys):
+    """'merge' behaves like a git merge driver: result in OURS, exit 1 on conflicts."""
+    base, ours, theirs = (tmp_path / name for name in ("base.json", "ours.json", "theirs.json"))
+    base.write_text("") # git passes an empty file when there is no common ancestor
+    ours.write_text(json.dumps([{"id": "a", "name": "a", "command": "make", "tags": ["x"]}]))
+    theirs.write_text(json.dumps([{"id": "a", "name": "a", "command": "make", "tags": ["y"]},
+                                  {"id": "b", "name": "b", "command": "lint", "tags": []}]))
+
+    merge_command(Mock(base=str(base), ours=str(ours), theirs=str(theirs), output=None))
+
+    mock_sys_exit.assert_not_called()
+    merged = json.loads(ours.read_text())
+    assert [item['id'] for item in merged] == ["a", "b"]
+    assert merged[0]['tags'] == ["x", "y"]
+    # Derived files beside the merged book follow the merge
+    assert json.loads((tmp_path / ".history_book" / "name_index.json").read_text())['names'] == ["a", "b"]
+
+    theirs.write_text(json.dumps([{"id": "a", "name": "a", "command": "make -j8", "tags": []}]))
+    merge_command(Mock(base=str(base), ours=str(ours), theirs=str(theirs), output=str(tmp_path / "out.json")))
+    mock_sys_exit.assert_called_once_with(1)
+    assert "'command' changed on both sides" in capsys.readouterr().out
+
+def test_merge_command_stops_on_unreadable_version(tmp_path, mock_sys_exit, capsys):
+    """A version that cannot be read leaves OURS untouched."""
+    ours, theirs = tmp_path / "ours.json", tmp_path / "theirs.json"
+    ours.write_text("[]")
+    theirs.write_text("{not json")
+
+    merge_command(Mock(base=str(ours), ours=str(ours), theirs=str(theirs), output=None))
+
+    mock_sys_exit.assert_called_once_with(1)
+    assert "Error reading a version of the book" in capsys.readouterr().out
+    assert ours.read_text() == "[]"
+
+def test_shard_command_rejects_zero_count(temp_commands_file, mock_sys_exit, capsys):
+    """An invalid --count stops before anything is written."""
+    import book_shards
+    temp_commands_file.write_text("[]")
+
+    shard_command(Mock(join=False, by="hash", count=0))
+
+    mock_sys_exit.assert_called_once_with(1)
+    assert "--count must be at least 1" in capsys.readouterr().out
+    assert not book_shards.is_sharded(str(temp_commands_file))
+    assert temp_commands_file.read_text() == "[]"
+
+def test_shard_command_converts_and_keeps_lookups_local(temp_commands_file, mock_sys_exit, mocker, capsys):
+    """A sharded book answers lookups and run bookkeeping from a single shard and can be joined back."""
+    import book_shards
+    commands = [
+        {"id": "1", "name": "build", "command": "make", "description": "", "tags": ["build"], "last_run": None, "quiet": False},
+        {"id": "2", "name": "deploy", "command": "make deploy", "description": "", "tags": ["release"], "last_run": None, "quiet": False},
+    ]
+    temp_commands_file.write_text(json.dumps(commands))
+
+    shard_command(Mock(join=False, by="tag", count=16))
+    assert not temp_commands_file.exists()
+    assert book_shards.is_sharded(str(temp_commands_file))
+
+    read_shard = mocker.spy(book_shards, 'read_shard')
+    assert find_command_entry("deploy")['command'] == "make deploy"
+    update_last_run("2", name="deploy")
+    assert [call.args[1] for call in read_shard.call_args_list] == ["tag-release", "tag-release"]
+
+    list_commands(Mock(tags="build"))
+    assert read_shard.call_args_list[-1].args[1] == "tag-build"
+    assert "make deploy" not in capsys.readouterr().out
+
+    shard_command(Mock(join=True))
+    joined = json.loads(temp_commands_file.read_text())
+    assert [cmd['name'] for cmd in joined] == ["build", "deploy"]
+    assert joined[1]['last_run'] is not None
+    assert not os.path.isdir(book_shards.get_shard_dir(str(temp_commands_file)))
+    mock_sys_exit.assert_not_called()
+
+def test_run_command_uses_setup_snapshot(temp_commands_file, mock_subprocess_run, mocker):
+    """A command's setup is replaced by its environment snapshot, or run in front of it when none can be taken."""
+    temp_commands_file.write_text(json.dumps([
+        {"id": "1", "name": "test", "command": "pytest", "setup": "source .venv/bin/activate", "description": "", "tags": [], "last_run": None, "quiet": True}
+    ]))
+    get_environment = mocker.patch('env_snapshot.get_environment', return_value=({"PATH": "/venv/bin"}, True))
+    args = Mock(params=[], dirs=None, all_projects=False, quiet=True, refresh_env=False)
+    args.name = "test"
+
+    run_command(args)
+    mock_subprocess_run.assert_called_once_with("pytest", shell=True, check=True, env={"PATH": "/venv/bin"})
+    assert get_environment.call_args[0][0] == "source .venv/bin/activate"
+
+    get_environment.return_value = (None, False)
+    mock_subprocess_run.reset_mock()
+    run_command(args)
+    mock_subprocess_run.assert_called_once_with("source .venv/bin/activate && pytest", shell=True, check=True)
+
+def test_run_command_reports_interrupted_setup(temp_commands_file, mock_subprocess_run, mocker, capsys):
+    """Failing or interrupting the setup snapshot is reported like a failing command."""
+    temp_commands_file.write_text(json.dumps([
+        {"id": "1", "name": "test", "command": "pytest", "setup": "source .venv/bin/activate", "description": "", "tags": [], "last_run": None, "quiet": True}
+    ]))
+    mocker.patch('env_snapshot.get_environment', side_effect=[KeyboardInterrupt, OSError(2, "No such file or directory")])
+    args = Mock(params=[], dirs=None, all_projects=False, quiet=True, refresh_env=False)
+    args.name = "test"
+
+    run_command(args)
+    run_command(args)
+
+    mock_subprocess_run.assert_not_called()
+    output = capsys.readouterr().out
+    assert "Operation cancelled by user." in output
+    assert "Error: Could not run 'test': [Errno 2] No such file or directory" in output
+
+def bench_args(name, **overrides):
+    args = dict(params=[], runs=3, warmup=1, prepare=None, compare=False, no_save=False, show_output=False)
+    args.update(overrides)
+    args = Mock(**args)
+    args.name = name
+    return args
+
+def test_bench_command_stores_and_compares_results(temp_commands_file, mock_sys_exit, capsys):
+    """'bench' times the runs, stores them per command id and compares with the previous result."""
+    temp_commands_file.write_text(json.dumps([
+        {"id": "abc", "name": "noop", "command": "true", "description": "", "tags": [], "last_run": None, "quiet": False}
+    ]))
+    (temp_commands_file.parent / ".history_book").mkdir()
+
+    bench_command(bench_args("noop"))
+    output = capsys.readouterr().out
+    assert "Executed directly, 1 warmup and 3 timed run(s)" in output
+    assert "Time (mean ± σ):" in output
+    stored = json.loads((temp_commands_file.parent / ".history_book" / "bench" / "abc.json").read_text())
+    assert len(stored) == 1 and len(stored[0]['wall']) == 3
+
+    bench_command(bench_args("noop", compare=True, no_save=True))
+    assert f"Compared with {stored[0]['timestamp']}" in capsys.readouterr().out
+    assert len(json.loads((temp_commands_file.parent / ".history_book" / "bench" / "abc.json").read_text())) == 1
+
+def test_bench_command_stops_on_failure(temp_commands_file, mock_sys_exit, capsys):
+    """Invalid options and failing runs exit 1 without reporting or storing a result."""
+    temp_commands_file.write_text(json.dumps([
+        {"id": "abc", "name": "fail", "command": "false", "description": "", "tags": [], "last_run": None, "quiet": False}
+    ]))
+
+    bench_command(bench_args("fail", runs=0))
+    bench_command(bench_args("fail"))
+
+    assert mock_sys_exit.call_args_list == [call(1), call(1)]
+    output = capsys.readouterr().out
+    assert "--runs must be at least 1" in output
+    assert "Run 1 of 'fail' failed with exit code 1" in output
+    assert "Time (mean ± σ):" not in output
+    assert not (temp_commands_file.parent / ".history_book" / "bench").exists()
+
+def test_add_commands_in_process(temp_commands_file, mock_subprocess_run, mocker, capsys):
+    """'add' calls the scraper as a library instead of a subprocess."""
+    temp_commands_file.write_text("[]")
+    new_entry = {"id": "new1", "name": "new_cmd1", "command": "new_echo", "description": "", "tags": [], "last_run": None, "quiet": False}
+    mocker.patch('scrape_history.collect_new_entries', return_value=[new_entry])
+
+    add_commands(Mock(follow=False))
+
+    mock_subprocess_run.assert_not_called()
+    assert json.loads(temp_commands_file.read_text()) == [new_entry]
+    assert "✅ Added 1 new command(s)." in capsys.readouterr().out
+
+def test_suggest_commands_saves_selected_sequence(temp_commands_file, tmp_path, mock_whiptail, mocker, capsys):
+    """'suggest' prints frequent sequences and saves the selected one as a multi-step command."""
+    temp_commands_file.write_text("[]")
+    history_file = tmp_path / "history"
+    history_file.write_text("git pull\nmake test\nvim a\n" * 4)
+    mocker.patch('history_book.Whiptail', return_value=mock_whiptail)
+    mock_whiptail.checklist.return_value = (["0"], 0)
+    mock_whiptail.inputbox.side_effect = [("sync", 0), ("", 0), ("", 0)]
+
+    suggest_commands(Mock(history=str(history_file), shell="bash", max_length=2, min_count=3, top=1, print_only=False))
+
+    output = capsys.readouterr().out
+    assert "git pull" in output and "make test" in output
+    saved = json.loads(temp_commands_file.read_text())
+    assert [(cmd['name'], cmd['command']) for cmd in saved] == [("sync", "git pull && make test")]
+
+def batch_args(**overrides):
+    """Arguments of 'edit --batch' with every option unset."""
+    args = dict(batch=True, where_tags=None, where_name=None, add_tags=None, remove_tags=None,
+                rename_tag=None, replace=None, set_quiet=None, set_setup=None, set_params=None, dry_run=False, yes=True)
+    args.update(overrides)
+    return Mock(**args)
+
+def test_batch_edit_commands_saves_changes_once(temp_commands_file, mocker, capsys):
+    """Flag-driven batch edits are previewed and written in a single save."""
+    initial_data = [
+        {"id": "1", "name": "install", "command": "npm install", "description": "", "tags": ["npm"], "last_run": None, "quiet": False},
+        {"id": "2", "name": "build", "command": "make", "description": "", "tags": ["make"], "last_run": None, "quiet": False},
+    ]
+    temp_commands_file.write_text(json.dumps(initial_data))
+    save = mocker.patch('history_book.save_commands_data')
+
+    batch_edit_commands(batch_args(where_tags="npm", rename_tag=[["npm", "pnpm"]], replace=[["npm ", "pnpm "]]))
+
+    save.assert_called_once()
+    saved = save.call_args[0][0]
+    assert saved[0]['command'] == "pnpm install"
+    assert saved[0]['tags'] == ["pnpm"]
+    assert saved[1] == initial_data[1]
+    assert "command: npm install → pnpm install" in capsys.readouterr().out
+
+def test_batch_edit_commands_skips_save_without_changes(temp_commands_file, mocker, capsys):
+    """Nothing is written when no selected entry would change, or on a dry run."""
+    temp_commands_file.write_text(json.dumps([
+        {"id": "1", "name": "install", "command": "npm install", "description": "", "tags": ["npm"], "last_run": None, "quiet": True}
+    ]))
+    save = mocker.patch('history_book.save_commands_data')
+
+    batch_edit_commands(batch_args(where_tags="npm", set_quiet="on"))
+    assert "none would change" in capsys.readouterr().out
+    batch_edit_commands(batch_args(where_tags="npm", set_quiet="off", dry_run=True))
+    assert "Dry run: nothing was saved." in capsys.readouterr().out
+    save.assert_not_called()
+
+def test_quick_save_command_derives_unique_name(temp_commands_file):
+    """'add --follow' saves a captured command under a name derived from it."""
+    temp_commands_file.write_text(json.dumps([
+        {"id": "1", "name": "make-test", "command": "make test", "description": "", "tags": [], "last_run": None, "quiet": False}
+    ]))
+    assert quick_save_command("make test -j8") == "make-test-2"
+    saved = json.loads(temp_commands_file.read_text())
+    assert saved[1]['command'] == "make test -j8"
+    assert saved[1]['id'] # A fresh id
+
 ## Fails * Tries to open whiptail
 # def test_edit_commands_success(temp_commands_file, mock_whiptail, capsys):
 #     """Test editing a command's properties."""
@@ -363,3 +803,30 @@ def test_run_command_quiet_mode(temp_commands_file, mock_subprocess_run, capsys)
 #     mock_whiptail.msgbox.assert_called_once_with(f"No commands found in {COMMANDS_FILE} to edit.")
 #     captured = capsys.readouterr()
 #     assert "No commands found" in captured.out # Check direct print from msgbox as well
+
+@pytest.mark.parametrize("argv", [["--profile", "version"], ["version", "--profile"]])
+def test_profile_flag_before_or_after_subcommand(argv, monkeypatch):
+    """The profiling flags are accepted on either side of the subcommand."""
+    enabled = []
+    monkeypatch.setattr(history_book.tracing, 'enable', lambda **kwargs: enabled.append(kwargs))
+    monkeypatch.setattr(history_book.sys, 'argv', ["history_book"] + argv)
+    history_book.main()
+    assert enabled == [{'memory': False, 'trace_file': None}]
+
+def test_export_summary_matches_exported_file(temp_commands_file, capsys):
+    """The shell export summary lists exactly the functions written to the file."""
+    save_commands_data([
+        {"id": "1", "name": "build", "command": "make", "description": "", "tags": [], "last_run": None, "quiet": False},
+        {"id": "2", "name": "deploy", "command": "./deploy.sh {env}", "description": "", "tags": [], "last_run": None, "quiet": False, "params": True},
+        {"id": "3", "name": "test", "command": "pytest", "description": "", "tags": [], "last_run": None, "quiet": False}
+    ])
+    capsys.readouterr()
+
+    export_commands(Mock(format=None, output=None, shell="bash"))
+
+    output = capsys.readouterr().out
+    export_text = (temp_commands_file.parent / ".history_book" / "functions.bash").read_text()
+    assert re.findall(r"^(hb_\w+)\(\) \{", export_text, re.MULTILINE) == ["hb_build", "hb_test"]
+    assert "Exported 2 command(s)" in output
+    assert re.findall(r"(hb_\w+)\x1b\[0m", output) == ["hb_build", "hb_test"]
+    assert "Skipped 1 command(s) that take key=value parameters (use 'run' for them): deploy" in output
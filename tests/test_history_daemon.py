@@ -0,0 +1,160 @@
+import pytest
+import json
+import os
+import socket
+import threading
+import time
+
+import history_daemon
+from history_daemon import BookCache, get_socket_path, request, serve
+
+# Note: Fixtures like temp_commands_file and mock_os_path_exists are provided by conftest.py
+
+REAL_PATH_EXISTS = os.path.exists
+
+def _write_book(path, names):
+    path.write_text(json.dumps([
+        {"id": str(i), "name": name, "command": f"echo {name}", "description": "", "tags": ["t"], "last_run": None, "quiet": False}
+        for i, name in enumerate(names)
+    ]))
+
+def test_get_socket_path_is_stable_per_book(tmp_path, monkeypatch):
+    """The socket path depends only on the book's absolute path."""
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    first = get_socket_path("a/project_commands.json")
+    assert first == get_socket_path("a/project_commands.json")
+    assert first != get_socket_path("b/project_commands.json")
+    assert first.startswith(str(tmp_path))
+
+def test_request_without_daemon_returns_none(tmp_path, monkeypatch):
+    """Clients fall back to in-process loading when nothing is listening."""
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    assert request(str(tmp_path / "project_commands.json"), 'ping') is None
+
+def test_book_cache_reloads_on_change(tmp_path):
+    """The cache serves lookups from memory and reloads when the file changes."""
+    book_file = tmp_path / "project_commands.json"
+    _write_book(book_file, ["build"])
+    load_calls = []
+
+    def loader():
+        load_calls.append(1)
+        return json.loads(book_file.read_text())
+
+    cache = BookCache(str(book_file), loader, lambda data: None)
+    assert cache.handle({'op': 'lookup', 'name': 'build'})['entry']['command'] == "echo build"
+    cache.handle({'op': 'names'})
+    assert len(load_calls) == 1
+
+    _write_book(book_file, ["build", "test"])
+    os.utime(book_file, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+    assert cache.handle({'op': 'names'})['names'] == ["build", "test"]
+    assert len(load_calls) == 2
+
+def test_book_cache_reloads_on_run_log_change(tmp_path):
+    """Runs logged by exported shell functions invalidate the cached book."""
+    book_file = tmp_path / "project_commands.json"
+    run_log = tmp_path / "runs.log"
+    _write_book(book_file, ["build"])
+    load_calls = []
+
+    def loader():
+        load_calls.append(1)
+        return json.loads(book_file.read_text())
+
+    cache = BookCache(str(book_file), loader, lambda data: None, [str(run_log)])
+    cache.handle({'op': 'names'})
+    cache.handle({'op': 'names'})
+    assert len(load_calls) == 1
+
+    run_log.write_text("0\t2025-01-01T00:00:00Z\n")
+    cache.handle({'op': 'names'})
+    assert len(load_calls) == 2
+
+def test_book_cache_touch_saves(tmp_path):
+    """'touch' updates last_run in memory and writes through the saver."""
+    book_file = tmp_path / "project_commands.json"
+    _write_book(book_file, ["build"])
+    saved = []
+    cache = BookCache(str(book_file), lambda: json.loads(book_file.read_text()), saved.append)
+
+    assert cache.handle({'op': 'touch', 'id': '0', 'last_run': "2025-01-01T00:00:00Z"})['found'] is True
+    assert saved[0][0]['last_run'] == "2025-01-01T00:00:00Z"
+    assert cache.handle({'op': 'touch', 'id': 'missing', 'last_run': "x"})['found'] is False
+
+def test_serve_round_trip(tmp_path, monkeypatch, mock_os_path_exists):
+    """A served book answers lookups over the socket and shuts down on request."""
+    mock_os_path_exists.side_effect = REAL_PATH_EXISTS
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    book_file = tmp_path / "project_commands.json"
+    _write_book(book_file, ["build"])
+    book_path = str(book_file)
+
+    thread = threading.Thread(
+        target=serve,
+        args=(book_path, lambda: json.loads(book_file.read_text()), lambda data: None),
+        daemon=True
+    )
+    thread.start()
+    for _ in range(100):
+        if request(book_path, 'ping') is not None:
+            break
+        time.sleep(0.01)
+
+    assert request(book_path, 'lookup', name='build')['entry']['command'] == "echo build"
+    assert request(book_path, 'lookup', name='nope')['entry'] is None
+    assert request(book_path, 'shutdown') is not None
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert not REAL_PATH_EXISTS(get_socket_path(book_path))
+
+def test_request_ignores_shared_socket_dir(tmp_path, monkeypatch, mock_os_path_exists):
+    """A socket directory others can write to is never trusted, even with a daemon listening."""
+    mock_os_path_exists.side_effect = REAL_PATH_EXISTS
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    book_file = tmp_path / "project_commands.json"
+    _write_book(book_file, ["build"])
+    book_path = str(book_file)
+
+    thread = threading.Thread(
+        target=serve,
+        args=(book_path, lambda: json.loads(book_file.read_text()), lambda data: None),
+        daemon=True
+    )
+    thread.start()
+    for _ in range(100):
+        if request(book_path, 'ping') is not None:
+            break
+        time.sleep(0.01)
+    assert oct(os.stat(history_daemon.get_socket_dir()).st_mode & 0o777) == oct(0o700)
+
+    os.chmod(history_daemon.get_socket_dir(), 0o777)
+    assert request(book_path, 'lookup', name='build') is None
+    os.chmod(history_daemon.get_socket_dir(), 0o700)
+    assert request(book_path, 'shutdown') is not None
+    thread.join(timeout=5)
+
+def test_request_ignores_daemon_of_another_user(tmp_path, monkeypatch):
+    """Responses from a socket owned by someone else fall back to in-process loading."""
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    assert history_daemon.ensure_socket_dir() is not None
+    monkeypatch.setattr(history_daemon, '_peer_uid', lambda sock, path: os.getuid() + 1)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    socket_path = get_socket_path(str(tmp_path / "project_commands.json"))
+    server.bind(socket_path)
+    server.listen(1)
+
+    def answer():
+        try:
+            connection, _ = server.accept()
+            with connection:
+                connection.sendall(b'{"ok": true, "entry": {"command": "echo INJECTED"}}\n')
+        except OSError:
+            pass # The client hung up without reading
+
+    thread = threading.Thread(target=answer, daemon=True)
+    thread.start()
+    try:
+        assert request(str(tmp_path / "project_commands.json"), 'lookup', name='build') is None
+    finally:
+        server.close()
@@ -0,0 +1,81 @@
+import pytest
+import os
+import sys
+import threading
+import time
+
+import history_follower
+from history_follower import FrecencyTable, HistoryTail, PollingWatcher, create_watcher, suggest_name
+
+def test_frecency_table_offers_once_at_threshold():
+    """A command is reported once when its decayed score reaches the threshold."""
+    table = FrecencyTable(threshold=3, half_life=100)
+    assert [table.observe("make test", now=t) for t in (0, 0, 0, 0)] == [False, False, True, False]
+    assert [table.observe("make lint", now=t) for t in (0, 200, 400)] == [False, False, False] # Old uses decay
+    assert table.score("make lint", 400) == pytest.approx(1 + 0.25 * (1 + 0.25)) # Two half-lives per gap
+
+def test_frecency_table_is_bounded():
+    """The lowest-scoring commands are evicted once the table is full."""
+    table = FrecencyTable(capacity=8)
+    for _ in range(3):
+        table.observe("hot", now=0)
+    for i in range(100):
+        table.observe(f"once-{i}", now=i)
+        assert len(table.entries) <= 8
+    assert "hot" in table.entries
+
+def test_frecency_table_keeps_the_command_that_triggers_eviction():
+    """A new command filling the table is counted, not evicted on arrival."""
+    table = FrecencyTable(capacity=4, threshold=2)
+    for i in range(4):
+        table.observe(f"old-{i}", now=0)
+    assert table.observe("new", now=1000) is False
+    assert table.score("new", 1000) > 0
+    assert table.observe("new", now=1000) is True # Both uses were kept
+
+def test_history_tail_reads_only_appended_commands(tmp_path):
+    """Existing history is skipped, partial lines wait for their newline, and rewrites reset."""
+    history_file = tmp_path / ".zsh_history"
+    history_file.write_text(": 1:0;old command\n")
+    tail = HistoryTail(str(history_file), "zsh")
+    assert tail.read_new() == []
+
+    with open(history_file, 'a') as f:
+        f.write(": 2:0;make test\n: 3:0;make li")
+    assert tail.read_new() == ["make test"]
+    with open(history_file, 'a') as f:
+        f.write("nt\n")
+    assert tail.read_new() == ["make lint"]
+
+    history_file.write_text(": 4:0;trimmed\n") # Shorter than before: the shell rewrote it
+    assert tail.read_new() == []
+    with open(history_file, 'a') as f:
+        f.write(": 5:0;after rewrite\n")
+    assert tail.read_new() == ["after rewrite"]
+
+def test_watchers_wake_on_writes(tmp_path):
+    """inotify (where available) and polling both notice appended history."""
+    history_file = tmp_path / ".bash_history"
+    history_file.write_text("")
+    for watcher in (create_watcher(str(history_file)), PollingWatcher(str(history_file), interval=0.05)):
+        writer = threading.Timer(0.05, lambda: history_file.open('a').write("ls\n"))
+        writer.start()
+        started = time.monotonic()
+        watcher.wait(timeout=2)
+        writer.join()
+        watcher.close()
+        assert time.monotonic() - started < 1.5
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+def test_create_watcher_uses_inotify_on_linux(tmp_path):
+    history_file = tmp_path / ".bash_history"
+    history_file.write_text("")
+    watcher = create_watcher(str(history_file))
+    assert isinstance(watcher, history_follower.InotifyWatcher)
+    watcher.close()
+
+def test_suggest_name():
+    """Names come from the first words, skipping options, and avoid taken names."""
+    assert suggest_name("make test -j4", set()) == "make-test"
+    assert suggest_name("/usr/bin/python3 -m pytest", set()) == "python3"
+    assert suggest_name("make test", {"make-test", "make-test-2"}) == "make-test-3"
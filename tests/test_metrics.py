@@ -0,0 +1,53 @@
+import pytest
+
+import metrics
+from metrics import record_run, flush, parse_samples, render_samples
+
+@pytest.fixture
+def metrics_file(tmp_path, monkeypatch):
+    """Enables metrics with a private textfile and an empty in-memory aggregate."""
+    path = tmp_path / "history_book.prom"
+    monkeypatch.setenv(metrics.METRICS_ENV_VAR, str(path))
+    monkeypatch.setattr(metrics, '_pending', {})
+    monkeypatch.setattr(metrics, '_registered', {'atexit': True}) # flush() is called explicitly
+    return path
+
+def test_record_run_is_a_no_op_when_disabled(monkeypatch):
+    """Without HISTORY_BOOK_METRICS_FILE nothing is aggregated."""
+    monkeypatch.delenv(metrics.METRICS_ENV_VAR, raising=False)
+    monkeypatch.setattr(metrics, '_pending', {})
+    record_run("build", ["ci"], 1.0, True)
+    assert metrics._pending == {}
+
+def test_flush_writes_counters_and_histogram(metrics_file):
+    """One series per tag, cumulative buckets, and a single textfile."""
+    record_run("build", ["ci", "make"], 2.0, True)
+    record_run("build", ["ci", "make"], 0.05, False)
+    flush()
+    text = metrics_file.read_text()
+    assert '# TYPE history_book_runs_total counter' in text
+    assert 'history_book_runs_total{command="build",tag="ci"} 2' in text
+    assert 'history_book_run_failures_total{command="build",tag="make"} 1' in text
+    assert 'history_book_run_duration_seconds_bucket{command="build",tag="ci",le="0.1"} 1' in text
+    assert 'history_book_run_duration_seconds_bucket{command="build",tag="ci",le="5"} 2' in text
+    assert 'history_book_run_duration_seconds_bucket{command="build",tag="ci",le="+Inf"} 2' in text
+    assert 'history_book_run_duration_seconds_sum{command="build",tag="ci"} 2.05' in text
+    assert metrics._pending == {}
+    assert sorted(p.name for p in metrics_file.parent.iterdir()) == ["history_book.prom", "history_book.prom.lock"]
+
+def test_flush_merges_with_existing_file(metrics_file):
+    """Increments from separate processes accumulate in the file."""
+    record_run("lint", [], 1.0, True)
+    flush()
+    record_run("lint", [], 1.0, False)
+    flush()
+    samples = parse_samples(metrics_file.read_text())
+    assert samples[("history_book_runs_total", (("command", "lint"), ("tag", "")))] == 2
+    assert samples[("history_book_run_failures_total", (("command", "lint"), ("tag", "")))] == 1
+
+def test_render_and_parse_round_trip():
+    """Label values are escaped, and large counters keep full precision."""
+    samples = {("history_book_runs_total", (("command", 'say "hi"\\n'), ("tag", "a\nb"))): 12345678}
+    text = render_samples(samples)
+    assert '12345678' in text
+    assert parse_samples(text) == samples
@@ -0,0 +1,37 @@
+import pytest
+import json
+
+from name_index import levenshtein, build_index, bigram_search, prefix_matches, resolve
+
+NAMES = ["build", "build-docs", "deploy-prod", "deploy-staging", "lint", "test"]
+
+def test_levenshtein():
+    """Edit distance with an optional early cutoff."""
+    assert levenshtein("build", "build") == 0
+    assert levenshtein("biuld", "build") == 2
+    assert levenshtein("kitten", "sitting") == 3
+    assert levenshtein("a", "abcdef", max_distance=2) == 3
+
+def test_prefix_matches_uses_sorted_names():
+    """Prefix lookups return every name sharing the prefix."""
+    index = build_index(NAMES + ["", "lint"])
+    assert index['names'] == sorted(NAMES)
+    assert prefix_matches(index, "deploy") == ["deploy-prod", "deploy-staging"]
+    assert prefix_matches(index, "x") == []
+
+def test_bigram_search_matches_linear_scan():
+    """The bigram filter finds exactly the names a full scan would."""
+    index = build_index(NAMES)
+    for query in ("tset", "buidl", "lnt", "deploy-prd", "deplyo-stagign", "zzzz", "b"):
+        expected = sorted((levenshtein(query, name), name) for name in NAMES if levenshtein(query, name) <= 2)
+        assert bigram_search(index['names'], index['bigrams'], query, 2) == expected
+
+def test_resolve_kinds():
+    """Exact names, unique abbreviations, ambiguity and suggestions."""
+    index = json.loads(json.dumps(build_index(NAMES))) # Round-trips through the stored JSON form
+    assert resolve(index, "build") == ('exact', ["build"])
+    assert resolve(index, "deploy-p") == ('prefix', ["deploy-prod"])
+    assert resolve(index, "dep") == ('ambiguous', ["deploy-prod", "deploy-staging"])
+    assert resolve(index, "tset") == ('suggest', ["test"])
+    assert resolve(index, "completely-different") == ('none', [])
+    assert resolve(build_index([]), "x") == ('none', [])
@@ -6,6 +6,9 @@ from unittest.mock import mock_open, patch, MagicMock
 from scrape_history import (
     get_history_file_path,
     parse_history,
+    clean_history_line,
+    iter_history_commands,
+    collect_new_entries,
     main as scrape_main # Alias main to avoid conflict with pytest's main
 )
 
@@ -41,6 +44,46 @@ def test_get_history_file_path_no_file(mock_os_path_exists, mocker):
     assert shell is None
     assert path is None
 
+def test_clean_history_line():
+    """Shell-specific prefixes and fish metadata lines are removed."""
+    assert clean_history_line(": 1700000000:0;make test\n", "zsh") == "make test"
+    assert clean_history_line("- cmd: make test\n", "fish") == "make test"
+    assert clean_history_line("  when: 1700000000\n", "fish") == ""
+    assert clean_history_line("  make test  \n", "bash") == "make test"
+
+def test_iter_history_commands_oldest_first(tmp_path):
+    """Every command is yielded in file order, duplicates included."""
+    history_file = tmp_path / "fish_history"
+    history_file.write_text("- cmd: make\n  when: 1\n- cmd: make\n  when: 2\n- cmd: ls\n  when: 3\n")
+    assert list(iter_history_commands(str(history_file), "fish")) == ["make", "make", "ls"]
+
+def test_collect_new_entries_returns_entries(mock_os_path_exists, mock_whiptail, tmp_path, mocker):
+    """The in-process pipeline returns entry objects for the selected commands."""
+    history_file = tmp_path / ".bash_history"
+    history_file.write_text("make build\nmake test\n")
+    mocker.patch('os.path.expanduser', return_value=str(tmp_path))
+    mock_os_path_exists.side_effect = lambda path: path == str(history_file)
+    mocker.patch('fuzzy_picker.should_use_picker', return_value=False)
+
+    mock_whiptail.checklist.return_value = (["0"], 0) # Newest command first
+    mock_whiptail.inputbox.side_effect = [("t", 0), ("Run tests", 0), ("ci, make", 0)]
+    mock_whiptail.yesno.return_value = True
+
+    entries = collect_new_entries(mock_whiptail)
+    assert len(entries) == 1
+    assert entries[0]['command'] == "make test"
+    assert entries[0]['name'] == "t"
+    assert entries[0]['tags'] == ["ci", "make"]
+    assert entries[0]['quiet'] is True
+
+def test_collect_new_entries_without_history(mock_os_path_exists, mock_whiptail, mocker):
+    """None signals that no history file was found."""
+    mocker.patch('os.path.expanduser', return_value='/home/user')
+    mock_os_path_exists.return_value = False
+
+    assert collect_new_entries(mock_whiptail) is None
+    mock_whiptail.msgbox.assert_called_once()
+
 ## Broken
 # def test_parse_history_bash(mock_open):
 #     """Test parsing of Bash history."""
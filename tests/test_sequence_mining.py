@@ -0,0 +1,42 @@
+import pytest
+
+from sequence_mining import BoundedCounter, count_sequences, top_sequences, to_command
+
+WORKFLOW = ["git pull", "make gen", "make test"]
+
+def test_bounded_counter_keeps_heavy_hitters():
+    """Frequent items survive pruning; memory stays bounded."""
+    counter = BoundedCounter(capacity=10)
+    for i in range(1000):
+        counter.add("hot")
+        counter.add(f"noise-{i}")
+        assert len(counter.counts) < 20
+    (item, count, error), = counter.top(1)
+    assert item == "hot"
+    assert count == 1000
+    assert error == 0
+
+def test_count_sequences_finds_repeated_workflow():
+    """Consecutive repeats, ignored commands and whitespace do not break a sequence."""
+    history = []
+    for i in range(5):
+        history += ["git pull", "git  pull", "ls", "make gen", "make test", f"vim notes-{i}.txt"]
+    counters = count_sequences(history)
+    assert counters[3].counts[tuple(WORKFLOW)] >= 4
+    assert top_sequences(counters, limit=1) == [(tuple(WORKFLOW), counters[3].counts[tuple(WORKFLOW)])]
+
+def test_top_sequences_hides_subsumed_and_rare_sequences():
+    """Sub-sequences of a reported sequence and sequences below min_count are dropped."""
+    history = (WORKFLOW + ["echo done"]) * 10 + ["make gen", "make lint"] * 2
+    results = dict(top_sequences(count_sequences(history, max_length=3), min_count=3))
+    assert ("git pull", "make gen", "make test") in results
+    assert ("git pull", "make gen") not in results
+    assert ("make gen", "make lint") not in results
+
+def test_count_sequences_is_streaming():
+    """Any iterable of commands works, including generators."""
+    counters = count_sequences(cmd for cmd in WORKFLOW * 3)
+    assert counters[2].counts[("git pull", "make gen")] == 3
+
+def test_to_command_chains_steps():
+    assert to_command(WORKFLOW) == "git pull && make gen && make test"
@@ -0,0 +1,109 @@
+import pytest
+import os
+import shutil
+import subprocess
+
+import shell_export
+
+from shell_export import (
+    assign_function_names,
+    render_export,
+    read_run_log,
+    apply_run_log,
+    begin_run_log_merge,
+    finish_run_log_merge,
+    write_export,
+    get_run_log_path,
+)
+
+def _entry(command_id, name, command="echo hi"):
+    return {"id": command_id, "name": name, "command": command, "description": "", "tags": [], "last_run": None, "quiet": False}
+
+def test_assign_function_names_sanitizes_and_deduplicates():
+    """Invalid characters become underscores and collisions get a suffix."""
+    entries = [_entry("1", "deploy-prod"), _entry("2", "deploy_prod"), _entry("3", ""), _entry("4", "a.b")]
+    names = [function_name for function_name, _ in assign_function_names(entries)]
+    assert names == ["hb_deploy_prod", "hb_deploy_prod_2", "hb_a_b"]
+
+def test_render_export_records_runs_in_log():
+    """Generated functions run the command and append to the run log on success."""
+    text = render_export([_entry("abc", "build", "make build")], "bash", "/tmp/runs.log")
+    assert "hb_build() {" in text
+    assert "    (\n        make build\n    )\n" in text
+    assert ">> /tmp/runs.log" in text
+
+    fish_text = render_export([_entry("abc", "build", "make build")], "fish", "/tmp/it's.log")
+    assert "function hb_build" in fish_text
+    assert "    sh -c 'make build'\n" in fish_text # Stored commands are sh syntax, not fish
+    assert ">> '/tmp/it\\'s.log'" in fish_text
+
+def test_render_export_skips_parameterized_entries():
+    """Entries taking key=value parameters are not exported with their raw placeholders."""
+    deploy = dict(_entry("2", "deploy", "./deploy.sh {env}"), params=True)
+    text = render_export([_entry("1", "build", "make"), deploy], "bash", "/tmp/runs.log")
+    assert "hb_build()" in text
+    assert "hb_deploy" not in text and "{env}" not in text
+
+def test_render_export_runs_setup_first():
+    """An entry's setup step runs in front of its command, and changing it re-renders."""
+    entry = dict(_entry("1", "b", "pwd"), setup="cd sub")
+    assert "        cd sub && pwd\n" in render_export([entry], "bash", "/tmp/runs.log")
+    assert "sh -c 'cd sub && pwd'" in render_export([entry], "fish", "/tmp/runs.log")
+    assert "        cd other && pwd\n" in render_export([dict(entry, setup="cd other")], "bash", "/tmp/runs.log")
+
+def test_render_cache_keeps_only_last_pass():
+    """The render cache holds one export pass per shell, not every version ever rendered."""
+    for i in range(5):
+        render_export([_entry("1", "build", f"make v{i}")], "bash", "/tmp/runs.log")
+    assert len(shell_export._rendered_cache["bash"]) == 1
+    render_export([_entry("1", "build"), _entry("2", "test")], "zsh", "/tmp/runs.log")
+    assert len(shell_export._rendered_cache["bash"]) == 1
+    assert len(shell_export._rendered_cache["zsh"]) == 2
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="needs bash")
+def test_exported_function_runs_in_subshell(tmp_path):
+    """cd and exit inside a command do not affect the shell that sourced the export."""
+    (tmp_path / "sub").mkdir()
+    export_path = tmp_path / "functions.bash"
+    export_path.write_text(render_export([_entry("1", "b", "cd sub && pwd"), _entry("2", "quit", "exit 3")],
+                                         "bash", str(tmp_path / "runs.log")))
+    script = f"source {export_path}; hb_b; hb_quit; echo \"status=$? pwd=$PWD\""
+    # subprocess.run is mocked by conftest.py
+    process = subprocess.Popen(["bash", "-c", script], cwd=tmp_path, stdout=subprocess.PIPE, text=True)
+    output = process.communicate()[0]
+    assert output.splitlines() == [str(tmp_path / "sub"), f"status=3 pwd={tmp_path}"]
+
+def test_write_export_skips_unchanged_file(tmp_path):
+    """The export file is only rewritten when its content changes."""
+    writes = []
+
+    def write_text(path, text):
+        writes.append(path)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    entries = [_entry("1", "build")]
+    write_export(entries, "zsh", str(tmp_path), write_text)
+    export_path, functions = write_export(entries, "zsh", str(tmp_path), write_text)
+    assert len(writes) == 1
+    assert export_path == writes[0] and functions == [("hb_build", entries[0])]
+    write_export(entries + [_entry("2", "test")], "zsh", str(tmp_path), write_text)
+    assert len(writes) == 2
+
+def test_run_log_merge_keeps_latest_timestamp(tmp_path):
+    """Recorded runs are folded into last_run and the set-aside log is removed."""
+    log_path = get_run_log_path(str(tmp_path))
+    with open(log_path, 'w') as f:
+        f.write("1\t2025-01-01T00:00:00Z\n1\t2025-02-01T00:00:00Z\n2\t2024-01-01T00:00:00Z\n")
+
+    entries = [_entry("1", "a"), _entry("2", "b")]
+    entries[1]['last_run'] = "2025-06-01T00:00:00Z"
+    assert read_run_log(str(tmp_path))["1"] == "2025-02-01T00:00:00Z"
+
+    apply_run_log(entries, begin_run_log_merge(str(tmp_path)))
+    assert entries[0]['last_run'] == "2025-02-01T00:00:00Z"
+    assert entries[1]['last_run'] == "2025-06-01T00:00:00Z" # Older log entry does not win
+    assert os.listdir(tmp_path) == ["runs.log.merging"] # New runs go to a fresh log
+
+    finish_run_log_merge(str(tmp_path))
+    assert read_run_log(str(tmp_path)) == {}
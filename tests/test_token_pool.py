@@ -0,0 +1,101 @@
+import pytest
+import json
+import os
+
+import token_pool
+from token_pool import acquire, parse_resource, get_capacities
+
+DEAD_PID = 2 ** 30 # Above any pid_max, so never a live process
+
+@pytest.fixture
+def pool_dir(tmp_path, monkeypatch):
+    """Points the shared pool at a private directory with a 'heavy' capacity of 4."""
+    monkeypatch.setenv(token_pool.POOL_DIR_ENV_VAR, str(tmp_path))
+    monkeypatch.setenv(token_pool.CAPACITY_ENV_VAR, "heavy=4, bad=x")
+    monkeypatch.setattr(token_pool, 'POLL_INTERVAL', 0.01)
+    return tmp_path
+
+def read_pool(pool_dir):
+    return json.loads((pool_dir / token_pool.POOL_FILE_NAME).read_text())
+
+def write_pool(pool_dir, pool):
+    (pool_dir / token_pool.POOL_FILE_NAME).write_text(json.dumps(pool))
+
+def test_parse_resource():
+    """'class' costs one token; 'class:cost' declares the cost."""
+    assert parse_resource("heavy:4") == ("heavy", 4)
+    assert parse_resource("network") == ("network", 1)
+    for invalid in ("heavy:0", "heavy:x", "", "a b"):
+        with pytest.raises(ValueError):
+            parse_resource(invalid)
+
+def test_capacities_from_environment(pool_dir):
+    """Malformed capacity items are ignored."""
+    assert get_capacities() == {"heavy": 4}
+
+def test_acquire_holds_tokens_until_released(pool_dir):
+    """Tokens are recorded while the block runs and returned afterwards."""
+    with acquire("heavy:3"):
+        holders = read_pool(pool_dir)["heavy"]["holders"]
+        assert [(h['pid'], h['cost']) for h in holders] == [(os.getpid(), 3)]
+        with pytest.raises(TimeoutError):
+            with acquire("heavy:2", timeout=0.05):
+                pass
+    assert read_pool(pool_dir) == {}
+
+def test_waiters_are_served_in_order(pool_dir):
+    """A live earlier waiter blocks later requests even if tokens are free."""
+    write_pool(pool_dir, {"heavy": {"holders": [], "queue": [{"pid": os.getppid(), "owner": "first", "cost": 4}]}})
+    waits = []
+    with pytest.raises(TimeoutError):
+        with acquire("heavy:1", on_wait=lambda *args: waits.append(args), timeout=0.05):
+            pass
+    assert waits == [("heavy", 1)]
+    assert [w['owner'] for w in read_pool(pool_dir)["heavy"]["queue"]] == ["first"]
+
+def test_tokens_of_dead_processes_are_reclaimed(pool_dir):
+    """Holders and waiters whose process is gone no longer count."""
+    write_pool(pool_dir, {"heavy": {
+        "holders": [{"pid": DEAD_PID, "owner": "crashed", "cost": 4}],
+        "queue": [{"pid": DEAD_PID, "owner": "gone", "cost": 1}],
+    }})
+    with acquire("heavy:4", timeout=0.05):
+        assert [h['pid'] for h in read_pool(pool_dir)["heavy"]["holders"]] == [os.getpid()]
+
+@pytest.mark.parametrize("content", [
+    "[1, 2]",
+    '{"heavy": []}',
+    '{"heavy": {"holders": {}, "queue": []}}',
+    '{"heavy": {"holders": [{"pid": "123", "owner": "x", "cost": 4}], "queue": []}}',
+    '{"heavy": {"holders": [], "queue": [{"pid": 123, "owner": "x", "cost": 1.5}]}}',
+    '{"heavy": {"holders": [{"pid": 123, "cost": 1}], "queue": []}}',
+])
+def test_corrupted_pool_is_reset(pool_dir, content):
+    """A pool file of the wrong shape is discarded instead of crashing every run."""
+    (pool_dir / token_pool.POOL_FILE_NAME).write_text(content)
+    with acquire("heavy:4", timeout=0.05):
+        assert [h['pid'] for h in read_pool(pool_dir)["heavy"]["holders"]] == [os.getpid()]
+
+def test_cost_is_capped_at_capacity(pool_dir):
+    """A cost above the capacity waits for the whole pool instead of forever."""
+    with acquire("heavy:10", timeout=0.05):
+        assert read_pool(pool_dir)["heavy"]["holders"][0]['cost'] == 4
+
+def test_pool_file_is_shared_by_all_users(pool_dir):
+    """A new pool file is writable for every user, whatever the umask."""
+    umask = os.umask(0o022)
+    try:
+        with acquire("heavy"):
+            pass
+    finally:
+        os.umask(umask)
+    assert (pool_dir / token_pool.POOL_FILE_NAME).stat().st_mode & 0o777 == 0o666
+
+def test_unusable_pool_raises_readable_error(pool_dir, monkeypatch):
+    """A pool file this user may not open names the path and the way out."""
+    def refuse(path, flags, mode=0o777):
+        raise PermissionError(13, "Permission denied")
+    monkeypatch.setattr(token_pool.os, 'open', refuse)
+    with pytest.raises(OSError, match=token_pool.POOL_DIR_ENV_VAR):
+        with acquire("heavy"):
+            pass
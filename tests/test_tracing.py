@@ -0,0 +1,63 @@
+import pytest
+import io
+import json
+
+import tracing
+
+@pytest.fixture(autouse=True)
+def reset_tracing():
+    """Every test starts and ends with tracing disabled."""
+    tracing.reset()
+    yield
+    tracing.reset()
+
+def test_span_is_noop_when_disabled():
+    """Disabled tracing hands out a shared no-op span and records nothing."""
+    assert tracing.span("a") is tracing.span("b")
+    with tracing.span("a"):
+        pass
+    stream = io.StringIO()
+    tracing.report(stream)
+    assert stream.getvalue() == ""
+
+def test_report_prints_nested_tree():
+    """Nested spans are reported as an indented tree in start order."""
+    tracing.enable()
+    with tracing.span("outer"):
+        with tracing.span("inner"):
+            pass
+    tracing.record("imports", 0.0, 0.0)
+
+    stream = io.StringIO()
+    tracing.report(stream)
+    lines = stream.getvalue().splitlines()
+    assert lines[1] == "--- History Book Profile ---"
+    assert lines[2].startswith("imports")
+    assert lines[3].startswith("outer")
+    assert lines[4].startswith("  inner")
+
+def test_memory_peaks_and_chrome_trace(tmp_path):
+    """Memory profiling attaches peaks; the trace file uses Chrome's event format."""
+    tracing.enable(memory=True)
+    with tracing.span("allocate"):
+        data = [bytearray(1024) for _ in range(100)]
+    del data
+
+    trace_file = tmp_path / "trace.json"
+    tracing.write_chrome_trace(str(trace_file))
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    assert events[0]["name"] == "allocate"
+    assert events[0]["ph"] == "X"
+    assert events[0]["args"]["peak_bytes"] >= 100 * 1024
+
+def test_configure_from_env(monkeypatch):
+    """HISTORY_BOOK_TRACE enables tracing and selects memory and trace-file options."""
+    monkeypatch.setenv(tracing.TRACE_ENV_VAR, "0")
+    tracing.configure_from_env()
+    assert not tracing.is_enabled()
+
+    monkeypatch.setenv(tracing.TRACE_ENV_VAR, "mem,out.json")
+    tracing.configure_from_env()
+    assert tracing.is_enabled()
+    assert tracing._state['memory'] is True
+    assert tracing._state['trace_file'] == "out.json"
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import fcntl
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+# --- Configuration ---
+POOL_DIR_ENV_VAR = "HISTORY_BOOK_TOKEN_DIR" # Where the shared pool state lives (default: system temp dir)
+CAPACITY_ENV_VAR = "HISTORY_BOOK_TOKENS" # e.g. "heavy=8,network=2"; unlisted classes get DEFAULT_CAPACITY
+DEFAULT_CAPACITY = os.cpu_count() or 1
+POOL_FILE_NAME = "history_book-tokens.json"
+POLL_INTERVAL = 0.1 # Seconds between attempts while waiting for tokens
+RESOURCE_PATTERN = re.compile(r'^([A-Za-z0-9_.-]+)(?::(\d+))?$') # "heavy" or "heavy:4"
+# --- End Configuration ---
+
+# The pool is a small JSON file shared by every History Book process on the
+# machine, guarded by flock. Per resource class it records the processes holding
+# tokens and a FIFO queue of waiters:
+#   {"heavy": {"holders": [{"pid": 123, "owner": "...", "cost": 4}], "queue": [...]}}
+# A waiter only takes tokens when it is at the head of its queue, so a stream
+# of cheap requests cannot starve an expensive one. Entries whose process no
+# longer exists are dropped on every access, which reclaims tokens from crashes.
+
+# --- Helper Functions ---
+
+def parse_resource(resource):
+    """Parses a 'class:cost' declaration into (class, cost). The cost defaults to 1."""
+    match = RESOURCE_PATTERN.match(resource.strip())
+    if not match or (match.group(2) is not None and int(match.group(2)) < 1):
+        raise ValueError(f"Invalid resource '{resource}'. Expected 'class' or 'class:cost', e.g. 'heavy:4'.")
+    return match.group(1), int(match.group(2) or 1)
+
+def get_capacities():
+    """Returns the configured token capacity per resource class."""
+    capacities = {}
+    for item in os.environ.get(CAPACITY_ENV_VAR, "").split(','):
+        resource_class, separator, capacity = item.strip().partition('=')
+        if separator and capacity.strip().isdigit() and int(capacity) > 0:
+            capacities[resource_class.strip()] = int(capacity)
+    return capacities
+
+def get_capacity(resource_class):
+    return get_capacities().get(resource_class, DEFAULT_CAPACITY)
+
+def get_pool_path():
+    """Returns the path of the machine-wide pool state file."""
+    return os.path.join(os.environ.get(POOL_DIR_ENV_VAR) or tempfile.gettempdir(), POOL_FILE_NAME)
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True # Exists, but belongs to another user
+    return True
+
+def _open_pool(path):
+    """Opens the pool file, creating it writable for every user if needed.
+    An existing file is opened without O_CREAT, which fs.protected_regular
+    refuses for another user's file in a sticky directory such as /tmp."""
+    while True:
+        try:
+            return os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            pass
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            continue # Another process created it first
+        os.fchmod(fd, 0o666) # Not reduced by the umask: all users share the pool
+        return fd
+
+def _is_valid_pool(pool):
+    """Checks that loaded pool state has the shape described above. The file is
+    writable by every user, so anything else is treated like a torn write."""
+    if not isinstance(pool, dict):
+        return False
+    for state in pool.values():
+        if not isinstance(state, dict):
+            return False
+        for key in ('holders', 'queue'):
+            entries = state.get(key, [])
+            if not isinstance(entries, list):
+                return False
+            for entry in entries:
+                if not (isinstance(entry, dict) and isinstance(entry.get('owner'), str)
+                        and all(type(entry.get(field)) is int for field in ('pid', 'cost'))):
+                    return False
+    return True
+
+@contextmanager
+def _locked_pool():
+    """Yields the pool state under an exclusive lock and writes it back afterwards.
+    Raises OSError with a readable message if the pool file cannot be used."""
+    path = get_pool_path()
+    try:
+        fd = _open_pool(path)
+    except OSError as e:
+        raise OSError(e.errno, f"Cannot use the token pool ({e.strerror}); "
+                               f"set {POOL_DIR_ENV_VAR} to a directory you can write to", path) from e
+    with os.fdopen(fd, 'r+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            try:
+                pool = json.loads(f.read() or "{}")
+            except ValueError:
+                pool = {} # A torn write; live processes re-register on their next attempt
+            if not _is_valid_pool(pool):
+                pool = {}
+            for state in pool.values():
+                state['holders'] = [h for h in state.get('holders', []) if _is_alive(h['pid'])]
+                state['queue'] = [w for w in state.get('queue', []) if _is_alive(w['pid'])]
+            yield pool
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps({name: state for name, state in pool.items() if state['holders'] or state['queue']}))
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _try_acquire(resource_class, cost, capacity, owner):
+    """Queues `owner` if needed and takes the tokens when it is first in line.
+    Returns True once the tokens are held."""
+    with _locked_pool() as pool:
+        state = pool.setdefault(resource_class, {'holders': [], 'queue': []})
+        if not any(w['owner'] == owner for w in state['queue']):
+            state['queue'].append({'pid': os.getpid(), 'owner': owner, 'cost': cost})
+        in_use = sum(h['cost'] for h in state['holders'])
+        if state['queue'][0]['owner'] == owner and in_use + cost <= capacity:
+            state['holders'].append(state['queue'].pop(0))
+            return True
+        return False
+
+def _leave(resource_class, owner):
+    """Removes `owner` from the holders and the queue of a class."""
+    with _locked_pool() as pool:
+        state = pool.get(resource_class)
+        if state:
+            state['holders'] = [h for h in state['holders'] if h['owner'] != owner]
+            state['queue'] = [w for w in state['queue'] if w['owner'] != owner]
+
+@contextmanager
+def acquire(resource, on_wait=None, timeout=None):
+    """Holds tokens for a 'class:cost' resource while the block runs.
+    `on_wait(resource_class, cost)` is called once if the tokens are not free
+    immediately. Raises TimeoutError if `timeout` seconds pass without them."""
+    resource_class, cost = parse_resource(resource)
+    capacity = get_capacity(resource_class)
+    cost = min(cost, capacity) # A cost above the capacity could never be satisfied
+    deadline = None if timeout is None else time.monotonic() + timeout
+    owner = uuid.uuid4().hex # Distinguishes concurrent acquisitions within one process
+    try:
+        waited = False
+        while not _try_acquire(resource_class, cost, capacity, owner):
+            if not waited and on_wait:
+                on_wait(resource_class, cost)
+            waited = True
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for {cost} '{resource_class}' token(s).")
+            time.sleep(POLL_INTERVAL)
+        yield
+    finally:
+        _leave(resource_class, owner)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import sys
+import threading
+import time
+
+# --- Configuration ---
+TRACE_ENV_VAR = "HISTORY_BOOK_TRACE" # e.g. "1", "mem", "trace.json" or "mem,trace.json"
+# --- End Configuration ---
+
+_state = {
+    'enabled': False,
+    'memory': False,
+    'trace_file': None,
+}
+_spans = [] # Finished spans, in completion order
+_local = threading.local() # Per-thread stack of open spans
+
+# --- Span API ---
+
+class _NoopSpan:
+    """Returned by span() while tracing is disabled, so instrumented code only
+    pays for one function call and a flag check."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'start', 'end', 'depth', 'thread', 'peak', 'child_peak')
+
+    def __init__(self, name):
+        self.name = name
+        self.peak = None
+        self.child_peak = 0
+
+    def __enter__(self):
+        stack = _stack()
+        self.depth = len(stack)
+        self.thread = threading.get_ident()
+        if _state['memory']:
+            import tracemalloc
+            if stack: # Keep the parent's peak before resetting it for this span
+                stack[-1].child_peak = max(stack[-1].child_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        stack = _stack()
+        stack.pop()
+        if _state['memory']:
+            import tracemalloc
+            self.peak = max(self.child_peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, self.peak)
+        _spans.append(self)
+        return False
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def span(name):
+    """Context manager timing one phase. Nested spans form a tree."""
+    if not _state['enabled']:
+        return _NOOP_SPAN
+    return _Span(name)
+
+def record(name, start, end):
+    """Records a phase measured before tracing was enabled (e.g., module imports)."""
+    if not _state['enabled']:
+        return
+    finished = _Span(name)
+    finished.start, finished.end = start, end
+    finished.depth = len(_stack())
+    finished.thread = threading.get_ident()
+    _spans.append(finished)
+
+def is_enabled():
+    return _state['enabled']
+
+# --- Setup ---
+
+def enable(memory=False, trace_file=None):
+    """Turns tracing on, optionally with tracemalloc peaks and a Chrome trace file."""
+    _state['enabled'] = True
+    _state['memory'] = _state['memory'] or memory
+    _state['trace_file'] = trace_file or _state['trace_file']
+    if _state['memory']:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+def configure_from_env():
+    """Enables tracing from the HISTORY_BOOK_TRACE environment variable.
+    Comma-separated options: 'mem' adds memory peaks, a path ending in '.json'
+    writes a Chrome trace; any other non-empty value just enables the report."""
+    value = os.environ.get(TRACE_ENV_VAR, "").strip()
+    if not value or value == "0":
+        return
+    options = [option.strip() for option in value.split(',')]
+    trace_file = next((option for option in options if option.endswith('.json')), None)
+    enable(memory='mem' in options, trace_file=trace_file)
+
+# --- Output ---
+
+def report(stream=None):
+    """Prints the per-phase timing tree (to stderr by default, so piped
+    output such as 'export --format' stays clean)."""
+    stream = stream or sys.stderr
+    if not _spans:
+        return
+    spans = sorted(_spans, key=lambda s: (s.thread != threading.main_thread().ident, s.start))
+    total = max(s.end for s in spans) - min(s.start for s in spans)
+    print("\n--- History Book Profile ---", file=stream)
+    for s in spans:
+        duration = s.end - s.start
+        share = (duration / total * 100) if total else 100.0
+        line = f"{'  ' * s.depth}{s.name:<{max(1, 40 - 2 * s.depth)}} {duration * 1000:9.3f}ms {share:5.1f}%"
+        if s.peak is not None:
+            line += f"  peak {s.peak / 1024:,.1f} KiB"
+        if s.thread != threading.main_thread().ident:
+            line += f"  [thread {s.thread}]"
+        print(line, file=stream)
+
+def write_chrome_trace(path):
+    """Writes the spans in Chrome trace-event format (chrome://tracing, Perfetto)."""
+    pid = os.getpid()
+    events = []
+    for s in _spans:
+        event = {
+            "name": s.name,
+            "ph": "X",
+            "ts": s.start * 1e6,
+            "dur": (s.end - s.start) * 1e6,
+            "pid": pid,
+            "tid": s.thread,
+        }
+        if s.peak is not None:
+            event["args"] = {"peak_bytes": s.peak}
+        events.append(event)
+    with open(path, 'w') as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+def finish():
+    """Prints the report and writes the trace file, if tracing is enabled."""
+    if not _state['enabled']:
+        return
+    report()
+    if _state['trace_file']:
+        try:
+            write_chrome_trace(_state['trace_file'])
+            print(f"Trace written to {_state['trace_file']}", file=sys.stderr)
+        except IOError as e:
+            print(f"Warning: Could not write trace file '{_state['trace_file']}': {e}", file=sys.stderr)
+
+def reset():
+    """Disables tracing and discards recorded spans."""
+    if _state['memory']:
+        import tracemalloc
+        tracemalloc.stop()
+    _state.update(enabled=False, memory=False, trace_file=None)
+    _spans.clear()
+    _stack().clear()